@@ -0,0 +1,405 @@
+"""
+Load and latency benchmark of the forms API over HTTP, compared against a stored baseline.
+
+Runs the service (python main.py) against a scratch database, forms_bench by default, which is
+dropped, migrated and seeded with ROWS cancellations and as many feedback forms spread over the
+last year, half of them archived. The database server is the one configured with the POSTGRES_*
+variables or, with --testcontainers, a throwaway Postgres container. Each scenario then runs
+--concurrency closed-loop clients for --duration seconds after a warm-up:
+
+    submit_feedback       POST /forms/feedback
+    submit_cancellation   POST /forms/cancellation
+    list                  GET /forms/cancellation and /forms/feedback, first pages and pages at random cursors
+    archive               PUT /forms/<type>/<id>/archive on seeded forms
+    mixed                 70% submissions, 25% listings, 5% archives
+
+The JSON report carries throughput and p50/p95/p99 latency per scenario and operation. With
+--baseline, each scenario is compared against an earlier report and the run exits with status 1
+if throughput dropped or latency rose by more than --tolerance. Save the baseline on the base
+branch and compare on the same machine with the same options:
+
+    python -m benchmarks.bench_api --rows 10000 --output baseline.json
+    python -m benchmarks.bench_api --rows 10000 --baseline baseline.json
+
+Service settings under test are passed with --env, e.g. --env DB_MODE=async --env WORKERS=4.
+"""
+from datetime import datetime, timezone
+from statistics import quantiles
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from src.managers.postgres_manager import StandalonePostgresSettings
+from src.managers.partition_maintenance import PartitionMaintenance
+from src import forms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECONDS_PER_YEAR = 365 * 24 * 3600
+ADMIN_HEADERS = {"x-admin": "true"}
+# Forms per INSERT while seeding, so the statement-level triggers never see more than this at once
+SEED_CHUNK_SIZE = 50_000
+SEED_CANCELLATIONS_SQL = """
+    INSERT INTO cancellation (email, name, last_name, address, town, town_number, is_unordinary, reason,
+        last_invoice_number, termination_date, created_at, is_archived)
+    SELECT 'user' || i || '@example.com', 'Max', 'Mustermann', 'Hauptstrasse 1', 'Berlin', '10115', i %% 7 = 0,
+        CASE WHEN i %% 3 = 0 THEN 'Moving abroad' END, 'INV-' || i, date '2026-01-01' + i %% 365,
+        localtimestamp - make_interval(secs => i * %s), i %% 2 = 0
+    FROM generate_series(%s, %s) AS i
+"""
+SEED_FEEDBACK_SQL = """
+    INSERT INTO feedback (email, text, created_at, is_archived)
+    SELECT 'user' || i || '@example.com', 'Feedback number ' || i || ' about the delivery and the invoice',
+        localtimestamp - make_interval(secs => i * %s), i %% 2 = 0
+    FROM generate_series(%s, %s) AS i
+"""
+PICK_FORMS_SQL = "SELECT id, created_at FROM {table} ORDER BY id LIMIT %s"
+
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    "submit_feedback": {"submit_feedback": 1},
+    "submit_cancellation": {"submit_cancellation": 1},
+    "list": {"list": 1},
+    "archive": {"archive": 1},
+    "mixed": {"submit_feedback": 35, "submit_cancellation": 35, "list": 25, "archive": 5},
+}
+# Compared against the baseline: higher is better for throughput, lower for the latencies
+COMPARED_METRICS = (("throughput", 1), ("p50_ms", -1), ("p95_ms", -1), ("p99_ms", -1))
+
+
+class Workload:
+    """Builds the requests of the operations from forms picked out of the seeded data"""
+
+
+    def __init__(self, picks: Dict[str, List[Tuple]], seed: int):
+        self.picks = picks
+        self.rng = random.Random(seed)
+        self.submitted = 0
+        self.archived = {table: 0 for table in forms.FORM_TABLES}
+
+
+    def submit_feedback(self) -> Tuple[str, str, dict]:
+        self.submitted += 1
+        return "POST", "/forms/feedback", {"json": {"email": f"bench{self.submitted}@example.com", "text": f"Benchmark feedback {self.submitted}"}}
+
+
+    def submit_cancellation(self) -> Tuple[str, str, dict]:
+        self.submitted += 1
+        return "POST", "/forms/cancellation", {"json": {
+            "email": f"bench{self.submitted}@example.com", "name": "Erika", "last_name": "Musterfrau",
+            "address": "Nebenstrasse 2", "town": "Hamburg", "town_number": "20095", "is_unordinary": self.submitted % 5 == 0,
+            "reason": "Benchmark", "last_invoice_number": f"INV-B{self.submitted}", "termination_date": "2026-12-31",
+        }}
+
+
+    def list(self) -> Tuple[str, str, dict]:
+        table = self.rng.choice(forms.FORM_TABLES)
+        variant = self.rng.randrange(3)
+        params: Dict[str, object] = {"limit": 50}
+        if variant == 1:
+            params["is_archived"] = "false"
+        elif variant == 2:
+            form_id, created_at = self.rng.choice(self.picks[table])
+            params["cursor"] = forms.encode_cursor(created_at, form_id)
+        return "GET", f"/forms/{table}", {"params": params, "headers": ADMIN_HEADERS}
+
+
+    def archive(self) -> Tuple[str, str, dict]:
+        # Walks through the picked forms in order; archiving one again runs the same UPDATE
+        table = self.rng.choice(forms.FORM_TABLES)
+        picks = self.picks[table]
+        form_id, _ = picks[self.archived[table] % len(picks)]
+        self.archived[table] += 1
+        return "PUT", f"/forms/{table}/{form_id}/archive", {"headers": ADMIN_HEADERS}
+
+
+    def picker(self, weights: Dict[str, int]) -> Callable[[], Tuple[str, Tuple[str, str, dict]]]:
+        """Return a function choosing the next operation by weight and building its request"""
+        names = list(weights)
+        cumulative = [sum(list(weights.values())[:index + 1]) for index in range(len(names))]
+        builders = {name: getattr(self, name) for name in names}
+
+        def pick():
+            name = self.rng.choices(names, cum_weights=cumulative)[0]
+            return name, builders[name]()
+        return pick
+
+
+def start_container():
+    """Start a throwaway Postgres container and point the POSTGRES_* variables at it"""
+    from testcontainers.postgres import PostgresContainer
+
+    container = PostgresContainer("postgres:16-alpine", username="bench", password="bench", dbname="postgres")
+    container.start()
+    os.environ.update({
+        "POSTGRES_HOST": container.get_container_host_ip(),
+        "POSTGRES_PORT": str(container.get_exposed_port(5432)),
+        "POSTGRES_USER": "bench",
+        "POSTGRES_PASSWORD": "bench",
+    })
+    return container
+
+
+def seed_database(settings: StandalonePostgresSettings, rows: int, picks: int) -> Dict[str, List[Tuple]]:
+    """Recreate the scratch database, load the forms and return forms to list from and archive per table"""
+    connection = settings.create_connection(without_db=True)
+    connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{settings.db_name}" WITH (FORCE)')
+    finally:
+        connection.close()
+    settings.prepare_database()
+
+    spacing = SECONDS_PER_YEAR / max(rows, 1)
+    connection = settings.create_connection()
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            for table in forms.FORM_TABLES:
+                cursor.execute("SELECT create_form_partitions(%s, (localtimestamp - interval '1 year')::date, current_date)", (table,))
+            for start in range(1, rows + 1, SEED_CHUNK_SIZE):
+                end = min(start + SEED_CHUNK_SIZE - 1, rows)
+                cursor.execute(SEED_CANCELLATIONS_SQL, (spacing, start, end))
+                cursor.execute(SEED_FEEDBACK_SQL, (spacing, start, end))
+        # Brings the tables into the shape a running service keeps them in: old archived forms in the archive tier
+        PartitionMaintenance(settings).run_once()
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE")
+            chosen = {}
+            for table in forms.FORM_TABLES:
+                cursor.execute(PICK_FORMS_SQL.format(table=table), (picks,))
+                chosen[table] = cursor.fetchall()
+        return chosen
+    finally:
+        connection.close()
+
+
+def start_service(port: int, env_overrides: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """Run python main.py against the scratch database and wait until it answers"""
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "HOST": "127.0.0.1",
+        "MIGRATE_ON_STARTUP": "false",
+        # Keeps background jobs from moving or deleting forms while the scenarios run
+        "PARTITION_MAINTENANCE_INTERVAL": "0",
+        "RETENTION_INTERVAL": "0",
+    })
+    env.update(env_overrides)
+    log = open(log_path, "wb")
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)  # nosec
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Service exited with status {process.returncode}, see {log_path}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Service did not start within 60s, see {log_path}")
+
+
+def stop_service(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def drive(client: httpx.AsyncClient, pick: Callable, concurrency: int, duration: float) -> Tuple[List[Tuple[str, float, int]], float]:
+    """Run closed-loop clients for a while; returns (operation, seconds, status) per request and the elapsed time"""
+    samples: List[Tuple[str, float, int]] = []
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            name, (method, url, kwargs) = pick()
+            sent = time.perf_counter()
+            try:
+                status = (await client.request(method, url, **kwargs)).status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((name, time.perf_counter() - sent, status))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: List[Tuple[str, float, int]], elapsed: float) -> dict:
+    """Throughput, latency percentiles in milliseconds and status counts of a set of requests"""
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    statuses: Dict[str, int] = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    cuts = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items() if not 200 <= int(status) < 300),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(cuts[49], 2) if cuts else None,
+        "p95_ms": round(cuts[94], 2) if cuts else None,
+        "p99_ms": round(cuts[98], 2) if cuts else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "statuses": statuses,
+    }
+
+
+async def run_scenarios(base_url: str, workload: Workload, scenarios: List[str], concurrency: int, duration: float, warmup: float) -> dict:
+    """Run each scenario after a warm-up and summarize it overall and per operation"""
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        for scenario in scenarios:
+            pick = workload.picker(SCENARIOS[scenario])
+            if warmup > 0:
+                await drive(client, pick, concurrency, warmup)
+            samples, elapsed = await drive(client, pick, concurrency, duration)
+            summary = summarize(samples, elapsed)
+            if len(SCENARIOS[scenario]) > 1:
+                summary["operations"] = {
+                    name: summarize([sample for sample in samples if sample[0] == name], elapsed) for name in SCENARIOS[scenario]
+                }
+            results[scenario] = summary
+            print(
+                f"  {scenario:<20}{summary['throughput']:>10.1f} req/s   p50 {summary['p50_ms']:>8.2f}   "
+                f"p95 {summary['p95_ms']:>8.2f}   p99 {summary['p99_ms']:>8.2f} ms   errors {summary['errors']}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> List[dict]:
+    """
+    Compare every scenario present in both reports.
+
+    Returns:
+        One entry per scenario and metric, flagged as a regression if it got worse by more than
+        the tolerance (and, for latencies, by more than min_delta_ms)
+    """
+    for option in ("rows", "concurrency", "duration", "env"):
+        if report["config"].get(option) != baseline["config"].get(option):
+            print(f"Warning: baseline was run with {option}={baseline['config'].get(option)!r}, this run with {report['config'].get(option)!r}", file=sys.stderr)
+    comparison = []
+    for scenario, current in report["scenarios"].items():
+        previous = baseline["scenarios"].get(scenario)
+        if previous is None:
+            continue
+        for metric, direction in COMPARED_METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regression = -change * direction > tolerance
+            if metric != "throughput" and after - before < min_delta_ms:
+                regression = False
+            comparison.append({
+                "scenario": scenario, "metric": metric, "baseline": before, "current": after,
+                "change": round(change, 3), "regression": regression,
+            })
+    return comparison
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()  # nosec
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load and latency benchmark of the forms API")
+    parser.add_argument("--rows", type=int, default=10_000, help="Seeded cancellations and feedback forms each")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--database", default="forms_bench", help="Scratch database, dropped and recreated")
+    parser.add_argument("--port", type=int, default=8099, help="Port the service listens on")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Service setting under test, repeatable")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for choosing operations and forms")
+    parser.add_argument("--testcontainers", action="store_true", help="Run Postgres in a throwaway container")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against this JSON report and exit with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Smallest latency increase that counts as a regression")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(SCENARIOS)}")
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+
+    container = start_container() if args.testcontainers else None
+    os.environ["POSTGRES_DB_NAME"] = args.database
+    process = None
+    try:
+        settings = StandalonePostgresSettings()
+        print(f"Seeding {args.database} with {args.rows:,} cancellations and feedback forms ...", file=sys.stderr)
+        started = time.perf_counter()
+        picks = seed_database(settings, args.rows, 5000)
+        print(f"  seeding took {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        log_path = os.path.join(tempfile.gettempdir(), "bench_api_service.log")
+        process = start_service(args.port, env_overrides, log_path)
+        print(f"Running {len(scenarios)} scenarios with {args.concurrency} clients for {args.duration}s each ...", file=sys.stderr)
+        workload = Workload(picks, args.seed)
+        results = asyncio.run(run_scenarios(f"http://127.0.0.1:{args.port}", workload, scenarios, args.concurrency, args.duration, args.warmup))
+    finally:
+        if process is not None:
+            stop_service(process)
+        if container is not None:
+            container.stop()
+
+    report = {
+        "config": {
+            "rows": args.rows, "concurrency": args.concurrency, "duration": args.duration,
+            "warmup": args.warmup, "seed": args.seed, "env": env_overrides,
+        },
+        "environment": {
+            "revision": git_revision(), "python": platform.python_version(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "scenarios": results,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report["comparison"] = compare(report, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        regressions = [entry for entry in report["comparison"] if entry["regression"]]
+        for entry in regressions:
+            print(
+                f"Regression in {entry['scenario']} {entry['metric']}: {entry['baseline']} -> {entry['current']} ({entry['change']:+.1%})",
+                file=sys.stderr,
+            )
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
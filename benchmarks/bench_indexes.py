@@ -0,0 +1,156 @@
+"""
+Benchmark of the cancellation table before and after migration 0002 (uuid primary key, partial and email indexes).
+
+Needs a database, configured with the same POSTGRES_* variables as the service. Both schema
+versions are built in scratch schemas (bench_before, bench_after) from the real migration
+files, loaded with the same rows (90% archived) and dropped again afterwards.
+
+    python -m benchmarks.bench_indexes [ROWS] [ITERATIONS]
+"""
+from statistics import quantiles
+import sys
+import time
+from uuid import UUID
+
+import psycopg2
+
+from src.managers.migration_manager import load_migrations
+from src.managers.postgres_manager import PostgresSettings
+from src.models import CancellationListParams
+from src import forms
+
+LOAD_ROWS_SQL = """
+    INSERT INTO cancellation (email, name, last_name, address, town, town_number, is_unordinary, reason,
+        last_invoice_number, termination_date, created_at, is_archived)
+    SELECT 'user' || i || '@example.com', 'Max', 'Mustermann', 'Hauptstrasse 1', 'Berlin', '10115', i %% 7 = 0, NULL,
+        'INV-' || i, date '2025-01-01' + i %% 365, timestamp '2024-01-01' + i * interval '1 second', i %% 10 <> 0
+    FROM generate_series(1, %s) AS i
+"""
+INDEX_SIZES_SQL = """
+    SELECT indexrelname, pg_relation_size(indexrelid)
+    FROM pg_stat_user_indexes
+    WHERE schemaname = current_schema() AND relname = 'cancellation'
+    ORDER BY indexrelname
+"""
+SCHEMAS = {"bench_before": 1, "bench_after": 2}
+
+
+class BenchSettings(PostgresSettings):
+    """Connection settings read like the service reads them"""
+
+
+def connect():
+    settings = BenchSettings()
+    settings.load_settings()
+    return psycopg2.connect(
+        user=settings.user, password=settings.password, host=settings.host, port=settings.port, database=settings.db_name
+    )
+
+
+def build_schema(cursor, schema: str, version: int, rows: int) -> float:
+    """Create a scratch schema at a migration version; returns how long migrating the loaded rows took"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    migrations = [migration for migration in load_migrations() if migration.version <= version]
+    cursor.execute(migrations[0].sql)
+    cursor.execute(LOAD_ROWS_SQL, (rows,))
+    started = time.perf_counter()
+    for migration in migrations[1:]:
+        cursor.execute(migration.sql)
+    migrated = time.perf_counter() - started
+    cursor.execute("ANALYZE cancellation")
+    return migrated
+
+
+def timed(cursor, sql: str, params_list: list) -> tuple[float, float]:
+    """Run a statement once per parameter tuple; returns p50 and p95 latency in milliseconds"""
+    timings = []
+    for params in params_list:
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        if cursor.description is not None:
+            cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    cuts = quantiles(timings, n=20)
+    return cuts[9], cuts[18]
+
+
+def run(cursor, iterations: int, text_ids: bool) -> dict:
+    """Time the list and archive paths in the current schema"""
+    cursor.execute("SELECT id::text, email, created_at FROM cancellation WHERE NOT is_archived ORDER BY random() LIMIT %s", (iterations,))
+    picks = cursor.fetchall()
+
+    first_page = forms.build_list_query(forms.SELECT_CANCELLATIONS_SQL, "cancellation", CancellationListParams(is_archived=False))
+    deep_pages = [
+        forms.build_list_query(
+            forms.SELECT_CANCELLATIONS_SQL,
+            "cancellation",
+            CancellationListParams(is_archived=False, cursor=forms.encode_cursor(created_at, form_id)),
+        )
+        for form_id, _, created_at in picks
+    ]
+    if text_ids:
+        # Before the migration ids were varchar and cursors carried them as strings
+        deep_pages = [(sql, tuple(str(param) if isinstance(param, UUID) else param for param in params)) for sql, params in deep_pages]
+    # The schemas stop before migration 0003, so only the hot table (no cancellation_all view) is queried
+    by_email = forms.build_list_query(forms.SELECT_CANCELLATIONS_SQL, "cancellation", CancellationListParams(email="x", is_archived=False))[0]
+    bulk_chunk = forms.BULK_ARCHIVE_CREATED_BEFORE_SQL["cancellation"]
+
+    results = {
+        "list first page": timed(cursor, first_page[0], [first_page[1]] * iterations),
+        "list page at cursor": timed(cursor, deep_pages[0][0], [params for _, params in deep_pages]),
+        "list by email": timed(cursor, by_email, [(email.upper(), 101) for _, email, _ in picks]),
+    }
+    # Archiving changes the data, so every statement runs in a transaction that is rolled back
+    archive_timings = []
+    for sql, params_list in (
+        (forms.ARCHIVE_CANCELLATION_SQL, [(form_id,) for form_id, _, _ in picks]),
+        (bulk_chunk, [(created_at, 1000) for _, _, created_at in picks]),
+    ):
+        timings = []
+        for params in params_list:
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            timings.append((time.perf_counter() - started) * 1000)
+            cursor.connection.rollback()
+        cuts = quantiles(timings, n=20)
+        archive_timings.append((cuts[9], cuts[18]))
+    results["archive by id"], results["bulk archive chunk"] = archive_timings
+    return results
+
+
+def main(rows: int, iterations: int) -> None:
+    connection = connect()
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            report = {}
+            for schema, version in SCHEMAS.items():
+                print(f"Building {schema} (migration {version:04d}) with {rows:,} rows ...")
+                migrated = build_schema(cursor, schema, version, rows)
+                if version > 1:
+                    print(f"  migrating the loaded rows took {migrated:.1f}s")
+                cursor.execute(INDEX_SIZES_SQL)
+                for name, size in cursor.fetchall():
+                    print(f"  {name:<48} {size / 2**20:8.1f} MiB")
+                connection.autocommit = False
+                report[schema] = run(cursor, iterations, text_ids=version < 2)
+                connection.rollback()
+                connection.autocommit = True
+
+            print(f"\n{'p50 / p95 ms':<22}" + "".join(f"{schema:>24}" for schema in SCHEMAS))
+            for name in report["bench_before"]:
+                cells = "".join(f"{report[schema][name][0]:>11.2f} / {report[schema][name][1]:>9.2f}" for schema in SCHEMAS)
+                print(f"{name:<22}{cells}")
+            for schema in SCHEMAS:
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
@@ -0,0 +1,123 @@
+"""
+Benchmark of the feedback search endpoint query (migration 0005) against an ILIKE scan.
+
+Needs a database, configured with the same POSTGRES_* variables as the service. The schema is
+built in a scratch schema (bench_search) from the real migration files, loaded with feedback
+texts drawn from a Zipf-distributed vocabulary, so some words are in most rows and others in
+a few, and dropped again afterwards.
+
+    python -m benchmarks.bench_search [ROWS] [ITERATIONS]
+"""
+from statistics import quantiles
+import sys
+import time
+
+from src.managers.migration_manager import load_migrations
+from src.models import FeedbackSearchParams
+from src import forms
+from benchmarks.bench_indexes import connect
+
+SCHEMA = "bench_search"
+VOCABULARY_SIZE = 5000
+# Word wk is drawn with a log-uniform k, so its frequency falls off like 1 / k (Zipf's law).
+# Referencing i in the subquery makes Postgres draw new words for every row.
+LOAD_ROWS_SQL = """
+    INSERT INTO feedback (email, text, created_at, is_archived)
+    SELECT 'user' || i || '@example.com',
+        (SELECT string_agg('w' || floor(exp(random() * ln(%s)))::int, ' ') FROM generate_series(1, 8 + i %% 17) AS n WHERE n > 0 * i),
+        timestamp '2024-01-01' + i * interval '30 seconds', i %% 10 <> 0
+    FROM generate_series(1, %s) AS i
+"""
+ILIKE_SQL = f"""
+    SELECT {forms.FEEDBACK_FIELDS_SQL} FROM feedback_all
+    WHERE text ILIKE %s
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+QUERIES = {
+    "common word": "w1",
+    "medium word": "w50",
+    "rare word": "w4000",
+    "two words": "w3 w200",
+    "phrase": '"w1 w2"',
+    "no match": "nothing",
+}
+
+
+def build_schema(cursor, rows: int) -> None:
+    """Create the scratch schema at the latest migration and load the feedback rows"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    for migration in load_migrations():
+        cursor.execute(migration.sql)
+    cursor.execute("SELECT create_form_partitions('feedback', '2024-01-01', (timestamp '2024-01-01' + %s * interval '30 seconds')::date)", (rows,))
+    cursor.execute(LOAD_ROWS_SQL, (VOCABULARY_SIZE, rows))
+    # Flushes the GIN pending lists filled by the load, as autovacuum would
+    cursor.execute("VACUUM ANALYZE feedback")
+
+
+def timed(cursor, sql: str, params: tuple, iterations: int) -> tuple[float, float, int]:
+    """Run a statement repeatedly; returns p50 and p95 latency in milliseconds and the row count"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        found = len(cursor.fetchall())
+        timings.append((time.perf_counter() - started) * 1000)
+    cuts = quantiles(timings, n=20)
+    return cuts[9], cuts[18], found
+
+
+def run(cursor, iterations: int) -> dict:
+    """Time the first search page per query, a second page and the ILIKE equivalent"""
+    results = {}
+    for name, q in QUERIES.items():
+        sql, params = forms.build_search_query(forms.SEARCH_FEEDBACKS_SQL, "feedback", FeedbackSearchParams(q=q))
+        search = timed(cursor, sql, params, iterations)
+        words = q.strip('"').split()
+        # ILIKE only handles a single substring, so multi-word queries look for the first word
+        ilike = timed(cursor, ILIKE_SQL, (f"%{words[0]}%", 21), iterations)
+        results[name] = (search, ilike)
+
+    sql, params = forms.build_search_query(forms.SEARCH_FEEDBACKS_SQL, "feedback", FeedbackSearchParams(q="w50"))
+    cursor.execute(sql, params)
+    columns = [column.name for column in cursor.description]
+    rows = cursor.fetchall()
+    next_cursor = forms.next_search_cursor(columns, rows, 20)
+    sql, params = forms.build_search_query(
+        forms.SEARCH_FEEDBACKS_SQL, "feedback", FeedbackSearchParams(q="w50", cursor=next_cursor)
+    )
+    results["medium word, page 2"] = (timed(cursor, sql, params, iterations), None)
+    return results
+
+
+def main(rows: int, iterations: int) -> None:
+    connection = connect()
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            print(f"Building {SCHEMA} with {rows:,} feedback rows ...")
+            started = time.perf_counter()
+            build_schema(cursor, rows)
+            print(f"  loading took {time.perf_counter() - started:.1f}s")
+            cursor.execute("SELECT pg_relation_size(indexrelid) FROM pg_stat_user_indexes WHERE relname LIKE 'feedback_p%%' AND indexrelname LIKE '%%text_search%%'")
+            print(f"  GIN index size {sum(size for size, in cursor.fetchall()) / 2**20:.1f} MiB")
+
+            report = run(cursor, iterations)
+            print(f"\n{'p50 / p95 ms':<22}{'search':>24}{'hits':>6}{'ILIKE':>24}")
+            for name, (search, ilike) in report.items():
+                cells = f"{search[0]:>11.2f} / {search[1]:>9.2f}{search[2]:>6}"
+                if ilike is not None:
+                    cells += f"{ilike[0]:>11.2f} / {ilike[1]:>9.2f}"
+                print(f"{name:<22}{cells}")
+            cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
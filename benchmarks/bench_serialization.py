@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the list endpoint serialization: the previous Pydantic path versus encoding row tuples directly.
+
+Runs without a database on synthetic rows shaped like SELECT_CANCELLATIONS_SQL results.
+
+    python -m benchmarks.bench_serialization [ROWS ...]
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+import sys
+import time
+
+from pydantic import TypeAdapter
+
+from src.models import Cancellation, CancellationPage
+from src import serialization
+
+# Column order of SELECT_CANCELLATIONS_SQL
+COLUMNS = [
+    "email", "name", "last_name", "address", "town", "town_number", "is_unordinary", "reason",
+    "last_invoice_number", "termination_date", "id", "is_archived", "created_at",
+]
+
+
+def make_rows(count: int) -> list[tuple]:
+    """Build rows as the database driver returns them"""
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    return [
+        (
+            f"user{i}@example.com", "Max", "Mustermann", "Hauptstraße 1", "Berlin", "10115", i % 7 == 0,
+            None if i % 3 else "Moving abroad", f"INV-{i:08d}", datetime(2025, 1, 1), uuid4(), False,
+            start + timedelta(seconds=i, microseconds=i % 1000),
+        )
+        for i in range(count)
+    ]
+
+
+def pydantic_path(rows: list[tuple]) -> bytes:
+    """What the endpoint did before: dict per row, model validation, response_model validation, JSON encoding"""
+    dicts = [dict(zip(COLUMNS, row)) for row in rows]
+    page = CancellationPage(items=[Cancellation(**row) for row in dicts], next_cursor=None)
+    validated = TypeAdapter(CancellationPage).validate_python(page, from_attributes=True)
+    return TypeAdapter(CancellationPage).dump_json(validated)
+
+
+def fast_path(rows: list[tuple]) -> bytes:
+    """Encode the row tuples straight to JSON"""
+    return serialization.encode_page(COLUMNS, rows, None)
+
+
+def best_of(function, rows: list[tuple], repeat: int) -> float:
+    """Return the fastest of several runs in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes: list[int]) -> None:
+    for count in sizes:
+        rows = make_rows(count)
+        # Both paths must produce byte-identical responses
+        assert fast_path(rows) == pydantic_path(rows)
+        repeat = 5 if count <= 10_000 else 3
+        slow = best_of(pydantic_path, rows, repeat)
+        fast = best_of(fast_path, rows, repeat)
+        print(f"{count:>7} rows  pydantic {slow * 1000:8.1f} ms  fast path {fast * 1000:8.1f} ms  speedup {slow / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
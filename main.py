@@ -1,12 +1,25 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
-from src.dependencies import setup_dependencies
+from src.config import get_env_bool, get_env_float, get_env_int
+from src.dependencies import setup_dependencies, open_dependencies, teardown_dependencies, get_db_mode
 import src.routers.cancellation as cancellation
 import src.routers.feedback as feedback
+import src.routers.async_cancellation as async_cancellation
+import src.routers.async_feedback as async_feedback
+import src.routers.stats as stats
+import src.routers.async_stats as async_stats
+import src.routers.metrics as metrics
+import src.routers.events as events
+from src.metrics import MetricsMiddleware
+from src.admission import AdmissionMiddleware
+from src.consistency import ReadConsistencyMiddleware
+from src.tracing import TracingMiddleware
+from src.managers.postgres_manager import StandalonePostgresSettings
 
 import os
 import logging
@@ -37,7 +50,9 @@ else:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_dependencies()
+    await open_dependencies()
     yield
+    await teardown_dependencies()
 
 
 app = FastAPI(
@@ -54,17 +69,55 @@ logging.basicConfig(
     datefmt='%d-%m-%Y %H:%M:%S'
 )
 
+# Innermost, so rejected submissions still get CORS headers, metrics and a request ID
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(ReadConsistencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID", "X-Read-After"],
 )
 
-app.include_router(cancellation.router)
-app.include_router(feedback.router)
+app.add_middleware(GZipMiddleware, minimum_size=get_env_int("GZIP_MINIMUM_SIZE", 1000))
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+app.include_router(metrics.router)
+app.include_router(events.router)
+
+if get_db_mode() == "async":
+    app.include_router(async_cancellation.router)
+    app.include_router(async_feedback.router)
+    app.include_router(async_stats.router)
+else:
+    app.include_router(cancellation.router)
+    app.include_router(feedback.router)
+    app.include_router(stats.router)
+
+
+def worker_count() -> int:
+    """Number of worker processes to start; WORKERS=0 starts one per CPU core available to this process"""
+    workers = get_env_int("WORKERS", 1)
+    if workers <= 0:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return workers
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", 8008)), reload=hot_reload)  # nosec
\ No newline at end of file
+    # Hot reload runs a single process
+    workers = 1 if hot_reload else worker_count()
+    if workers > 1 and get_env_bool("MIGRATE_ON_STARTUP", True):
+        # Migrate once here; each worker is a fresh interpreter that opens its own pools in lifespan
+        StandalonePostgresSettings().prepare_database()
+        os.environ["MIGRATE_ON_STARTUP"] = "false"
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),  # nosec
+        port=int(os.getenv("PORT", 8008)),
+        reload=hot_reload,
+        workers=workers,
+        timeout_graceful_shutdown=get_env_float("GRACEFUL_SHUTDOWN_TIMEOUT", 30.0),
+    )
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+Admission control for the public submission endpoints.
+
+Each client gets a token bucket, keyed by its IP address or by a configured header, and
+is answered with 429 once it is empty. Submissions in flight are capped globally, and
+while database statements or connection checkouts are slow, new submissions beyond a
+small trickle are shed with 503 before they queue up in front of the database.
+"""
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import json
+import math
+import time
+import logging
+
+from src.config import get_env_float, get_env_int, get_env_str
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_PATHS = frozenset({
+    "/forms/cancellation", "/forms/cancellation/batch",
+    "/forms/feedback", "/forms/feedback/batch",
+})
+
+
+class DatabaseLoad:
+    """
+    Moving averages of statement latency and connection checkout time, fed by the
+    database managers. Updates from worker threads may race; losing a sample is harmless.
+    """
+
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.query_latency = 0.0
+        self.acquire_latency = 0.0
+
+
+    def observe_query(self, duration: float) -> None:
+        """Fold a finished statement's duration into the average"""
+        self.query_latency += self.smoothing * (duration - self.query_latency)
+
+
+    def observe_acquire(self, duration: float) -> None:
+        """Fold the time spent waiting for a pooled connection into the average"""
+        self.acquire_latency += self.smoothing * (duration - self.acquire_latency)
+
+
+DB_LOAD = DatabaseLoad()
+
+
+class TokenBuckets:
+    """Per-client token buckets, keeping the most recently seen clients up to max_clients"""
+
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        """
+        Initialize without clients; unknown clients start with a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity
+            max_clients: Upper bound on tracked clients; the least recently seen are dropped
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, List[float]] = OrderedDict()
+
+
+    def take(self, client: str, now: float) -> float:
+        """Take a token for a client; returns 0 if granted, otherwise the seconds until one is available"""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+            self._buckets[client] = [self.burst - 1, now]
+            return 0.0
+        self._buckets.move_to_end(client)
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / self.rate
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and load shedding to POST requests on SUBMISSION_PATHS"""
+
+
+    def __init__(self, app):
+        self.app = app
+        rate = get_env_float("RATE_LIMIT_PER_SECOND", 0.0)
+        self.buckets = TokenBuckets(
+            rate, get_env_float("RATE_LIMIT_BURST", 20.0), get_env_int("RATE_LIMIT_MAX_CLIENTS", 100000)
+        ) if rate > 0 else None
+        self.key_header = get_env_str("RATE_LIMIT_KEY_HEADER", "").lower().encode("latin-1")
+        self.trusted_proxies = max(1, get_env_int("RATE_LIMIT_TRUSTED_PROXIES", 1))
+        self.max_concurrency = get_env_int("ADMISSION_MAX_CONCURRENCY", 256)
+        self.overload_concurrency = get_env_int("ADMISSION_OVERLOAD_CONCURRENCY", 4)
+        self.query_latency_threshold = get_env_float("ADMISSION_QUERY_LATENCY_THRESHOLD_MS", 0.0) / 1000
+        self.acquire_latency_threshold = get_env_float("ADMISSION_POOL_WAIT_THRESHOLD_MS", 100.0) / 1000
+        self.in_flight = 0
+
+
+    def client_key(self, scope) -> str:
+        """
+        The client address recorded by the trusted proxies in the configured header, or the peer address.
+
+        Proxies append the address they received a request from to X-Forwarded-For style
+        lists, so only the entries added by the trusted proxies can be believed; anything to
+        their left was sent by the client. The entry trusted_proxies from the right is the
+        one added by the outermost trusted proxy.
+        """
+        if self.key_header:
+            entries = []
+            for name, value in scope["headers"]:
+                if name == self.key_header:
+                    entries.extend(entry.strip() for entry in value.decode("latin-1").split(","))
+            if len(entries) >= self.trusted_proxies:
+                return entries[-self.trusted_proxies]
+        client = scope.get("client")
+        return client[0] if client else ""
+
+
+    def overloaded(self) -> bool:
+        """Whether the database looks saturated, judged by the moving averages"""
+        return (
+            0 < self.query_latency_threshold < DB_LOAD.query_latency
+            or 0 < self.acquire_latency_threshold < DB_LOAD.acquire_latency
+        )
+
+
+    def rejection(self, scope) -> Optional[Tuple[int, str, int]]:
+        """Decide whether to turn a submission away; returns status, reason and Retry-After seconds"""
+        if self.buckets is not None:
+            wait = self.buckets.take(self.client_key(scope), time.monotonic())
+            if wait > 0:
+                return 429, "rate_limited", math.ceil(wait)
+        if 0 < self.max_concurrency <= self.in_flight:
+            return 503, "concurrency", 1
+        # Keep a trickle of submissions going so the averages notice when the database recovers
+        if self.in_flight >= self.overload_concurrency and self.overloaded():
+            return 503, "overloaded", 1
+        return None
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in SUBMISSION_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        rejected = self.rejection(scope)
+        if rejected is not None:
+            status_code, reason, retry_after = rejected
+            metrics.ADMISSION_REJECTED.inc(reason)
+            detail = "Too many requests, please retry later" if status_code == 429 else "Service is busy, please retry later"
+            await send({
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", str(retry_after).encode())],
+            })
+            await send({"type": "http.response.body", "body": json.dumps({"detail": detail}, separators=(",", ":")).encode()})
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,364 @@
+from src.managers.async_postgres_manager import AsyncPostgresManager
+from src.managers.write_coalescer import AsyncWriteCoalescer
+from src.managers.submission_spool import SubmissionSpool, SpoolFullError
+from src.models import (
+    CreateCancellation, CreateFeedback,
+    CancellationListParams, FeedbackListParams,
+    CancellationExportParams, FeedbackExportParams,
+    BulkArchiveRequest, BulkArchiveResult, BatchSubmissionResult,
+    StatsParams, FormStats,
+    CancellationSearchParams, FeedbackSearchParams,
+)
+from src.forms import (
+    INSERT_CANCELLATION_SQL, INSERT_FEEDBACK_SQL,
+    ARCHIVE_CANCELLATION_SQL, ARCHIVE_FEEDBACK_SQL, ARCHIVE_CANCELLATION_AT_SQL, ARCHIVE_FEEDBACK_AT_SQL,
+    SELECT_CANCELLATIONS_SQL, SELECT_FEEDBACKS_SQL,
+    deny_for_non_admins, raise_database_error,
+    cancellation_params, feedback_params,
+    build_list_query, next_page_cursor,
+    CANCELLATION_COLUMNS, FEEDBACK_COLUMNS, EXPORT_CANCELLATIONS_SQL, EXPORT_FEEDBACKS_SQL,
+    build_export_query, export_response,
+    BULK_ARCHIVE_BY_IDS_SQL, BULK_ARCHIVE_BY_KEYS_SQL, BULK_ARCHIVE_CREATED_BEFORE_SQL, bulk_archive_result,
+    INSERT_CANCELLATION_COLUMNS, INSERT_FEEDBACK_COLUMNS, INSERT_COLUMNS, validate_batch, batch_submission_result,
+    list_cache_lookup, json_response, invalidate_cached_lists,
+    SELECT_CHANGE_VERSION_SQL, list_etag, etag_matches, not_modified_response,
+    STATS_QUERIES, form_stats,
+    SEARCH_CANCELLATIONS_SQL, SEARCH_FEEDBACKS_SQL, build_search_query, next_search_cursor,
+    IDEMPOTENT_INSERT_SQL, SELECT_IDEMPOTENCY_KEY_SQL,
+    created_response, stored_response, idempotent_response, replay_response, raise_key_in_flight,
+    SPOOLABLE_ERRORS, spooled_response, raise_spool_error,
+)
+from src.cache import ResponseCache
+from src.idempotency import IdempotencyCache, StoredResponse, request_hash
+from src import export, serialization, tracing
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Optional
+from datetime import datetime
+from uuid import UUID
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def change_version(pg_manager: AsyncPostgresManager, table: str) -> Optional[int]:
+    """Read the change counter of a table, or None if it is unavailable"""
+    try:
+        row = await pg_manager.execute_single_query(SELECT_CHANGE_VERSION_SQL, (table,))
+    except Exception as e:
+        logger.error(f"Error reading change counter of {table}: {e}")
+        raise_database_error(e, "Failed to retrieve forms")
+    return row["version"] if row else None
+
+
+async def create_idempotently(table: str, form_data: BaseModel, params: tuple, idempotency_key: str, pg_manager: AsyncPostgresManager, idempotency_cache: IdempotencyCache, response_cache: Optional[ResponseCache] = None, submission_spool: Optional[SubmissionSpool] = None) -> Response:
+    """Create a form once per Idempotency-Key and replay the stored response to repeated requests."""
+    form_hash = request_hash(form_data)
+    stored = idempotency_cache.get(table, idempotency_key)
+    if stored is not None:
+        return replay_response(table, stored, form_hash, "cache")
+    stored = created_response(table, form_hash)
+    try:
+        # Both statements run on the primary, so the lookup cannot miss a key on a lagging replica
+        async with pg_manager.get_connection() as connection:
+            claimed = await pg_manager.execute_returning_query(
+                IDEMPOTENT_INSERT_SQL[table],
+                (idempotency_key, stored.request_hash, stored.status_code, stored.body, idempotency_cache.ttl, *params),
+                connection
+            )
+            # A new statement sees the key even if a concurrent request committed it while this one waited
+            row = None if claimed else await pg_manager.execute_single_query(SELECT_IDEMPOTENCY_KEY_SQL, (table, idempotency_key), connection)
+    except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            # The replayer claims the key in the statement inserting the form, so spooled retries create it once
+            return await spool_submission(table, INSERT_COLUMNS[table], params, submission_spool, (idempotency_key, stored))
+        logger.error(f"Error creating {table} with an idempotency key: {e}")
+        raise_database_error(e, f"Failed to create {table}")
+    if claimed:
+        invalidate_cached_lists(response_cache, table)
+        idempotency_cache.put(table, idempotency_key, stored)
+        return idempotent_response(stored)
+    if row is None:
+        raise_key_in_flight()
+    stored = stored_response(row)
+    idempotency_cache.put(table, idempotency_key, stored, row["age"])
+    return replay_response(table, stored, form_hash, "database")
+
+
+async def spool_submission(table: str, columns: tuple, params: tuple, submission_spool: SubmissionSpool, idempotency: Optional[tuple[str, StoredResponse]] = None) -> Response:
+    """Write a submission to the local spool while the database is unavailable; the spool replays it later."""
+    try:
+        await asyncio.wrap_future(submission_spool.append(table, columns, params, idempotency))
+    except (SpoolFullError, OSError) as e:
+        raise_spool_error(table, e)
+    return spooled_response(table)
+
+
+async def create_cancellation(cancellation_data: CreateCancellation, pg_manager: AsyncPostgresManager, write_coalescer: Optional[AsyncWriteCoalescer] = None, response_cache: Optional[ResponseCache] = None, idempotency_key: Optional[str] = None, idempotency_cache: Optional[IdempotencyCache] = None, submission_spool: Optional[SubmissionSpool] = None):
+    """Creates a new cancellation entry in the database."""
+    if idempotency_key is not None and idempotency_cache is not None:
+        # Bypasses the write coalescer: the key has to be claimed in the transaction creating the form
+        return await create_idempotently("cancellation", cancellation_data, cancellation_params(cancellation_data), idempotency_key, pg_manager, idempotency_cache, response_cache, submission_spool)
+    try:
+        if write_coalescer is not None:
+            await write_coalescer.submit("cancellation", INSERT_CANCELLATION_COLUMNS, cancellation_params(cancellation_data))
+        else:
+            await pg_manager.execute_modification_query(INSERT_CANCELLATION_SQL, cancellation_params(cancellation_data))
+    except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            return await spool_submission("cancellation", INSERT_CANCELLATION_COLUMNS, cancellation_params(cancellation_data), submission_spool)
+        logger.error(f"Error creating cancellation: {e}")
+        raise_database_error(e, "Failed to create cancellation")
+    invalidate_cached_lists(response_cache, "cancellation")
+    return {"detail": "Cancellation created successfully"}
+
+
+async def create_feedback(feedback_data: CreateFeedback, pg_manager: AsyncPostgresManager, write_coalescer: Optional[AsyncWriteCoalescer] = None, response_cache: Optional[ResponseCache] = None, idempotency_key: Optional[str] = None, idempotency_cache: Optional[IdempotencyCache] = None, submission_spool: Optional[SubmissionSpool] = None):
+    """Creates a new feedback entry in the database."""
+    if idempotency_key is not None and idempotency_cache is not None:
+        return await create_idempotently("feedback", feedback_data, feedback_params(feedback_data), idempotency_key, pg_manager, idempotency_cache, response_cache, submission_spool)
+    try:
+        if write_coalescer is not None:
+            await write_coalescer.submit("feedback", INSERT_FEEDBACK_COLUMNS, feedback_params(feedback_data))
+        else:
+            await pg_manager.execute_modification_query(INSERT_FEEDBACK_SQL, feedback_params(feedback_data))
+    except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            return await spool_submission("feedback", INSERT_FEEDBACK_COLUMNS, feedback_params(feedback_data), submission_spool)
+        logger.error(f"Error creating feedback: {e}")
+        raise_database_error(e, "Failed to create feedback")
+    invalidate_cached_lists(response_cache, "feedback")
+    return {"detail": "Feedback created successfully"}
+
+
+async def create_cancellation_batch(items: list[Any], pg_manager: AsyncPostgresManager, response_cache: Optional[ResponseCache] = None) -> BatchSubmissionResult:
+    """Validate a batch of cancellations and insert the valid ones in one transaction."""
+    cancellations, errors = validate_batch(items, CreateCancellation)
+    try:
+        created = await pg_manager.execute_batch_insert("cancellation", INSERT_CANCELLATION_COLUMNS, [cancellation_params(c) for c in cancellations])
+    except Exception as e:
+        logger.error(f"Error creating cancellation batch: {e}")
+        raise_database_error(e, "Failed to create cancellations")
+    if created:
+        invalidate_cached_lists(response_cache, "cancellation")
+    return batch_submission_result(created, errors)
+
+
+async def create_feedback_batch(items: list[Any], pg_manager: AsyncPostgresManager, response_cache: Optional[ResponseCache] = None) -> BatchSubmissionResult:
+    """Validate a batch of feedbacks and insert the valid ones in one transaction."""
+    feedbacks, errors = validate_batch(items, CreateFeedback)
+    try:
+        created = await pg_manager.execute_batch_insert("feedback", INSERT_FEEDBACK_COLUMNS, [feedback_params(f) for f in feedbacks])
+    except Exception as e:
+        logger.error(f"Error creating feedback batch: {e}")
+        raise_database_error(e, "Failed to create feedbacks")
+    if created:
+        invalidate_cached_lists(response_cache, "feedback")
+    return batch_submission_result(created, errors)
+
+
+async def archive_cancellation(cancellation_id: UUID, pg_manager: AsyncPostgresManager, request: Request, response_cache: Optional[ResponseCache] = None, created_at: Optional[datetime] = None):
+    """Archive a cancellation entry in the database."""
+    deny_for_non_admins(request)
+    try:
+        if created_at is None:
+            await pg_manager.execute_modification_query(ARCHIVE_CANCELLATION_SQL, (cancellation_id,))
+        else:
+            await pg_manager.execute_modification_query(ARCHIVE_CANCELLATION_AT_SQL, (cancellation_id, created_at))
+    except Exception as e:
+        logger.error(f"Error archiving cancellation: {e}")
+        raise_database_error(e, "Failed to archive cancellation")
+    invalidate_cached_lists(response_cache, "cancellation")
+    return {"detail": "Cancellation archived successfully"}
+
+
+async def archive_feedback(feedback_id: UUID, pg_manager: AsyncPostgresManager, request: Request, response_cache: Optional[ResponseCache] = None, created_at: Optional[datetime] = None):
+    """Archive a feedback entry in the database."""
+    deny_for_non_admins(request)
+    try:
+        if created_at is None:
+            await pg_manager.execute_modification_query(ARCHIVE_FEEDBACK_SQL, (feedback_id,))
+        else:
+            await pg_manager.execute_modification_query(ARCHIVE_FEEDBACK_AT_SQL, (feedback_id, created_at))
+    except Exception as e:
+        logger.error(f"Error archiving feedback: {e}")
+        raise_database_error(e, "Failed to archive feedback")
+    invalidate_cached_lists(response_cache, "feedback")
+    return {"detail": "Feedback archived successfully"}
+
+
+async def bulk_archive(table: str, archive_request: BulkArchiveRequest, pg_manager: AsyncPostgresManager) -> BulkArchiveResult:
+    """Archive forms by ID in one statement, or by creation time in chunks within one transaction."""
+    if archive_request.ids is not None and archive_request.created_at is not None:
+        rows = await pg_manager.execute_returning_query(BULK_ARCHIVE_BY_KEYS_SQL[table], (archive_request.ids, archive_request.created_at))
+        return bulk_archive_result(rows)
+    if archive_request.ids is not None:
+        rows = await pg_manager.execute_returning_query(BULK_ARCHIVE_BY_IDS_SQL[table], (archive_request.ids,))
+        return bulk_archive_result(rows)
+
+    rows = []
+    chunk_size = pg_manager.bulk_chunk_size
+    async with pg_manager.transaction() as connection:
+        while True:
+            chunk = await pg_manager.execute_returning_query(
+                BULK_ARCHIVE_CREATED_BEFORE_SQL[table],
+                (archive_request.created_before, chunk_size),
+                connection=connection,
+                commit=False
+            )
+            rows.extend(chunk)
+            if len(chunk) < chunk_size:
+                break
+    return bulk_archive_result(rows)
+
+
+async def bulk_archive_cancellations(archive_request: BulkArchiveRequest, pg_manager: AsyncPostgresManager, request: Request, response_cache: Optional[ResponseCache] = None) -> BulkArchiveResult:
+    """Archive many cancellation entries at once."""
+    deny_for_non_admins(request)
+    try:
+        result = await bulk_archive("cancellation", archive_request, pg_manager)
+    except Exception as e:
+        logger.error(f"Error bulk archiving cancellations: {e}")
+        raise_database_error(e, "Failed to archive cancellations")
+    if result.archived:
+        invalidate_cached_lists(response_cache, "cancellation")
+    return result
+
+
+async def bulk_archive_feedbacks(archive_request: BulkArchiveRequest, pg_manager: AsyncPostgresManager, request: Request, response_cache: Optional[ResponseCache] = None) -> BulkArchiveResult:
+    """Archive many feedback entries at once."""
+    deny_for_non_admins(request)
+    try:
+        result = await bulk_archive("feedback", archive_request, pg_manager)
+    except Exception as e:
+        logger.error(f"Error bulk archiving feedbacks: {e}")
+        raise_database_error(e, "Failed to archive feedbacks")
+    if result.archived:
+        invalidate_cached_lists(response_cache, "feedback")
+    return result
+
+
+async def get_all_cancellations(pg_manager: AsyncPostgresManager, request: Request, list_params: CancellationListParams, response_cache: Optional[ResponseCache] = None) -> Response:
+    """Retrieve one page of cancellations, answering unchanged conditional requests with 304 and serving from the response cache when possible."""
+    deny_for_non_admins(request)
+    etag = list_etag(await change_version(pg_manager, "cancellation"), list_params)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if response_cache is None:
+        body = await load_cancellation_page(pg_manager, list_params)
+        return json_response(body, etag)
+    key, version, body = list_cache_lookup(response_cache, "cancellation", list_params, etag)
+    if body is None:
+        body = await load_cancellation_page(pg_manager, list_params)
+        response_cache.put("cancellation", key, version, body)
+    return json_response(body, etag)
+
+
+async def load_cancellation_page(pg_manager: AsyncPostgresManager, list_params: CancellationListParams) -> bytes:
+    """Retrieve one page of cancellations from the database, encoded as JSON without per-row validation."""
+    sql, params = build_list_query(SELECT_CANCELLATIONS_SQL, "cancellation", list_params)
+    try:
+        columns, rows = await pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error retrieving cancellations: {e}")
+        raise_database_error(e, "Failed to retrieve cancellations")
+    next_cursor = next_page_cursor(columns, rows, list_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return serialization.encode_page(columns, rows, next_cursor)
+
+
+async def get_all_feedbacks(pg_manager: AsyncPostgresManager, request: Request, list_params: FeedbackListParams, response_cache: Optional[ResponseCache] = None) -> Response:
+    """Retrieve one page of feedbacks, answering unchanged conditional requests with 304 and serving from the response cache when possible."""
+    deny_for_non_admins(request)
+    etag = list_etag(await change_version(pg_manager, "feedback"), list_params)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if response_cache is None:
+        body = await load_feedback_page(pg_manager, list_params)
+        return json_response(body, etag)
+    key, version, body = list_cache_lookup(response_cache, "feedback", list_params, etag)
+    if body is None:
+        body = await load_feedback_page(pg_manager, list_params)
+        response_cache.put("feedback", key, version, body)
+    return json_response(body, etag)
+
+
+async def load_feedback_page(pg_manager: AsyncPostgresManager, list_params: FeedbackListParams) -> bytes:
+    """Retrieve one page of feedbacks from the database, encoded as JSON without per-row validation."""
+    sql, params = build_list_query(SELECT_FEEDBACKS_SQL, "feedback", list_params)
+    try:
+        columns, rows = await pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error retrieving feedbacks: {e}")
+        raise_database_error(e, "Failed to retrieve feedbacks")
+    next_cursor = next_page_cursor(columns, rows, list_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return serialization.encode_page(columns, rows, next_cursor)
+
+
+async def search_cancellations(pg_manager: AsyncPostgresManager, request: Request, search_params: CancellationSearchParams) -> Response:
+    """Full-text search over cancellation reasons, ranked by relevance with highlighted excerpts."""
+    deny_for_non_admins(request)
+    sql, params = build_search_query(SEARCH_CANCELLATIONS_SQL, "cancellation", search_params)
+    try:
+        columns, rows = await pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error searching cancellations: {e}")
+        raise_database_error(e, "Failed to search cancellations")
+    next_cursor = next_search_cursor(columns, rows, search_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return json_response(serialization.encode_page(columns, rows, next_cursor))
+
+
+async def search_feedbacks(pg_manager: AsyncPostgresManager, request: Request, search_params: FeedbackSearchParams) -> Response:
+    """Full-text search over feedback texts, ranked by relevance with highlighted excerpts."""
+    deny_for_non_admins(request)
+    sql, params = build_search_query(SEARCH_FEEDBACKS_SQL, "feedback", search_params)
+    try:
+        columns, rows = await pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error searching feedbacks: {e}")
+        raise_database_error(e, "Failed to search feedbacks")
+    next_cursor = next_search_cursor(columns, rows, search_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return json_response(serialization.encode_page(columns, rows, next_cursor))
+
+
+async def export_cancellations(pg_manager: AsyncPostgresManager, request: Request, export_params: CancellationExportParams) -> StreamingResponse:
+    """Stream all matching cancellations as NDJSON or CSV."""
+    deny_for_non_admins(request)
+    sql, params = build_export_query(EXPORT_CANCELLATIONS_SQL, "cancellation", export_params)
+    try:
+        batches = await pg_manager.stream_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error exporting cancellations: {e}")
+        raise_database_error(e, "Failed to export cancellations")
+    return export_response(export.aencode_batches(CANCELLATION_COLUMNS, batches, export_params.format), "cancellations", export_params.format)
+
+
+async def export_feedbacks(pg_manager: AsyncPostgresManager, request: Request, export_params: FeedbackExportParams) -> StreamingResponse:
+    """Stream all matching feedbacks as NDJSON or CSV."""
+    deny_for_non_admins(request)
+    sql, params = build_export_query(EXPORT_FEEDBACKS_SQL, "feedback", export_params)
+    try:
+        batches = await pg_manager.stream_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error exporting feedbacks: {e}")
+        raise_database_error(e, "Failed to export feedbacks")
+    return export_response(export.aencode_batches(FEEDBACK_COLUMNS, batches, export_params.format), "feedbacks", export_params.format)
+
+
+async def get_form_stats(pg_manager: AsyncPostgresManager, request: Request, stats_params: StatsParams) -> FormStats:
+    """Report daily cancellation and feedback counts from the rollup tables."""
+    deny_for_non_admins(request)
+    params = (stats_params.date_from, stats_params.date_to)
+    try:
+        async with pg_manager.get_connection(read_only=True) as connection:
+            results = [await pg_manager.execute_raw_query(sql, params, connection) for sql in STATS_QUERIES]
+    except Exception as e:
+        logger.error(f"Error retrieving form stats: {e}")
+        raise_database_error(e, "Failed to retrieve form stats")
+    return form_stats(stats_params, results)
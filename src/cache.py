@@ -0,0 +1,99 @@
+"""
+Size-bounded LRU cache for pre-serialized list responses, invalidated per table
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+import logging
+
+from src.config import get_env_int
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Caches JSON response bodies keyed by table and query parameters.
+
+    Every table has a version counter that write paths bump. Entries remember the
+    version they were computed at and are treated as misses once it moved on.
+    """
+
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Upper bound on the summed size of cached bodies
+        """
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], bytes]] = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+
+    def version(self, table: str) -> Tuple[int, int]:
+        """Return the current version of a table"""
+        return (self._generation, self._versions.get(table, 0))
+
+
+    def get(self, table: str, key: str) -> Optional[bytes]:
+        """Return the cached body for a table and key if it is still current"""
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is None:
+                return None
+            version, body = entry
+            if version != self.version(table):
+                self._remove((table, key))
+                return None
+            self._entries.move_to_end((table, key))
+            return body
+
+
+    def put(self, table: str, key: str, version: Tuple[int, int], body: bytes) -> None:
+        """Cache a body computed at the given table version, unless the table changed meanwhile"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version(table):
+                return
+            self._remove((table, key))
+            self._entries[(table, key)] = (version, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+
+    def _remove(self, entry_key: Tuple[str, str]) -> None:
+        """Drop an entry; the caller holds the lock"""
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+    def invalidate(self, table: str) -> None:
+        """Bump the version of a table so its cached responses are no longer served"""
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+
+    def invalidate_all(self) -> None:
+        """Invalidate every table, e.g. after notifications may have been missed"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Create the response cache from environment variables, or None if disabled"""
+    max_bytes = get_env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    if max_bytes <= 0:
+        logger.info("Response cache disabled")
+        return None
+    return ResponseCache(max_bytes)
@@ -0,0 +1,108 @@
+"""
+Circuit breaker in front of the primary database.
+
+After a number of consecutive connection failures (refused or timed-out connections,
+pool timeouts, connections dropping mid-statement) the breaker opens and the database
+managers fail fast with CircuitOpenError instead of piling requests up in front of a
+database that is down. Once the reset timeout has passed, one request is let through as
+a probe; the breaker closes when it succeeds and stays open for another period otherwise.
+"""
+import threading
+import time
+import logging
+
+from src.config import get_env_float, get_env_int
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DatabaseUnavailableError(Exception):
+    """Raised when no connection to the primary database could be opened, before any statement was sent"""
+
+
+class CircuitOpenError(DatabaseUnavailableError):
+    """Raised instead of contacting the database while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker; a threshold of 0 disables it"""
+
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            threshold: Consecutive failures after which the breaker opens
+            reset_timeout: Seconds the breaker stays open before letting a probe through
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+
+    def before_call(self) -> None:
+        """Let a call through, or raise CircuitOpenError while the breaker is open"""
+        if self.state == CLOSED:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                metrics.CIRCUIT_BREAKER_REJECTED.inc()
+                raise CircuitOpenError(f"Database circuit breaker is open, next probe in {remaining:.1f}s")
+            # One probe per reset period; calls arriving meanwhile are still rejected
+            self.opened_at = now
+            if self.state == OPEN:
+                logger.info("Database circuit breaker half-open, probing the database")
+            self.state = HALF_OPEN
+
+
+    def record_success(self) -> None:
+        """Close the breaker after a call reached the database"""
+        if self.state == CLOSED:
+            self.failures = 0
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Database circuit breaker closed, the database is reachable again")
+            self.state = CLOSED
+            self.failures = 0
+
+
+    def record_failure(self, error: Exception) -> None:
+        """Count a connection failure, opening the breaker at the threshold or when a probe failed"""
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                logger.warning(
+                    f"Opening database circuit breaker for {self.reset_timeout}s after "
+                    f"{self.failures} consecutive failures: {str(error).strip()}"
+                )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+    def is_closed(self) -> bool:
+        """Whether calls currently reach the database without restriction"""
+        return self.state == CLOSED
+
+
+def create_circuit_breaker() -> CircuitBreaker:
+    """Create the circuit breaker from environment variables"""
+    return CircuitBreaker(
+        get_env_int("POSTGRES_CIRCUIT_BREAKER_THRESHOLD", 5),
+        get_env_float("POSTGRES_CIRCUIT_BREAKER_RESET_TIMEOUT", 5.0),
+    )
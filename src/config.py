@@ -0,0 +1,53 @@
+"""
+Helpers for reading service settings from environment variables
+"""
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_env_str(name: str, default: str) -> str:
+    """Read a string setting, falling back to the default if unset"""
+    if name in os.environ:
+        value = os.environ[name]
+        logger.info(f"Using '{value}' from environment variable '{name}'")
+        return value
+    logger.info(f"Using default '{default}' since '{name}' not set")
+    return default
+
+
+def get_env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default if unset or invalid"""
+    if name in os.environ:
+        try:
+            value = int(os.environ[name])
+            logger.info(f"Using '{value}' from environment variable '{name}'")
+            return value
+        except ValueError:
+            logger.warning(f"Ignoring invalid integer '{os.environ[name]}' in '{name}'")
+    logger.info(f"Using default '{default}' since '{name}' not set")
+    return default
+
+
+def get_env_float(name: str, default: float) -> float:
+    """Read a float setting, falling back to the default if unset or invalid"""
+    if name in os.environ:
+        try:
+            value = float(os.environ[name])
+            logger.info(f"Using '{value}' from environment variable '{name}'")
+            return value
+        except ValueError:
+            logger.warning(f"Ignoring invalid number '{os.environ[name]}' in '{name}'")
+    logger.info(f"Using default '{default}' since '{name}' not set")
+    return default
+
+
+def get_env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting ('true'/'1'/'yes'), falling back to the default if unset"""
+    if name in os.environ:
+        value = os.environ[name].strip().lower() in ("1", "true", "yes", "on")
+        logger.info(f"Using '{value}' from environment variable '{name}'")
+        return value
+    logger.info(f"Using default '{default}' since '{name}' not set")
+    return default
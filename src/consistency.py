@@ -0,0 +1,100 @@
+"""
+Per-request read routing state for read replicas.
+
+All reads of one request go to the same replica, so values read together (like a
+table's change counter and a page of its rows) come from the same snapshot of the
+data. With POSTGRES_READ_YOUR_WRITES enabled, responses to requests that wrote carry
+an X-Read-After header with the primary's WAL position after the write. Requests that
+send it back are only served by replicas that have replayed that far, or by the primary.
+"""
+from contextvars import ContextVar
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+READ_AFTER_HEADER = b"x-read-after"
+# Marks a request whose reads were routed to the primary
+PRIMARY = -1
+
+
+class RequestConsistency:
+    """Read routing state of one request, shared with the worker threads it runs on"""
+
+
+    __slots__ = ("read_after", "written", "read_pool")
+
+
+    def __init__(self, read_after: int = 0):
+        self.read_after = read_after
+        self.written = 0
+        self.read_pool: Optional[int] = None
+
+
+_current: ContextVar[Optional[RequestConsistency]] = ContextVar("forms_consistency", default=None)
+
+
+def parse_lsn(text: str) -> int:
+    """Parse a WAL position like '16/B374D848' into an integer"""
+    high, low = text.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def format_lsn(lsn: int) -> str:
+    """Format an integer WAL position the way Postgres prints it"""
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+def current() -> Optional[RequestConsistency]:
+    """The read routing state of the running request, or None outside of requests"""
+    return _current.get()
+
+
+def required_lsn() -> int:
+    """WAL position a replica must have replayed to serve the running request"""
+    request = _current.get()
+    if request is None:
+        return 0
+    return max(request.read_after, request.written)
+
+
+def record_write(lsn: int) -> None:
+    """Remember the primary's WAL position after a write of the running request"""
+    request = _current.get()
+    if request is not None:
+        request.written = max(request.written, lsn)
+
+
+class ReadConsistencyMiddleware:
+    """ASGI middleware reading X-Read-After from requests and setting it on responses to requests that wrote"""
+
+
+    def __init__(self, app):
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        read_after = 0
+        for name, value in scope["headers"]:
+            if name == READ_AFTER_HEADER:
+                try:
+                    read_after = parse_lsn(value.decode("latin-1"))
+                except ValueError:
+                    logger.debug(f"Ignoring invalid X-Read-After header '{value!r}'")
+                break
+        request = RequestConsistency(read_after)
+        token = _current.set(request)
+
+        async def send_with_position(message):
+            if message["type"] == "http.response.start" and request.written:
+                message["headers"] = list(message.get("headers", [])) + [(READ_AFTER_HEADER, format_lsn(request.written).encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_position)
+        finally:
+            _current.reset(token)
@@ -1,9 +1,20 @@
 """
 Dependency injection container for FastAPI Utils
 """
-from typing import Any, Dict, Callable
+from typing import Any, Dict, Callable, Optional
 
 from src.managers.postgres_manager import PostgresManager
+from src.managers.async_postgres_manager import AsyncPostgresManager
+from src.managers.write_coalescer import WriteCoalescer, AsyncWriteCoalescer, write_coalescing_enabled
+from src.managers.notification_listener import NotificationListener
+from src.managers.partition_maintenance import PartitionMaintenance
+from src.managers.retention_job import RetentionJob
+from src.managers.stats_rollup import StatsRollup
+from src.managers.submission_spool import SubmissionSpool, create_submission_spool
+from src.cache import ResponseCache, create_response_cache
+from src.idempotency import IdempotencyCache, create_idempotency_cache
+from src.events import EventHub, create_event_hub
+from src.config import get_env_str
 
 
 class DependencyContainer:
@@ -35,6 +46,10 @@ class DependencyContainer:
             return instance
             
         raise ValueError(f"Service '{service_name}' not found in container")
+
+    def has(self, service_name: str) -> bool:
+        """Check whether a service has been created or registered"""
+        return service_name in self._singletons or service_name in self._factories
     
     def clear(self) -> None:
         """Clear all registered services"""
@@ -51,14 +66,146 @@ def create_postgres_manager() -> PostgresManager:
     return PostgresManager()
 
 
+def create_async_postgres_manager() -> AsyncPostgresManager:
+    """Factory function to create AsyncPostgresManager instance"""
+    return AsyncPostgresManager()
+
+
+def get_db_mode() -> str:
+    """Return the configured database mode: 'sync' (psycopg2, threadpool routes) or 'async' (psycopg 3, async routes)"""
+    mode = get_env_str("DB_MODE", "sync").lower()
+    if mode not in ("sync", "async"):
+        raise ValueError(f"Invalid DB_MODE '{mode}', expected 'sync' or 'async'")
+    return mode
+
+
 def setup_dependencies() -> None:
     """Setup all dependencies in the container"""
     container.clear()
     
     # Register singleton instances
-    container.register_singleton("postgres_manager", create_postgres_manager())
+    if get_db_mode() == "async":
+        container.register_singleton("async_postgres_manager", create_async_postgres_manager())
+        if write_coalescing_enabled():
+            container.register_singleton("write_coalescer", AsyncWriteCoalescer(container.get("async_postgres_manager")))
+    else:
+        container.register_singleton("postgres_manager", create_postgres_manager())
+        if write_coalescing_enabled():
+            container.register_singleton("write_coalescer", WriteCoalescer(container.get("postgres_manager")))
+
+    settings = container.get("async_postgres_manager" if container.has("async_postgres_manager") else "postgres_manager")
+    container.register_singleton("partition_maintenance", PartitionMaintenance(settings))
+    container.register_singleton("retention_job", RetentionJob(settings))
+    container.register_singleton("stats_rollup", StatsRollup(settings))
+
+    container.register_singleton("idempotency_cache", create_idempotency_cache())
+
+    submission_spool = create_submission_spool(settings)
+    if submission_spool is not None:
+        container.register_singleton("submission_spool", submission_spool)
+
+    response_cache = create_response_cache()
+    event_hub = create_event_hub()
+    if response_cache is None and event_hub is None:
+        return
+    # One LISTEN connection per process feeds both
+    listener = NotificationListener(settings)
+    if response_cache is not None:
+        container.register_singleton("response_cache", response_cache)
+        # Writes made by other processes reach this one's cache through NOTIFY
+        listener.subscribe("forms_changes", response_cache.invalidate)
+        listener.on_reconnect(response_cache.invalidate_all)
+    if event_hub is not None:
+        container.register_singleton("event_hub", event_hub)
+        listener.subscribe("form_events", event_hub.publish)
+        listener.on_reconnect(event_hub.reset)
+    container.register_singleton("notification_listener", listener)
+
+
+async def open_dependencies() -> None:
+    """Open services that need an event loop to start"""
+    if container.has("async_postgres_manager"):
+        await container.get("async_postgres_manager").open()
+        if container.has("write_coalescer"):
+            container.get("write_coalescer").start()
+    if container.has("event_hub"):
+        container.get("event_hub").start()
+    if container.has("notification_listener"):
+        container.get("notification_listener").start()
+    container.get("partition_maintenance").start()
+    container.get("retention_job").start()
+    container.get("stats_rollup").start()
+    if container.has("submission_spool"):
+        container.get("submission_spool").start()
+
+
+async def teardown_dependencies() -> None:
+    """Release resources held by the registered services"""
+    if container.has("notification_listener"):
+        container.get("notification_listener").close()
+    if container.has("event_hub"):
+        container.get("event_hub").close()
+    if container.has("partition_maintenance"):
+        container.get("partition_maintenance").close()
+    if container.has("retention_job"):
+        container.get("retention_job").close()
+    if container.has("stats_rollup"):
+        container.get("stats_rollup").close()
+    # Drain queued writes while the database pools are still open
+    if container.has("write_coalescer"):
+        coalescer = container.get("write_coalescer")
+        if isinstance(coalescer, AsyncWriteCoalescer):
+            await coalescer.close()
+        else:
+            coalescer.close()
+    if container.has("submission_spool"):
+        container.get("submission_spool").close()
+    if container.has("postgres_manager"):
+        container.get("postgres_manager").close()
+    if container.has("async_postgres_manager"):
+        await container.get("async_postgres_manager").close()
+    container.clear()
 
 
 def get_postgres_manager() -> PostgresManager:
     """FastAPI dependency function to get PostgresManager instance"""
-    return container.get("postgres_manager")
\ No newline at end of file
+    return container.get("postgres_manager")
+
+
+def get_async_postgres_manager() -> AsyncPostgresManager:
+    """FastAPI dependency function to get AsyncPostgresManager instance"""
+    return container.get("async_postgres_manager")
+
+
+def get_write_coalescer() -> Optional[WriteCoalescer | AsyncWriteCoalescer]:
+    """FastAPI dependency function to get the write coalescer, or None if write coalescing is disabled"""
+    if container.has("write_coalescer"):
+        return container.get("write_coalescer")
+    return None
+
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """FastAPI dependency function to get the response cache, or None if caching is disabled"""
+    if container.has("response_cache"):
+        return container.get("response_cache")
+    return None
+
+
+def get_idempotency_cache() -> IdempotencyCache:
+    """FastAPI dependency function to get the cache of stored Idempotency-Key responses"""
+    return container.get("idempotency_cache")
+
+
+def get_event_hub() -> Optional[EventHub]:
+    """FastAPI dependency function to get the live form event hub, or None if the feed is disabled"""
+    if container.has("event_hub"):
+        return container.get("event_hub")
+    return None
+
+
+def get_submission_spool() -> Optional[SubmissionSpool]:
+    """FastAPI dependency function to get the submission spool, or None if spooling is disabled"""
+    if container.has("submission_spool"):
+        return container.get("submission_spool")
+    return None
@@ -0,0 +1,169 @@
+"""
+In-process fan-out of the form_events notifications behind GET /forms/events.
+
+The notification listener hands every notification to the EventHub, which keeps the most
+recent events in a ring buffer and passes them on to the bounded queue of each connected
+client. Every worker listens on its own connection and receives notifications in the same
+commit order, so a client reconnecting with Last-Event-ID resumes right after that event on
+any worker, as long as the event is still buffered there. Otherwise, and whenever
+notifications may have been missed, the client gets a reset event telling it to reload.
+"""
+from collections import deque
+from typing import AsyncIterator, List, NamedTuple, Optional, Set
+import asyncio
+import logging
+
+import orjson
+
+from src.config import get_env_float, get_env_int
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+# Ends a client's stream; it reconnects with the Last-Event-ID it got so far
+_CLOSE = None
+
+
+class FormEvent(NamedTuple):
+    """A buffered event and its encoded Server-Sent Events message"""
+    id: int
+    frame: bytes
+
+
+def encode_event(event: dict) -> FormEvent:
+    """Turn one event of a form_events notification into an SSE message"""
+    event_id = event.pop("event_id")
+    name = event.pop("event")
+    return FormEvent(event_id, b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, name.encode(), orjson.dumps(event)))
+
+
+class EventHub:
+    """
+    Ring buffer of recent form events and the queues of the clients following them.
+
+    publish() and reset() may be called from any thread; everything else runs on the
+    event loop start() was called on, so replaying the buffer to a new client and adding
+    it to the live subscribers cannot miss or repeat an event.
+    """
+
+
+    def __init__(self, buffer_size: int, client_buffer_size: int, heartbeat_interval: float):
+        """
+        Initialize an empty hub. Call start() from the event loop before publishing.
+
+        Args:
+            buffer_size: Recent events kept for clients resuming with Last-Event-ID
+            client_buffer_size: Events queued per client before it is disconnected as too slow
+            heartbeat_interval: Idle seconds after which clients get a keep-alive comment
+        """
+        self.buffer_size = buffer_size
+        self.client_buffer_size = client_buffer_size
+        self.heartbeat_interval = heartbeat_interval
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+    def start(self) -> None:
+        """Bind the hub to the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        metrics.EVENT_SUBSCRIBERS.set_function("event_hub", lambda: {(): len(self._subscribers)})
+
+
+    def publish(self, payload: str) -> None:
+        """Pass on the events of a form_events notification"""
+        events = [encode_event(event) for event in orjson.loads(payload)]
+        self._loop.call_soon_threadsafe(self._publish, events)
+
+
+    def reset(self) -> None:
+        """Forget the buffer and tell clients to reload, after notifications may have been missed"""
+        self._loop.call_soon_threadsafe(self._reset)
+
+
+    def _publish(self, events: List[FormEvent]) -> None:
+        self._buffer.extend(events)
+        for queue in list(self._subscribers):
+            for event in events:
+                if not self._offer(queue, event.frame):
+                    break
+
+
+    def _reset(self) -> None:
+        self._buffer.clear()
+        for queue in list(self._subscribers):
+            self._offer(queue, RESET_FRAME)
+
+
+    def _offer(self, queue: asyncio.Queue, frame: bytes) -> bool:
+        """Queue a message for a client, disconnecting the client if its queue is full"""
+        try:
+            queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            # The client resumes from the ring buffer when it reconnects, so its backlog can go
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSE)
+            self._subscribers.discard(queue)
+            metrics.EVENT_CLIENTS_DROPPED.inc()
+            return False
+
+
+    def _replay(self, last_event_id: Optional[str]) -> List[bytes]:
+        """Messages a client resuming after last_event_id has missed"""
+        try:
+            event_id = int(last_event_id)
+        except ValueError:
+            return [RESET_FRAME]
+        buffered = list(self._buffer)
+        for position in range(len(buffered) - 1, -1, -1):
+            if buffered[position].id == event_id:
+                return [event.frame for event in buffered[position + 1:]]
+        return [RESET_FRAME]
+
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Follow the events as SSE messages, starting after last_event_id if given"""
+        queue: asyncio.Queue = asyncio.Queue(self.client_buffer_size)
+        self._subscribers.add(queue)
+        try:
+            if last_event_id is not None:
+                for frame in self._replay(last_event_id):
+                    yield frame
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+                if frame is _CLOSE:
+                    return
+                yield frame
+        finally:
+            self._subscribers.discard(queue)
+
+
+    def close(self) -> None:
+        """End all client streams"""
+        for queue in list(self._subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSE)
+        self._subscribers.clear()
+        metrics.EVENT_SUBSCRIBERS.remove_function("event_hub")
+
+
+def create_event_hub() -> Optional[EventHub]:
+    """Create the event hub from environment variables, or None if the live feed is disabled"""
+    buffer_size = get_env_int("FORM_EVENTS_BUFFER_SIZE", 1000)
+    if buffer_size <= 0:
+        logger.info("Live form events disabled")
+        return None
+    return EventHub(
+        buffer_size,
+        get_env_int("FORM_EVENTS_CLIENT_BUFFER_SIZE", 256),
+        get_env_float("FORM_EVENTS_HEARTBEAT_INTERVAL", 15.0),
+    )
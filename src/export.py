@@ -0,0 +1,65 @@
+"""
+Encoders that turn streamed row batches into NDJSON or CSV chunks
+"""
+from datetime import date, datetime
+from typing import Iterable, Iterator, AsyncIterator, Sequence
+import csv
+import io
+import json
+
+from src.models import ExportFormat
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(columns: Sequence[str], rows: Iterable[tuple]) -> bytes:
+    """Encode a batch of rows as newline-delimited JSON objects"""
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def encode_csv(columns: Sequence[str], rows: Iterable[tuple]) -> bytes:
+    """Encode a batch of rows as CSV lines without a header"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def csv_header(columns: Sequence[str]) -> bytes:
+    """Encode the CSV header line"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue().encode()
+
+
+def encode_batches(columns: Sequence[str], batches: Iterator[list], export_format: ExportFormat) -> Iterator[bytes]:
+    """Encode streamed row batches into response chunks"""
+    if export_format == "csv":
+        yield csv_header(columns)
+        for rows in batches:
+            yield encode_csv(columns, rows)
+    else:
+        for rows in batches:
+            yield encode_ndjson(columns, rows)
+
+
+async def aencode_batches(columns: Sequence[str], batches: AsyncIterator[list], export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Encode async streamed row batches into response chunks"""
+    if export_format == "csv":
+        yield csv_header(columns)
+        async for rows in batches:
+            yield encode_csv(columns, rows)
+    else:
+        async for rows in batches:
+            yield encode_ndjson(columns, rows)
@@ -1,11 +1,231 @@
-from src.managers.postgres_manager import PostgresManager
-from src.models import CreateCancellation, CreateFeedback, Cancellation, Feedback
+from src.managers.postgres_manager import PostgresManager, PoolTimeoutError
+from src.managers.write_coalescer import WriteCoalescer, QueueFullError
+from src.managers.submission_spool import SubmissionSpool, SpoolFullError
+from src.circuit_breaker import DatabaseUnavailableError
+from src.models import (
+    CreateCancellation, CreateFeedback,
+    CancellationListParams, FeedbackListParams,
+    FeedbackFilterParams, CancellationExportParams, FeedbackExportParams, ExportFormat,
+    BulkArchiveRequest, BulkArchiveItem, BulkArchiveResult,
+    BatchItemError, BatchSubmissionResult,
+    StatsParams, FormStats, CancellationStats, FeedbackStats,
+    CancellationSearchParams, FeedbackSearchParams,
+)
+from src.cache import ResponseCache
+from src.idempotency import IdempotencyCache, StoredResponse, request_hash
+from src.events import EventHub
+from src import export, metrics, serialization, tracing
 
 from fastapi import HTTPException, status, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Optional
+from datetime import datetime
+from uuid import UUID
+import base64
+import hashlib
+import binascii
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+INSERT_CANCELLATION_COLUMNS = ("email", "name", "last_name", "address", "town", "town_number", "is_unordinary", "reason", "last_invoice_number", "termination_date")
+INSERT_FEEDBACK_COLUMNS = ("email", "text")
+INSERT_COLUMNS = {"cancellation": INSERT_CANCELLATION_COLUMNS, "feedback": INSERT_FEEDBACK_COLUMNS}
+INSERT_CANCELLATION_SQL = "INSERT INTO cancellation (email, name, last_name, address, town, town_number, is_unordinary, reason, last_invoice_number, termination_date) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+INSERT_FEEDBACK_SQL = "INSERT INTO feedback (email, text) VALUES (%s, %s)"
+# Claims an Idempotency-Key (or takes over an expired one) and inserts the form in the same statement;
+# returns no row if the key is taken, in which case SELECT_IDEMPOTENCY_KEY_SQL reads the stored response.
+# Table and column names come from INSERT_COLUMNS, never from the request.
+IDEMPOTENT_INSERT_SQL = {table: f"""
+    WITH claimed AS (
+        INSERT INTO idempotency_keys AS k (form_type, key, request_hash, status_code, response)
+        VALUES ('{table}', %s, %s, %s, %s)
+        ON CONFLICT (form_type, key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, status_code = EXCLUDED.status_code,
+                response = EXCLUDED.response, created_at = EXCLUDED.created_at
+            WHERE k.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        RETURNING key
+    ), inserted AS (
+        INSERT INTO {table} ({", ".join(columns)})
+        SELECT {", ".join(["%s"] * len(columns))} WHERE EXISTS (SELECT 1 FROM claimed)
+    )
+    SELECT key FROM claimed
+""" for table, columns in INSERT_COLUMNS.items()}  # nosec B608
+SELECT_IDEMPOTENCY_KEY_SQL = """
+    SELECT request_hash, status_code, response, EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - created_at)::float8 AS age
+    FROM idempotency_keys
+    WHERE form_type = %s AND key = %s
+"""
+CREATED_RESPONSES = {
+    "cancellation": {"detail": "Cancellation created successfully"},
+    "feedback": {"detail": "Feedback created successfully"},
+}
+SPOOLED_RESPONSES = {
+    "cancellation": {"detail": "Cancellation accepted and will be saved shortly"},
+    "feedback": {"detail": "Feedback accepted and will be saved shortly"},
+}
+# Raised before a statement reached the database, so spooling the submission cannot duplicate it
+SPOOLABLE_ERRORS = (DatabaseUnavailableError, PoolTimeoutError)
+ARCHIVE_CANCELLATION_SQL = "UPDATE cancellation SET is_archived = true WHERE id = %s"
+ARCHIVE_FEEDBACK_SQL = "UPDATE feedback SET is_archived = true WHERE id = %s"
+# IDs are only unique per monthly partition; given the creation time too, only the form's own partition is searched
+ARCHIVE_CANCELLATION_AT_SQL = "UPDATE cancellation SET is_archived = true WHERE id = %s AND created_at = %s"
+ARCHIVE_FEEDBACK_AT_SQL = "UPDATE feedback SET is_archived = true WHERE id = %s AND created_at = %s"
+# Columns are named, typed and ordered like the Cancellation and Feedback models, so rows can be encoded to JSON directly.
+# {source} is the table or view chosen by form_source.
+CANCELLATION_FIELDS_SQL = (
+    "email, name, last_name, address, town, town_number, is_unordinary, reason, "
+    "last_invoice_number, termination_date::timestamp AS termination_date, id, is_archived, created_at"
+)
+FEEDBACK_FIELDS_SQL = "email, text, id, is_archived, created_at"
+# {source} is filled in by form_source with a form table or its _all view, never with request input
+SELECT_CANCELLATIONS_SQL = f"SELECT {CANCELLATION_FIELDS_SQL} FROM {{source}}"  # nosec B608
+SELECT_FEEDBACKS_SQL = f"SELECT {FEEDBACK_FIELDS_SQL} FROM {{source}}"  # nosec B608
+# Adds the per-backend shards bumped by the triggers (migration 0008) to the folded base counter
+SELECT_CHANGE_VERSION_SQL = """
+    SELECT (c.version + COALESCE((SELECT sum(s.version) FROM form_change_shards AS s WHERE s.table_name = c.table_name), 0))::bigint AS version
+    FROM form_change_counter AS c
+    WHERE c.table_name = %s
+"""
+
+CANCELLATION_COLUMNS = ("id", "email", "name", "last_name", "address", "town", "town_number", "is_unordinary", "reason", "last_invoice_number", "termination_date", "created_at", "is_archived")
+FEEDBACK_COLUMNS = ("id", "email", "text", "created_at", "is_archived")
+# Columns are the constants above and {source} comes from form_source, as for the list queries
+EXPORT_CANCELLATIONS_SQL = f"SELECT {', '.join(CANCELLATION_COLUMNS)} FROM {{source}}"  # nosec B608
+EXPORT_FEEDBACKS_SQL = f"SELECT {', '.join(FEEDBACK_COLUMNS)} FROM {{source}}"  # nosec B608
+
+FORM_TABLES = ("cancellation", "feedback")
+# One statement archives every requested ID and reports, per ID, whether it was archived now, before, or never existed.
+# The bulk archive statements are built once per entry of FORM_TABLES, so no request input reaches the SQL text.
+BULK_ARCHIVE_BY_IDS_SQL = {table: f"""
+    WITH requested AS (
+        SELECT DISTINCT unnest(%s::uuid[]) AS id
+    ), archived AS (
+        UPDATE {table} AS f SET is_archived = true
+        FROM requested
+        WHERE f.id = requested.id AND NOT f.is_archived
+        RETURNING f.id
+    )
+    SELECT requested.id,
+        CASE
+            WHEN archived.id IS NOT NULL THEN 'archived'
+            WHEN EXISTS (SELECT 1 FROM {table}_all AS f WHERE f.id = requested.id) THEN 'already_archived'
+            ELSE 'not_found'
+        END AS status
+    FROM requested LEFT JOIN archived ON archived.id = requested.id
+""" for table in FORM_TABLES}  # nosec B608
+# Like BULK_ARCHIVE_BY_IDS_SQL, with the creation time of each ID, so each form is looked up in its own partition only
+BULK_ARCHIVE_BY_KEYS_SQL = {table: f"""
+    WITH requested AS (
+        SELECT DISTINCT id, created_at FROM unnest(%s::uuid[], %s::timestamp[]) AS r (id, created_at)
+    ), archived AS (
+        UPDATE {table} AS f SET is_archived = true
+        FROM requested
+        WHERE f.id = requested.id AND f.created_at = requested.created_at AND NOT f.is_archived
+            -- Lets the partitions outside the requested months be skipped when the update starts
+            AND f.created_at BETWEEN (SELECT min(created_at) FROM requested) AND (SELECT max(created_at) FROM requested)
+        RETURNING f.id, f.created_at
+    )
+    SELECT requested.id,
+        CASE
+            WHEN archived.id IS NOT NULL THEN 'archived'
+            WHEN EXISTS (
+                SELECT 1 FROM {table}_all AS f WHERE f.id = requested.id AND f.created_at = requested.created_at
+            ) THEN 'already_archived'
+            ELSE 'not_found'
+        END AS status
+    FROM requested LEFT JOIN archived ON archived.id = requested.id AND archived.created_at = requested.created_at
+""" for table in FORM_TABLES}  # nosec B608
+# Archives one chunk of unarchived forms created before a point in time
+BULK_ARCHIVE_CREATED_BEFORE_SQL = {table: f"""
+    WITH chunk AS (
+        SELECT id, created_at FROM {table}
+        WHERE created_at < %s AND NOT is_archived
+        ORDER BY created_at, id
+        LIMIT %s
+        FOR UPDATE
+    )
+    UPDATE {table} AS f SET is_archived = true
+    FROM chunk
+    WHERE f.id = chunk.id AND f.created_at = chunk.created_at
+    RETURNING f.id, 'archived' AS status
+""" for table in FORM_TABLES}  # nosec B608
+
+# Ranks the matches of a websearch-style query on a generated tsvector column (migration 0005) and highlights
+# only the rows of the returned page. The text is HTML-escaped before highlighting, so <mark> is the only markup.
+SEARCH_SQL = """
+    SELECT {fields}, rank,
+        ts_headline('simple', replace(replace(replace({text}, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'), query,
+            'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10') AS highlight
+    FROM (
+        SELECT f.*, ts_rank(f.{vector}, query) AS rank, query
+        FROM {{source}} AS f, websearch_to_tsquery('simple', %s) AS query
+        WHERE {{conditions}}
+        ORDER BY rank DESC, created_at DESC, id DESC
+        LIMIT %s
+    ) AS hits
+    ORDER BY rank DESC, created_at DESC, id DESC
+"""
+SEARCH_VECTOR_COLUMNS = {"cancellation": "reason_search", "feedback": "text_search"}
+SEARCH_CANCELLATIONS_SQL = SEARCH_SQL.format(fields=CANCELLATION_FIELDS_SQL, text="COALESCE(reason, '')", vector=SEARCH_VECTOR_COLUMNS["cancellation"])
+SEARCH_FEEDBACKS_SQL = SEARCH_SQL.format(fields=FEEDBACK_FIELDS_SQL, text="COALESCE(text, '')", vector=SEARCH_VECTOR_COLUMNS["feedback"])
+
+# Read the daily rollups maintained by triggers (migrations 0004 and 0009), so their cost depends on the date range, not the table size
+STATS_CANCELLATIONS_DAILY_SQL = """
+    SELECT day,
+        COALESCE(sum(count) FILTER (WHERE NOT is_unordinary), 0)::bigint AS ordinary,
+        COALESCE(sum(count) FILTER (WHERE is_unordinary), 0)::bigint AS unordinary,
+        COALESCE(sum(count) FILTER (WHERE is_archived), 0)::bigint AS archived
+    FROM cancellation_stats_current
+    WHERE day BETWEEN %s AND %s
+    GROUP BY day
+    HAVING sum(count) <> 0
+    ORDER BY day
+"""
+STATS_CANCELLATIONS_BY_REASON_SQL = """
+    SELECT NULLIF(reason, '') AS reason, sum(count)::bigint AS count
+    FROM cancellation_stats_current
+    WHERE day BETWEEN %s AND %s
+    GROUP BY reason
+    HAVING sum(count) <> 0
+    ORDER BY count DESC, reason
+"""
+STATS_CANCELLATIONS_BY_TERMINATION_MONTH_SQL = """
+    SELECT termination_month AS month, sum(count)::bigint AS count
+    FROM cancellation_stats_current
+    WHERE day BETWEEN %s AND %s
+    GROUP BY termination_month
+    HAVING sum(count) <> 0
+    ORDER BY termination_month
+"""
+STATS_FEEDBACK_DAILY_SQL = """
+    SELECT day, sum(count)::bigint AS count, COALESCE(sum(count) FILTER (WHERE is_archived), 0)::bigint AS archived
+    FROM feedback_stats_current
+    WHERE day BETWEEN %s AND %s
+    GROUP BY day
+    HAVING sum(count) <> 0
+    ORDER BY day
+"""
+STATS_QUERIES = (
+    STATS_CANCELLATIONS_DAILY_SQL,
+    STATS_CANCELLATIONS_BY_REASON_SQL,
+    STATS_CANCELLATIONS_BY_TERMINATION_MONTH_SQL,
+    STATS_FEEDBACK_DAILY_SQL,
+)
+
+# Maps list parameters to their WHERE conditions; all of them are served by the indexes in src/migrations
+LIST_FILTER_CONDITIONS = {
+    "email": "lower(email) = lower(%s)",
+    "created_after": "created_at >= %s",
+    "created_before": "created_at < %s",
+    "termination_date_from": "termination_date >= %s",
+    "termination_date_to": "termination_date <= %s",
+}
+# Boolean filters are written into the SQL instead of bound, so "NOT is_archived" matches the partial indexes
+BOOLEAN_FILTER_COLUMNS = ("is_archived", "is_unordinary")
+
 def user_is_admin(request: Request) -> bool:
     return request.headers.get("x-admin", "false").lower() == "true"
 
@@ -16,10 +236,249 @@ def deny_for_non_admins(request: Request):
             detail="Not authorized"
         )
 
-def create_cancellation(cancellation_data: CreateCancellation, pg_manager: PostgresManager):
-    """Creates a new cancellation entry in the database."""
-    sql = "INSERT INTO cancellation (email, name, last_name, address, town, town_number, is_unordinary, reason, last_invoice_number, termination_date) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-    params = (
+def raise_database_error(error: Exception, detail: str):
+    """Translate a failed database operation into an HTTP error"""
+    if isinstance(error, (PoolTimeoutError, QueueFullError, DatabaseUnavailableError)):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry later",
+            headers={"Retry-After": "1"}
+        )
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=detail
+    )
+
+def encode_cursor(created_at: datetime, form_id: UUID) -> str:
+    """Encode the (created_at, id) keyset position of a row as an opaque cursor"""
+    raw = json.dumps([created_at.isoformat(), str(form_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, form_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(form_id)
+    except (ValueError, TypeError, AttributeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def build_filter_conditions(filter_params: FeedbackFilterParams) -> tuple[list[str], list]:
+    """Translate the set filter parameters into WHERE conditions and their values"""
+    conditions = []
+    params = []
+    for field, condition in LIST_FILTER_CONDITIONS.items():
+        value = getattr(filter_params, field, None)
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    for column in BOOLEAN_FILTER_COLUMNS:
+        value = getattr(filter_params, column, None)
+        if value is not None:
+            conditions.append(column if value else f"NOT {column}")
+    return conditions, params
+
+def form_source(table: str, filter_params: FeedbackFilterParams) -> str:
+    """Read only the hot partitioned table when archived forms are filtered out, otherwise the view including the archive table"""
+    return table if filter_params.is_archived is False else f"{table}_all"
+
+def build_list_query(select_sql: str, table: str, list_params: FeedbackListParams) -> tuple[str, tuple]:
+    """Build a keyset-paginated, filtered query ordered by (created_at, id), fetching one extra row to detect a next page"""
+    conditions, params = build_filter_conditions(list_params)
+    if list_params.cursor:
+        conditions.append("(created_at, id) > (%s, %s)")
+        params.extend(decode_cursor(list_params.cursor))
+
+    sql = select_sql.format(source=form_source(table, list_params))
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY created_at, id LIMIT %s"
+    params.append(list_params.limit + 1)
+    return sql, tuple(params)
+
+def encode_search_cursor(rank: float, created_at: datetime, form_id: UUID) -> str:
+    """Encode the (rank, created_at, id) position of a search hit as an opaque cursor"""
+    raw = json.dumps([rank, created_at.isoformat(), str(form_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_search_cursor(cursor: str) -> tuple[float, datetime, UUID]:
+    """Decode a cursor produced by encode_search_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, created_at, form_id = json.loads(raw)
+        return float(rank), datetime.fromisoformat(created_at), UUID(form_id)
+    except (ValueError, TypeError, AttributeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def build_search_query(search_sql: str, table: str, search_params: FeedbackSearchParams) -> tuple[str, tuple]:
+    """Build a ranked full-text search ordered by (rank, created_at, id) descending, fetching one extra row to detect a next page"""
+    vector = SEARCH_VECTOR_COLUMNS[table]
+    conditions, params = build_filter_conditions(search_params)
+    conditions.insert(0, f"f.{vector} @@ query")
+    if search_params.cursor:
+        conditions.append(f"(ts_rank(f.{vector}, query), created_at, id) < (%s::real, %s, %s)")
+        params.extend(decode_search_cursor(search_params.cursor))
+    sql = search_sql.format(source=form_source(table, search_params), conditions=" AND ".join(conditions))
+    return sql, (search_params.q, *params, search_params.limit + 1)
+
+def build_export_query(select_sql: str, table: str, filter_params: FeedbackFilterParams) -> tuple[str, tuple]:
+    """Build a filtered query over all matching rows ordered by (created_at, id)"""
+    conditions, params = build_filter_conditions(filter_params)
+    sql = select_sql.format(source=form_source(table, filter_params))
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY created_at, id"
+    return sql, tuple(params)
+
+def export_response(chunks, form_type: str, export_format: ExportFormat) -> StreamingResponse:
+    """Wrap encoded export chunks in a downloadable streaming response"""
+    return StreamingResponse(
+        chunks,
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{form_type}.{export_format}"'}
+    )
+
+def next_page_cursor(columns: list[str], rows: list[tuple], limit: int) -> str | None:
+    """Trim the look-ahead row and return the cursor for the following page, if any"""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = dict(zip(columns, rows[-1]))
+    return encode_cursor(last["created_at"], last["id"])
+
+def next_search_cursor(columns: list[str], rows: list[tuple], limit: int) -> str | None:
+    """Trim the look-ahead hit and return the cursor for the following page of search results, if any"""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = dict(zip(columns, rows[-1]))
+    return encode_search_cursor(last["rank"], last["created_at"], last["id"])
+
+def bulk_archive_result(rows: list[dict]) -> BulkArchiveResult:
+    """Summarize the per-ID rows returned by the bulk archive statements"""
+    results = [BulkArchiveItem(id=row["id"], status=row["status"]) for row in rows]
+    return BulkArchiveResult(
+        archived=sum(1 for item in results if item.status == "archived"),
+        already_archived=sum(1 for item in results if item.status == "already_archived"),
+        not_found=sum(1 for item in results if item.status == "not_found"),
+        results=results
+    )
+
+def form_stats(stats_params: StatsParams, results: list[tuple[list[str], list[tuple]]]) -> FormStats:
+    """Assemble the stats response from the (columns, rows) results of STATS_QUERIES"""
+    daily, by_reason, by_termination_month, feedback_daily = ([dict(zip(columns, row)) for row in rows] for columns, rows in results)
+    return FormStats(
+        date_from=stats_params.date_from,
+        date_to=stats_params.date_to,
+        cancellations=CancellationStats(daily=daily, by_reason=by_reason, by_termination_month=by_termination_month),
+        feedback=FeedbackStats(daily=feedback_daily)
+    )
+
+def list_cache_lookup(response_cache: ResponseCache, table: str, list_params: FeedbackListParams, etag: Optional[str] = None) -> tuple[str, tuple[int, int], Optional[bytes]]:
+    """Return the cache key for a list request, the table version to store a fresh body under, and the cached body if any"""
+    # Keying by the ETag ties entries to the database change counter, so a body is never served under a newer ETag
+    key = etag or list_params.model_dump_json()
+    version = response_cache.version(table)
+    return key, version, response_cache.get(table, key)
+
+def list_etag(version: Optional[int], list_params: FeedbackListParams) -> Optional[str]:
+    """Derive a weak ETag for a list request from the table's change counter and the query parameters"""
+    if version is None:
+        return None
+    digest = hashlib.blake2b(list_params.model_dump_json().encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Whether the request's If-None-Match header names the given ETag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if etag is None or not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+def list_headers(etag: Optional[str]) -> dict[str, str]:
+    """Headers making clients revalidate list responses with If-None-Match"""
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+    return headers
+
+def not_modified_response(etag: str) -> Response:
+    """Answer a conditional request whose ETag still matches"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=list_headers(etag))
+
+def json_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """Send an already serialized JSON body"""
+    return Response(content=body, media_type="application/json", headers=list_headers(etag))
+
+def change_version(pg_manager: PostgresManager, table: str) -> Optional[int]:
+    """Read the change counter of a table, or None if it is unavailable"""
+    try:
+        row = pg_manager.execute_single_query(SELECT_CHANGE_VERSION_SQL, (table,))
+    except Exception as e:
+        logger.error(f"Error reading change counter of {table}: {e}")
+        raise_database_error(e, "Failed to retrieve forms")
+    return row["version"] if row else None
+
+def invalidate_cached_lists(response_cache: Optional[ResponseCache], table: str):
+    """Drop this process's cached list responses after a write; other processes learn about it through NOTIFY"""
+    if response_cache is not None:
+        response_cache.invalidate(table)
+
+def created_response(table: str, form_hash: bytes) -> StoredResponse:
+    """The response to store for an Idempotency-Key whose form is created now"""
+    return StoredResponse(form_hash, status.HTTP_201_CREATED, json.dumps(CREATED_RESPONSES[table], separators=(",", ":")).encode())
+
+def stored_response(row: dict) -> StoredResponse:
+    """Read the response stored for an Idempotency-Key"""
+    return StoredResponse(bytes(row["request_hash"]), row["status_code"], bytes(row["response"]))
+
+def idempotent_response(stored: StoredResponse, replayed: bool = False) -> Response:
+    """Send a stored response, marking replays with an Idempotent-Replayed header"""
+    headers = {"Idempotent-Replayed": "true"} if replayed else None
+    return Response(content=stored.body, status_code=stored.status_code, media_type="application/json", headers=headers)
+
+def replay_response(table: str, stored: StoredResponse, form_hash: bytes, source: str) -> Response:
+    """Replay the response stored for a repeated Idempotency-Key, unless the key was used for a different form"""
+    if stored.request_hash != form_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    metrics.IDEMPOTENT_REPLAYS.inc(table, source)
+    return idempotent_response(stored, replayed=True)
+
+def raise_key_in_flight():
+    """Answer a repeat whose key vanished between claiming and reading it, e.g. expired meanwhile"""
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Idempotency-Key is being processed, please retry",
+        headers={"Retry-After": "1"}
+    )
+
+def spooled_response(table: str) -> Response:
+    """Answer a submission kept in the spool until the database is back"""
+    return Response(content=json.dumps(SPOOLED_RESPONSES[table], separators=(",", ":")).encode(), status_code=status.HTTP_202_ACCEPTED, media_type="application/json")
+
+def raise_spool_error(table: str, error: Exception):
+    """Answer a submission that neither the database nor the spool could take"""
+    logger.error(f"Error spooling {table}: {error}")
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Database is unavailable, please retry later",
+        headers={"Retry-After": "5"}
+    )
+
+def cancellation_params(cancellation_data: CreateCancellation) -> tuple:
+    """Build the INSERT parameters for a cancellation"""
+    return (
         cancellation_data.email,
         cancellation_data.name,
         cancellation_data.last_name,
@@ -31,92 +490,355 @@ def create_cancellation(cancellation_data: CreateCancellation, pg_manager: Postg
         cancellation_data.last_invoice_number,
         cancellation_data.termination_date
     )
+
+def feedback_params(feedback_data: CreateFeedback) -> tuple:
+    """Build the INSERT parameters for a feedback"""
+    return (
+        feedback_data.email,
+        feedback_data.text
+    )
+
+
+def validate_batch(items: list[Any], model: type[BaseModel]) -> tuple[list, list[BatchItemError]]:
+    """Validate each batch item on its own, collecting the valid models and per-item errors"""
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(model.model_validate(item))
+        except ValidationError as e:
+            errors.append(BatchItemError(index=index, errors=e.errors(include_url=False, include_context=False, include_input=False)))
+    return valid, errors
+
+def batch_submission_result(created: int, errors: list[BatchItemError]) -> BatchSubmissionResult:
+    """Build the batch response, rejecting the request only if no item was valid"""
+    result = BatchSubmissionResult(created=created, failed=len(errors), errors=errors)
+    if created == 0 and errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=result.model_dump(mode="json")
+        )
+    return result
+
+
+def create_idempotently(table: str, form_data: BaseModel, params: tuple, idempotency_key: str, pg_manager: PostgresManager, idempotency_cache: IdempotencyCache, response_cache: Optional[ResponseCache] = None, submission_spool: Optional[SubmissionSpool] = None) -> Response:
+    """Create a form once per Idempotency-Key and replay the stored response to repeated requests."""
+    form_hash = request_hash(form_data)
+    stored = idempotency_cache.get(table, idempotency_key)
+    if stored is not None:
+        return replay_response(table, stored, form_hash, "cache")
+    stored = created_response(table, form_hash)
     try:
-        pg_manager.execute_modification_query(sql, params)
+        # Both statements run on the primary, so the lookup cannot miss a key on a lagging replica
+        with pg_manager.get_connection() as connection:
+            claimed = pg_manager.execute_returning_query(
+                IDEMPOTENT_INSERT_SQL[table],
+                (idempotency_key, stored.request_hash, stored.status_code, stored.body, idempotency_cache.ttl, *params),
+                connection
+            )
+            # A new statement sees the key even if a concurrent request committed it while this one waited
+            row = None if claimed else pg_manager.execute_single_query(SELECT_IDEMPOTENCY_KEY_SQL, (table, idempotency_key), connection)
     except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            # The replayer claims the key in the statement inserting the form, so spooled retries create it once
+            return spool_submission(table, INSERT_COLUMNS[table], params, submission_spool, (idempotency_key, stored))
+        logger.error(f"Error creating {table} with an idempotency key: {e}")
+        raise_database_error(e, f"Failed to create {table}")
+    if claimed:
+        invalidate_cached_lists(response_cache, table)
+        idempotency_cache.put(table, idempotency_key, stored)
+        return idempotent_response(stored)
+    if row is None:
+        raise_key_in_flight()
+    stored = stored_response(row)
+    idempotency_cache.put(table, idempotency_key, stored, row["age"])
+    return replay_response(table, stored, form_hash, "database")
+
+
+def spool_submission(table: str, columns: tuple, params: tuple, submission_spool: SubmissionSpool, idempotency: Optional[tuple[str, StoredResponse]] = None) -> Response:
+    """Write a submission to the local spool while the database is unavailable; the spool replays it later."""
+    try:
+        submission_spool.append(table, columns, params, idempotency).result()
+    except (SpoolFullError, OSError) as e:
+        raise_spool_error(table, e)
+    return spooled_response(table)
+
+
+def create_cancellation(cancellation_data: CreateCancellation, pg_manager: PostgresManager, write_coalescer: Optional[WriteCoalescer] = None, response_cache: Optional[ResponseCache] = None, idempotency_key: Optional[str] = None, idempotency_cache: Optional[IdempotencyCache] = None, submission_spool: Optional[SubmissionSpool] = None):
+    """Creates a new cancellation entry in the database."""
+    if idempotency_key is not None and idempotency_cache is not None:
+        # Bypasses the write coalescer: the key has to be claimed in the transaction creating the form
+        return create_idempotently("cancellation", cancellation_data, cancellation_params(cancellation_data), idempotency_key, pg_manager, idempotency_cache, response_cache, submission_spool)
+    try:
+        if write_coalescer is not None:
+            write_coalescer.submit("cancellation", INSERT_CANCELLATION_COLUMNS, cancellation_params(cancellation_data))
+        else:
+            pg_manager.execute_modification_query(INSERT_CANCELLATION_SQL, cancellation_params(cancellation_data))
+    except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            return spool_submission("cancellation", INSERT_CANCELLATION_COLUMNS, cancellation_params(cancellation_data), submission_spool)
         logger.error(f"Error creating cancellation: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create cancellation"
-        )
+        raise_database_error(e, "Failed to create cancellation")
+    invalidate_cached_lists(response_cache, "cancellation")
     return {"detail": "Cancellation created successfully"}
 
 
-def create_feedback(feedback_data: CreateFeedback, pg_manager: PostgresManager):
+def create_feedback(feedback_data: CreateFeedback, pg_manager: PostgresManager, write_coalescer: Optional[WriteCoalescer] = None, response_cache: Optional[ResponseCache] = None, idempotency_key: Optional[str] = None, idempotency_cache: Optional[IdempotencyCache] = None, submission_spool: Optional[SubmissionSpool] = None):
     """Creates a new feedback entry in the database."""
-    sql = "INSERT INTO feedback (email, text) VALUES (%s, %s)"
-    params = (
-        feedback_data.email,
-        feedback_data.text
-    )
+    if idempotency_key is not None and idempotency_cache is not None:
+        return create_idempotently("feedback", feedback_data, feedback_params(feedback_data), idempotency_key, pg_manager, idempotency_cache, response_cache, submission_spool)
     try:
-        pg_manager.execute_modification_query(sql, params)
+        if write_coalescer is not None:
+            write_coalescer.submit("feedback", INSERT_FEEDBACK_COLUMNS, feedback_params(feedback_data))
+        else:
+            pg_manager.execute_modification_query(INSERT_FEEDBACK_SQL, feedback_params(feedback_data))
     except Exception as e:
+        if submission_spool is not None and isinstance(e, SPOOLABLE_ERRORS):
+            return spool_submission("feedback", INSERT_FEEDBACK_COLUMNS, feedback_params(feedback_data), submission_spool)
         logger.error(f"Error creating feedback: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create feedback"
-        )
+        raise_database_error(e, "Failed to create feedback")
+    invalidate_cached_lists(response_cache, "feedback")
     return {"detail": "Feedback created successfully"}
 
 
-def archive_cancellation(cancellation_id: str, pg_manager: PostgresManager, request: Request):
+def create_cancellation_batch(items: list[Any], pg_manager: PostgresManager, response_cache: Optional[ResponseCache] = None) -> BatchSubmissionResult:
+    """Validate a batch of cancellations and insert the valid ones in one transaction."""
+    cancellations, errors = validate_batch(items, CreateCancellation)
+    try:
+        created = pg_manager.execute_batch_insert("cancellation", INSERT_CANCELLATION_COLUMNS, [cancellation_params(c) for c in cancellations])
+    except Exception as e:
+        logger.error(f"Error creating cancellation batch: {e}")
+        raise_database_error(e, "Failed to create cancellations")
+    if created:
+        invalidate_cached_lists(response_cache, "cancellation")
+    return batch_submission_result(created, errors)
+
+
+def create_feedback_batch(items: list[Any], pg_manager: PostgresManager, response_cache: Optional[ResponseCache] = None) -> BatchSubmissionResult:
+    """Validate a batch of feedbacks and insert the valid ones in one transaction."""
+    feedbacks, errors = validate_batch(items, CreateFeedback)
+    try:
+        created = pg_manager.execute_batch_insert("feedback", INSERT_FEEDBACK_COLUMNS, [feedback_params(f) for f in feedbacks])
+    except Exception as e:
+        logger.error(f"Error creating feedback batch: {e}")
+        raise_database_error(e, "Failed to create feedbacks")
+    if created:
+        invalidate_cached_lists(response_cache, "feedback")
+    return batch_submission_result(created, errors)
+
+
+def archive_cancellation(cancellation_id: UUID, pg_manager: PostgresManager, request: Request, response_cache: Optional[ResponseCache] = None, created_at: Optional[datetime] = None):
     """Archive a cancellation entry in the database."""
     deny_for_non_admins(request)
-    sql = "UPDATE cancellation SET is_archived = true WHERE id = %s"
-    params = (cancellation_id,)
     try:
-        pg_manager.execute_modification_query(sql, params)
+        if created_at is None:
+            pg_manager.execute_modification_query(ARCHIVE_CANCELLATION_SQL, (cancellation_id,))
+        else:
+            pg_manager.execute_modification_query(ARCHIVE_CANCELLATION_AT_SQL, (cancellation_id, created_at))
     except Exception as e:
         logger.error(f"Error archiving cancellation: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to archive cancellation"
-        )
+        raise_database_error(e, "Failed to archive cancellation")
+    invalidate_cached_lists(response_cache, "cancellation")
     return {"detail": "Cancellation archived successfully"}
 
 
-def archive_feedback(feedback_id: str, pg_manager: PostgresManager, request: Request):
+def archive_feedback(feedback_id: UUID, pg_manager: PostgresManager, request: Request, response_cache: Optional[ResponseCache] = None, created_at: Optional[datetime] = None):
     """Archive a feedback entry in the database."""
     deny_for_non_admins(request)
-    sql = "UPDATE feedback SET is_archived = true WHERE id = %s"
-    params = (feedback_id,)
     try:
-        pg_manager.execute_modification_query(sql, params)
+        if created_at is None:
+            pg_manager.execute_modification_query(ARCHIVE_FEEDBACK_SQL, (feedback_id,))
+        else:
+            pg_manager.execute_modification_query(ARCHIVE_FEEDBACK_AT_SQL, (feedback_id, created_at))
     except Exception as e:
         logger.error(f"Error archiving feedback: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to archive feedback"
-        )
+        raise_database_error(e, "Failed to archive feedback")
+    invalidate_cached_lists(response_cache, "feedback")
     return {"detail": "Feedback archived successfully"}
 
 
-def get_all_cancellations(pg_manager: PostgresManager, request: Request) -> list[Cancellation]:
-    """Retrieve all cancellations from the database."""
+def bulk_archive(table: str, archive_request: BulkArchiveRequest, pg_manager: PostgresManager) -> BulkArchiveResult:
+    """Archive forms by ID in one statement, or by creation time in chunks within one transaction."""
+    if archive_request.ids is not None and archive_request.created_at is not None:
+        rows = pg_manager.execute_returning_query(BULK_ARCHIVE_BY_KEYS_SQL[table], (archive_request.ids, archive_request.created_at))
+        return bulk_archive_result(rows)
+    if archive_request.ids is not None:
+        rows = pg_manager.execute_returning_query(BULK_ARCHIVE_BY_IDS_SQL[table], (archive_request.ids,))
+        return bulk_archive_result(rows)
+
+    rows = []
+    chunk_size = pg_manager.bulk_chunk_size
+    with pg_manager.transaction() as connection:
+        while True:
+            chunk = pg_manager.execute_returning_query(
+                BULK_ARCHIVE_CREATED_BEFORE_SQL[table],
+                (archive_request.created_before, chunk_size),
+                connection=connection,
+                commit=False
+            )
+            rows.extend(chunk)
+            if len(chunk) < chunk_size:
+                break
+    return bulk_archive_result(rows)
+
+
+def bulk_archive_cancellations(archive_request: BulkArchiveRequest, pg_manager: PostgresManager, request: Request, response_cache: Optional[ResponseCache] = None) -> BulkArchiveResult:
+    """Archive many cancellation entries at once."""
+    deny_for_non_admins(request)
+    try:
+        result = bulk_archive("cancellation", archive_request, pg_manager)
+    except Exception as e:
+        logger.error(f"Error bulk archiving cancellations: {e}")
+        raise_database_error(e, "Failed to archive cancellations")
+    if result.archived:
+        invalidate_cached_lists(response_cache, "cancellation")
+    return result
+
+
+def bulk_archive_feedbacks(archive_request: BulkArchiveRequest, pg_manager: PostgresManager, request: Request, response_cache: Optional[ResponseCache] = None) -> BulkArchiveResult:
+    """Archive many feedback entries at once."""
+    deny_for_non_admins(request)
+    try:
+        result = bulk_archive("feedback", archive_request, pg_manager)
+    except Exception as e:
+        logger.error(f"Error bulk archiving feedbacks: {e}")
+        raise_database_error(e, "Failed to archive feedbacks")
+    if result.archived:
+        invalidate_cached_lists(response_cache, "feedback")
+    return result
+
+
+def get_all_cancellations(pg_manager: PostgresManager, request: Request, list_params: CancellationListParams, response_cache: Optional[ResponseCache] = None) -> Response:
+    """Retrieve one page of cancellations, answering unchanged conditional requests with 304 and serving from the response cache when possible."""
     deny_for_non_admins(request)
-    sql = "SELECT * FROM cancellation"
+    etag = list_etag(change_version(pg_manager, "cancellation"), list_params)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if response_cache is None:
+        body = load_cancellation_page(pg_manager, list_params)
+        return json_response(body, etag)
+    key, version, body = list_cache_lookup(response_cache, "cancellation", list_params, etag)
+    if body is None:
+        body = load_cancellation_page(pg_manager, list_params)
+        response_cache.put("cancellation", key, version, body)
+    return json_response(body, etag)
+
+
+def load_cancellation_page(pg_manager: PostgresManager, list_params: CancellationListParams) -> bytes:
+    """Retrieve one page of cancellations from the database, encoded as JSON without per-row validation."""
+    sql, params = build_list_query(SELECT_CANCELLATIONS_SQL, "cancellation", list_params)
     try:
-        cancellations = pg_manager.execute_query(sql)
+        columns, rows = pg_manager.execute_raw_query(sql, params)
     except Exception as e:
         logger.error(f"Error retrieving cancellations: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve cancellations"
-        )
-    return [Cancellation(**cancellation) for cancellation in cancellations]
+        raise_database_error(e, "Failed to retrieve cancellations")
+    next_cursor = next_page_cursor(columns, rows, list_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return serialization.encode_page(columns, rows, next_cursor)
 
 
-def get_all_feedbacks(pg_manager: PostgresManager, request: Request) -> list[Feedback]:
-    """Retrieve all feedbacks from the database."""
+def get_all_feedbacks(pg_manager: PostgresManager, request: Request, list_params: FeedbackListParams, response_cache: Optional[ResponseCache] = None) -> Response:
+    """Retrieve one page of feedbacks, answering unchanged conditional requests with 304 and serving from the response cache when possible."""
     deny_for_non_admins(request)
-    sql = "SELECT * FROM feedback"
+    etag = list_etag(change_version(pg_manager, "feedback"), list_params)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    if response_cache is None:
+        body = load_feedback_page(pg_manager, list_params)
+        return json_response(body, etag)
+    key, version, body = list_cache_lookup(response_cache, "feedback", list_params, etag)
+    if body is None:
+        body = load_feedback_page(pg_manager, list_params)
+        response_cache.put("feedback", key, version, body)
+    return json_response(body, etag)
+
+
+def load_feedback_page(pg_manager: PostgresManager, list_params: FeedbackListParams) -> bytes:
+    """Retrieve one page of feedbacks from the database, encoded as JSON without per-row validation."""
+    sql, params = build_list_query(SELECT_FEEDBACKS_SQL, "feedback", list_params)
     try:
-        feedbacks = pg_manager.execute_query(sql)
+        columns, rows = pg_manager.execute_raw_query(sql, params)
     except Exception as e:
         logger.error(f"Error retrieving feedbacks: {e}")
+        raise_database_error(e, "Failed to retrieve feedbacks")
+    next_cursor = next_page_cursor(columns, rows, list_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return serialization.encode_page(columns, rows, next_cursor)
+
+
+def search_cancellations(pg_manager: PostgresManager, request: Request, search_params: CancellationSearchParams) -> Response:
+    """Full-text search over cancellation reasons, ranked by relevance with highlighted excerpts."""
+    deny_for_non_admins(request)
+    sql, params = build_search_query(SEARCH_CANCELLATIONS_SQL, "cancellation", search_params)
+    try:
+        columns, rows = pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error searching cancellations: {e}")
+        raise_database_error(e, "Failed to search cancellations")
+    next_cursor = next_search_cursor(columns, rows, search_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return json_response(serialization.encode_page(columns, rows, next_cursor))
+
+
+def search_feedbacks(pg_manager: PostgresManager, request: Request, search_params: FeedbackSearchParams) -> Response:
+    """Full-text search over feedback texts, ranked by relevance with highlighted excerpts."""
+    deny_for_non_admins(request)
+    sql, params = build_search_query(SEARCH_FEEDBACKS_SQL, "feedback", search_params)
+    try:
+        columns, rows = pg_manager.execute_raw_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error searching feedbacks: {e}")
+        raise_database_error(e, "Failed to search feedbacks")
+    next_cursor = next_search_cursor(columns, rows, search_params.limit)
+    with tracing.span("serialize", rows=len(rows)):
+        return json_response(serialization.encode_page(columns, rows, next_cursor))
+
+
+def export_cancellations(pg_manager: PostgresManager, request: Request, export_params: CancellationExportParams) -> StreamingResponse:
+    """Stream all matching cancellations as NDJSON or CSV."""
+    deny_for_non_admins(request)
+    sql, params = build_export_query(EXPORT_CANCELLATIONS_SQL, "cancellation", export_params)
+    try:
+        batches = pg_manager.stream_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error exporting cancellations: {e}")
+        raise_database_error(e, "Failed to export cancellations")
+    return export_response(export.encode_batches(CANCELLATION_COLUMNS, batches, export_params.format), "cancellations", export_params.format)
+
+
+def export_feedbacks(pg_manager: PostgresManager, request: Request, export_params: FeedbackExportParams) -> StreamingResponse:
+    """Stream all matching feedbacks as NDJSON or CSV."""
+    deny_for_non_admins(request)
+    sql, params = build_export_query(EXPORT_FEEDBACKS_SQL, "feedback", export_params)
+    try:
+        batches = pg_manager.stream_query(sql, params)
+    except Exception as e:
+        logger.error(f"Error exporting feedbacks: {e}")
+        raise_database_error(e, "Failed to export feedbacks")
+    return export_response(export.encode_batches(FEEDBACK_COLUMNS, batches, export_params.format), "feedbacks", export_params.format)
+
+
+def stream_form_events(request: Request, event_hub: Optional[EventHub], last_event_id: Optional[str] = None) -> StreamingResponse:
+    """Follow created and archived forms as Server-Sent Events, resuming after Last-Event-ID if given."""
+    deny_for_non_admins(request)
+    if event_hub is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve feedbacks"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Live form events are disabled"
         )
-    return [Feedback(**feedback) for feedback in feedbacks]
\ No newline at end of file
+    # X-Accel-Buffering keeps nginx from holding events back
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(event_hub.stream(last_event_id), media_type="text/event-stream", headers=headers)
+
+
+def get_form_stats(pg_manager: PostgresManager, request: Request, stats_params: StatsParams) -> FormStats:
+    """Report daily cancellation and feedback counts from the rollup tables."""
+    deny_for_non_admins(request)
+    params = (stats_params.date_from, stats_params.date_to)
+    try:
+        with pg_manager.get_connection(read_only=True) as connection:
+            results = [pg_manager.execute_raw_query(sql, params, connection) for sql in STATS_QUERIES]
+    except Exception as e:
+        logger.error(f"Error retrieving form stats: {e}")
+        raise_database_error(e, "Failed to retrieve form stats")
+    return form_stats(stats_params, results)
@@ -0,0 +1,89 @@
+"""
+Bounded LRU cache with TTL for the responses of form submissions sent with an Idempotency-Key
+"""
+from collections import OrderedDict
+from pydantic import BaseModel
+from typing import NamedTuple, Optional, Tuple
+import hashlib
+import threading
+import time
+import logging
+
+from src.config import get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+
+class StoredResponse(NamedTuple):
+    """The response of the first request with a key and the hash of that request's body"""
+    request_hash: bytes
+    status_code: int
+    body: bytes
+
+
+def request_hash(form_data: BaseModel) -> bytes:
+    """Hash a validated submission, so reusing a key for a different form can be detected"""
+    return hashlib.sha256(form_data.model_dump_json().encode()).digest()
+
+
+class IdempotencyCache:
+    """
+    Remembers the responses this process stored for idempotency keys.
+
+    Stored responses never change, so entries need no invalidation and are only dropped
+    when they expire with their key or are the least recently used. The idempotency_keys
+    table stays the source of truth; the cache saves the round trip for repeats that reach
+    the same process.
+    """
+
+
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries: Upper bound on the number of cached responses, 0 disables caching
+            ttl: Seconds a key stays valid after the first request used it
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Tuple[str, str], Tuple[float, StoredResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, form_type: str, key: str) -> Optional[StoredResponse]:
+        """Return the stored response for a key if it is cached and not expired"""
+        with self._lock:
+            entry = self._entries.get((form_type, key))
+            if entry is None:
+                return None
+            expires_at, stored = entry
+            if expires_at <= time.monotonic():
+                del self._entries[(form_type, key)]
+                return None
+            self._entries.move_to_end((form_type, key))
+            return stored
+
+
+    def put(self, form_type: str, key: str, stored: StoredResponse, age: float = 0.0) -> None:
+        """Cache the response stored for a key that was first used age seconds ago"""
+        if self.max_entries <= 0 or age >= self.ttl:
+            return
+        with self._lock:
+            self._entries[(form_type, key)] = (time.monotonic() + self.ttl - age, stored)
+            self._entries.move_to_end((form_type, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def create_idempotency_cache() -> IdempotencyCache:
+    """Create the idempotency cache from environment variables"""
+    max_entries = get_env_int("IDEMPOTENCY_CACHE_SIZE", 10000)
+    if max_entries <= 0:
+        logger.info("Idempotency cache disabled, every repeated key is looked up in the database")
+    return IdempotencyCache(max_entries, idempotency_key_ttl())
+
+
+def idempotency_key_ttl() -> float:
+    """Seconds an Idempotency-Key is honoured after its first use"""
+    return get_env_float("IDEMPOTENCY_KEY_TTL", 86400.0)
@@ -0,0 +1,559 @@
+import psycopg
+from psycopg import sql as pg_sql
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from contextlib import asynccontextmanager
+from uuid import uuid4
+import asyncio
+import time
+import logging
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Awaitable, Callable, Sequence
+
+from src.managers.postgres_manager import PostgresSettings, PoolTimeoutError
+from src.managers.replica_monitor import ReplicaMonitor
+from src.managers import migration_manager
+from src import admission, consistency, metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPostgresManager(PostgresSettings):
+    """Asyncio database manager for PostgreSQL operations, backed by psycopg 3"""
+
+
+    def __init__(self):
+        """Initialize the database manager with environment variables. Call open() before use."""
+        self.load_settings()
+        self.pool = self.create_pool(self.conninfo(), self.pool_min_size)
+        self.last_write_lsn = 0
+        self.replica_monitor = ReplicaMonitor(self, self.replica_hosts) if self.replica_hosts else None
+        # Replica connections are opened on demand, so a replica being down does not keep the service from starting
+        self.replica_pools = [self.create_pool(self.conninfo(host=host, port=port), 0) for host, port in self.replica_hosts]
+        logger.info("AsyncPostgresManager initialized")
+
+
+    def create_pool(self, conninfo: str, min_size: int) -> AsyncConnectionPool:
+        """Create an unopened connection pool with the configured settings"""
+        return AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max(self.pool_max_size, min_size, 1),
+            timeout=self.pool_timeout,
+            max_lifetime=self.pool_max_lifetime if self.pool_max_lifetime > 0 else 365 * 24 * 3600.0,
+            kwargs={"autocommit": True},
+            check=self._check_connection,
+            reset=self._mark_returned,
+            open=False,
+        )
+
+
+    def conninfo(self, without_db: bool = False, host: Optional[str] = None, port: Optional[int] = None) -> str:
+        """Build a libpq connection string from the configured settings, for a replica if host and port are given"""
+        return make_conninfo(
+            user=self.user,
+            password=self.password,
+            host=host or self.host,
+            port=port or self.port,
+            dbname="postgres" if without_db else self.db_name,
+            connect_timeout=self.connect_timeout
+        )
+
+
+    async def _check_connection(self, connection: psycopg.AsyncConnection) -> None:
+        """Ping connections that sat idle longer than the health-check interval"""
+        last_used_at = getattr(connection, "_forms_last_used_at", 0.0)
+        if time.monotonic() - last_used_at > self.pool_health_check_interval:
+            await AsyncConnectionPool.check_connection(connection)
+
+
+    async def _mark_returned(self, connection: psycopg.AsyncConnection) -> None:
+        """Remember when a connection went back to the pool"""
+        connection._forms_last_used_at = time.monotonic()
+
+
+    async def open(self) -> None:
+        """Make sure the schema exists, unless it was prepared before the workers started, and open the connection pools"""
+        logger.info("Trying to connect to database...")
+        if self.migrate_on_startup:
+            await self.ensure_schema()
+        await self.pool.open(wait=True)
+        for pool in self.replica_pools:
+            await pool.open()
+        if self.replica_monitor is not None:
+            await asyncio.to_thread(self.replica_monitor.start)
+        metrics.POOL_CONNECTIONS.set_function("primary", self.pool_metrics)
+        metrics.CIRCUIT_BREAKER_OPEN.set_function("primary", lambda: {(): 0 if self.circuit_breaker.is_closed() else 1})
+        logger.info("Database connection successful")
+
+
+    def pool_metrics(self) -> Dict[Tuple[str, str], int]:
+        """Connection counts by state for the pool gauge"""
+        counts = {}
+        for name, pool in [("primary", self.pool)] + [(self.replica_monitor.name(index), pool) for index, pool in enumerate(self.replica_pools)]:
+            stats = pool.get_stats()
+            size, idle = stats.get("pool_size", 0), stats.get("pool_available", 0)
+            counts.update({
+                (name, "idle"): idle,
+                (name, "in_use"): size - idle,
+                (name, "waiting"): stats.get("requests_waiting", 0),
+            })
+        return counts
+
+
+    def replica_loads(self) -> List[int]:
+        """Connections in use or waited for per replica pool"""
+        loads = []
+        for pool in self.replica_pools:
+            stats = pool.get_stats()
+            loads.append(stats.get("pool_size", 0) - stats.get("pool_available", 0) + stats.get("requests_waiting", 0))
+        return loads
+
+
+    async def close(self) -> None:
+        """Close the connection pools and stop watching the replicas"""
+        metrics.POOL_CONNECTIONS.remove_function("primary")
+        metrics.CIRCUIT_BREAKER_OPEN.remove_function("primary")
+        if self.replica_monitor is not None:
+            await asyncio.to_thread(self.replica_monitor.close)
+        for pool in self.replica_pools:
+            await pool.close()
+        await self.pool.close()
+
+
+    async def ensure_schema(self) -> None:
+        """Create the database if it does not exist and apply pending migrations"""
+        try:
+            connection = await psycopg.AsyncConnection.connect(self.conninfo(), autocommit=True)
+        except psycopg.OperationalError as err:
+            logger.warning(f"Error connecting to database: {err}")
+            async with await psycopg.AsyncConnection.connect(self.conninfo(without_db=True), autocommit=True) as admin_connection:
+                cursor = await admin_connection.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (self.db_name,))
+                if not await cursor.fetchone():
+                    logger.info(f"Creating database {self.db_name}")
+                    try:
+                        await admin_connection.execute(f'CREATE DATABASE "{self.db_name}"')
+                    except psycopg.errors.DuplicateDatabase:
+                        logger.info(f"Database {self.db_name} was created concurrently")
+            connection = await psycopg.AsyncConnection.connect(self.conninfo(), autocommit=True)
+
+        async with connection:
+            await migration_manager.amigrate(connection)
+
+
+    async def checkout(self, read_only: bool) -> Tuple[int, psycopg.AsyncConnection]:
+        """Check out a connection from the primary pool or, for reads, a replica pool; returns the pool index too"""
+        index = self.choose_replica(read_only, self.replica_loads)
+        started = time.perf_counter()
+        if index != consistency.PRIMARY:
+            try:
+                connection = await self.replica_pools[index].getconn()
+                self.observe_acquire(started, self.replica_monitor.name(index))
+                return index, connection
+            except (psycopg.OperationalError, PoolTimeout) as err:
+                self.replica_failed(index, err)
+                index = consistency.PRIMARY
+                started = time.perf_counter()
+        self.circuit_breaker.before_call()
+        try:
+            connection = await self.pool.getconn()
+        except PoolTimeout as err:
+            self.circuit_breaker.record_failure(err)
+            raise PoolTimeoutError(
+                f"No database connection available within {self.pool_timeout}s "
+                f"(pool max size {self.pool.max_size} reached)"
+            ) from err
+        self.observe_acquire(started)
+        return index, connection
+
+
+    def pool_for(self, index: int) -> AsyncConnectionPool:
+        """The pool a connection checked out by checkout() belongs to"""
+        return self.pool if index == consistency.PRIMARY else self.replica_pools[index]
+
+
+    @asynccontextmanager
+    async def get_connection(self, read_only: bool = False) -> AsyncIterator[psycopg.AsyncConnection]:
+        """
+        Check out a pooled connection for the duration of the async with-block.
+
+        Pass read_only=True to allow the connection to come from a read replica.
+        A connection breaking in the with-block ejects its replica or counts towards
+        opening the circuit breaker; any answer from the primary closes the breaker.
+        """
+        index, connection = await self.checkout(read_only)
+        async with self.use_connection(index, connection):
+            yield connection
+
+
+    @asynccontextmanager
+    async def use_connection(self, index: int, connection: psycopg.AsyncConnection) -> AsyncIterator[psycopg.AsyncConnection]:
+        """Account for a connection checked out by checkout() and return it to its pool after the async with-block"""
+        try:
+            yield connection
+        except (psycopg.OperationalError, psycopg.InterfaceError) as err:
+            # Statement timeouts and the like are OperationalErrors too, but leave the connection usable
+            if connection.broken or connection.closed:
+                self.connection_failed(index, err)
+            else:
+                self.connection_succeeded(index)
+            raise
+        except psycopg.Error:
+            self.connection_succeeded(index)
+            raise
+        else:
+            self.connection_succeeded(index)
+        finally:
+            await self.pool_for(index).putconn(connection)
+
+
+    async def run_read(self, read: Callable[[psycopg.AsyncConnection], Awaitable[Any]]) -> Any:
+        """
+        Await read(connection) on a pooled connection that may come from a read replica.
+
+        If the replica's connection breaks, the replica is ejected and the read runs once
+        more, on another healthy replica or the primary.
+        """
+        index, connection = await self.checkout(read_only=True)
+        try:
+            async with self.use_connection(index, connection):
+                return await read(connection)
+        except (psycopg.OperationalError, psycopg.InterfaceError) as err:
+            if index == consistency.PRIMARY or self.replica_monitor.healthy[index]:
+                raise
+            logger.warning(f"Read on replica {self.replica_monitor.name(index)} failed, retrying elsewhere: {str(err).strip()}")
+        async with self.get_connection(read_only=True) as connection:
+            return await read(connection)
+
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """Check out a pooled connection and run the async with-block in one transaction, committed on success"""
+        async with self.get_connection() as connection:
+            async with connection.transaction():
+                yield connection
+            await self.note_write(connection)
+
+
+    async def note_write(self, connection: psycopg.AsyncConnection) -> None:
+        """With read-your-writes enabled, remember the WAL position after a write committed on this connection"""
+        if not self.read_your_writes:
+            return
+        try:
+            cursor = await connection.execute("SELECT pg_current_wal_lsn()::text")
+            self.record_write_position((await cursor.fetchone())[0])
+        except psycopg.Error as err:
+            # The write is committed either way; only reads routed to a lagging replica may miss it
+            logger.warning(f"Reading the WAL position after a write failed: {err}")
+
+
+    async def observe_query(self, sql: str, params: Optional[Tuple], started: float, rows: Optional[int] = None, connection=None) -> None:
+        """
+        Record metrics for a finished statement and log it if it was slow.
+
+        Pass the connection to allow capturing the plan of a slow SELECT; it is only
+        re-run in autocommit mode so a failing EXPLAIN cannot abort a caller's transaction.
+        """
+        duration = time.perf_counter() - started
+        metrics.observe_query(sql, duration, rows)
+        admission.DB_LOAD.observe_query(duration)
+        if not self.slow_query_log.is_slow(duration):
+            return
+        plan = None
+        if connection is not None and connection.autocommit and self.slow_query_log.should_explain(sql):
+            plan = await self.explain(sql, params, connection)
+        self.slow_query_log.record(sql, params, duration, rows, plan)
+
+
+    async def explain(self, sql: str, params: Optional[Tuple], connection: psycopg.AsyncConnection) -> Optional[str]:
+        """Run a SELECT again under EXPLAIN (ANALYZE, BUFFERS) and return the plan text"""
+        try:
+            cursor = await connection.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params or ())
+            return "\n".join(row[0] for row in await cursor.fetchall())
+        except psycopg.Error as err:
+            logger.warning(f"Explaining slow query failed: {err}")
+            return None
+
+
+    async def execute_query(self, sql: str, params: Optional[Tuple] = None, dictionary: bool = True, connection=None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Execute a SELECT query with parameterized inputs to prevent SQL injection.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            dictionary: Whether to return results as dictionaries
+            connection: Optional existing connection to use instead of a pooled one
+
+        Returns:
+            List of dictionaries (if dictionary=True) or tuples, or None on error.
+            Connection failures are raised, so the connection is counted as failed.
+        """
+        if connection is None:
+            return await self.run_read(lambda connection: self.execute_query(sql, params, dictionary, connection))
+
+        async with connection.cursor() as cursor:
+            try:
+                started = time.perf_counter()
+                with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                    await cursor.execute(sql, params or ())
+                with tracing.span("db.fetch"):
+                    data = await cursor.fetchall()
+
+                if dictionary and cursor.description:
+                    columns = [desc.name for desc in cursor.description]
+                    with tracing.span("db.build_rows", rows=len(data)):
+                        data = [dict(zip(columns, row)) for row in data]
+
+                await self.observe_query(sql, params, started, len(data), connection)
+                return data
+            except psycopg.Error as err:
+                metrics.record_query_error(sql, err)
+                logger.error("Executing query failed!")
+                logger.error(f"SQL:   {sql}")
+                logger.error(f"Params: {tracing.param_shapes(params)}")
+                logger.error(f"Error: {err}")
+                if isinstance(err, (psycopg.OperationalError, psycopg.InterfaceError)):
+                    raise
+                return None
+
+
+    async def execute_raw_query(self, sql: str, params: Optional[Tuple] = None, connection=None) -> Tuple[List[str], List[Tuple]]:
+        """
+        Execute a SELECT query and return the column names and plain row tuples, without building dictionaries.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use instead of a pooled one
+
+        Returns:
+            Tuple of the column names and the list of row tuples
+        """
+        if connection is None:
+            return await self.run_read(lambda connection: self.execute_raw_query(sql, params, connection))
+
+        async with connection.cursor() as cursor:
+            try:
+                started = time.perf_counter()
+                with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                    await cursor.execute(sql, params or ())
+                columns = [desc.name for desc in cursor.description]
+                with tracing.span("db.fetch"):
+                    rows = await cursor.fetchall()
+                await self.observe_query(sql, params, started, len(rows), connection)
+                return columns, rows
+            except psycopg.Error as err:
+                metrics.record_query_error(sql, err)
+                logger.error("Executing query failed!")
+                logger.error(f"SQL:   {sql}")
+                logger.error(f"Params: {tracing.param_shapes(params)}")
+                logger.error(f"Error: {err}")
+                raise
+
+
+    async def stream_query(self, sql: str, params: Optional[Tuple] = None, batch_size: Optional[int] = None) -> AsyncIterator[List[Tuple]]:
+        """
+        Execute a SELECT query through a named server-side cursor and iterate over the result in batches.
+
+        The connection is checked out and the query is declared before this returns,
+        so pool and SQL errors surface to the caller instead of in the middle of the stream.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            batch_size: Rows fetched per round trip, defaults to POSTGRES_STREAM_BATCH_SIZE
+
+        Returns:
+            Async iterator over lists of row tuples
+        """
+        batch_size = batch_size or self.stream_batch_size
+        index, connection = await self.checkout(read_only=True)
+        pool = self.pool_for(index)
+        try:
+            # Named cursors only live inside a transaction
+            await connection.set_autocommit(False)
+            cursor = connection.cursor(name=f"stream_{uuid4().hex}")
+            cursor.itersize = batch_size
+            started = time.perf_counter()
+            with tracing.span("db.declare_cursor", statement=metrics.statement_label(sql)):
+                await cursor.execute(sql, params or ())
+            await self.observe_query(sql, params, started)
+        except psycopg.Error as err:
+            metrics.record_query_error(sql, err)
+            logger.error("Executing streaming query failed!")
+            logger.error(f"SQL:   {sql}")
+            logger.error(f"Error: {err}")
+            if connection.broken or connection.closed:
+                self.connection_failed(index, err)
+            else:
+                self.connection_succeeded(index)
+            await self._release_stream_connection(pool, connection)
+            raise
+        # The cursor is declared, so the database answered; this also closes a half-open circuit breaker
+        self.connection_succeeded(index)
+        return self._iter_batches(pool, connection, cursor, batch_size)
+
+
+    async def _iter_batches(self, pool: AsyncConnectionPool, connection: psycopg.AsyncConnection, cursor, batch_size: int) -> AsyncIterator[List[Tuple]]:
+        """Fetch batches from a named cursor and return the connection to the pool afterwards"""
+        try:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                await cursor.close()
+            except psycopg.Error as err:
+                logger.warning(f"Error closing streaming cursor: {err}")
+            await self._release_stream_connection(pool, connection)
+
+
+    async def _release_stream_connection(self, pool: AsyncConnectionPool, connection: psycopg.AsyncConnection) -> None:
+        """End the streaming transaction and hand the connection back to the pool"""
+        try:
+            await connection.rollback()
+            await connection.set_autocommit(True)
+        except psycopg.Error as err:
+            logger.warning(f"Error resetting streaming connection: {err}")
+        await pool.putconn(connection)
+
+
+    async def execute_single_query(self, sql: str, params: Optional[Tuple] = None, connection=None) -> Optional[Dict[str, Any]]:
+        """
+        Execute a SELECT query that returns a single row with parameterized inputs.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use
+
+        Returns:
+            Dictionary with the first result, or None if no results
+        """
+        result = await self.execute_query(sql, params, dictionary=True, connection=connection)
+        if isinstance(result, list) and len(result) > 0:
+            return result[0]
+        return None
+
+
+    async def execute_modification_query(self, sql: str, params: Optional[Tuple] = None, connection=None, commit: bool = True) -> Optional[int]:
+        """
+        Execute an INSERT, UPDATE, or DELETE query with parameterized inputs.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use
+            commit: Whether to commit afterwards; pass False inside transaction()
+
+        Returns:
+            Number of affected rows
+        """
+        if connection is None:
+            async with self.get_connection() as connection:
+                return await self.execute_modification_query(sql, params, connection, commit)
+
+        async with connection.cursor() as cursor:
+            try:
+                started = time.perf_counter()
+                with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                    await cursor.execute(sql, params or ())
+                    if commit:
+                        await connection.commit()
+                await self.observe_query(sql, params, started, cursor.rowcount)
+                if commit:
+                    await self.note_write(connection)
+                return cursor.rowcount
+            except psycopg.Error as err:
+                metrics.record_query_error(sql, err)
+                logger.error("Executing modification query failed!")
+                logger.error(f"SQL:   {sql}")
+                logger.error(f"Params: {tracing.param_shapes(params)}")
+                logger.error(f"Error: {err}")
+                raise
+
+
+    async def execute_returning_query(self, sql: str, params: Optional[Tuple] = None, connection=None, commit: bool = True) -> List[Dict[str, Any]]:
+        """
+        Execute a modifying query with a RETURNING clause (or a data-modifying CTE) and return its rows.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use
+            commit: Whether to commit afterwards; pass False inside transaction()
+
+        Returns:
+            List of dictionaries, one per returned row
+        """
+        if connection is None:
+            async with self.get_connection() as connection:
+                return await self.execute_returning_query(sql, params, connection, commit)
+
+        async with connection.cursor() as cursor:
+            try:
+                started = time.perf_counter()
+                with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                    await cursor.execute(sql, params or ())
+                    columns = [desc.name for desc in cursor.description]
+                    data = [dict(zip(columns, row)) for row in await cursor.fetchall()]
+                    if commit:
+                        await connection.commit()
+                await self.observe_query(sql, params, started, len(data))
+                if commit:
+                    await self.note_write(connection)
+                return data
+            except psycopg.Error as err:
+                metrics.record_query_error(sql, err)
+                logger.error("Executing returning query failed!")
+                logger.error(f"SQL:   {sql}")
+                logger.error(f"Params: {tracing.param_shapes(params)}")
+                logger.error(f"Error: {err}")
+                raise
+
+
+    async def execute_batch_insert(self, table: str, columns: Sequence[str], rows: List[Tuple], connection=None, commit: bool = True) -> int:
+        """
+        Insert many rows with COPY FROM STDIN inside one transaction.
+
+        Args:
+            table: Target table name (trusted, never user input)
+            columns: Target column names (trusted, never user input)
+            rows: Tuples of values in column order
+            connection: Optional existing connection to use
+            commit: Whether to commit afterwards; pass False inside transaction()
+
+        Returns:
+            Number of inserted rows
+        """
+        if not rows:
+            return 0
+        if connection is None:
+            async with self.transaction() as connection:
+                return await self.execute_batch_insert(table, columns, rows, connection, commit=False)
+
+        sql = pg_sql.SQL("COPY {} ({}) FROM STDIN").format(
+            pg_sql.Identifier(table), pg_sql.SQL(", ").join(map(pg_sql.Identifier, columns))
+        ).as_string(connection)
+        async with connection.cursor() as cursor:
+            try:
+                started = time.perf_counter()
+                with tracing.span("db.execute", statement=metrics.statement_label(sql), rows=len(rows)):
+                    async with cursor.copy(sql) as copy:
+                        for row in rows:
+                            await copy.write_row(row)
+                    if commit:
+                        await connection.commit()
+                await self.observe_query(sql, None, started, len(rows))
+                if commit:
+                    await self.note_write(connection)
+                return len(rows)
+            except psycopg.Error as err:
+                metrics.record_query_error(sql, err)
+                logger.error("Executing batch insert failed!")
+                logger.error(f"SQL:   {sql}")
+                logger.error(f"Rows:  {len(rows)}")
+                logger.error(f"Error: {err}")
+                raise
@@ -0,0 +1,31 @@
+"""
+Create the database if needed and apply pending schema migrations, without starting the service.
+
+The service does this on startup by default. Run it as a separate deployment step when the
+service runs with MIGRATE_ON_STARTUP=false, or before reloading workers onto a release with
+new migrations:
+
+    python -m src.managers.migrate
+"""
+from dotenv import load_dotenv
+import argparse
+import logging
+
+from src.managers.postgres_manager import StandalonePostgresSettings
+from src.managers import migration_manager
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Migrate the configured database from the command line"""
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to the configured database")
+    parser.parse_args()
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    version = StandalonePostgresSettings().prepare_database()
+    logger.info(f"Schema is at version {version} of {migration_manager.latest_version()}")
+
+
+if __name__ == "__main__":
+    main()
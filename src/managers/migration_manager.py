@@ -0,0 +1,140 @@
+"""
+Versioned schema migrations.
+
+Migrations are the numbered SQL files in src/migrations, e.g. 0002_uuid_ids.sql,
+each run as one script. Pending migrations are applied in order inside a single
+transaction while holding an advisory lock, so replicas starting at the same time
+apply each migration exactly once and never see a half-migrated schema. When the
+schema is already current, startup costs two catalog lookups on one connection.
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Tuple
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+# Arbitrary application-wide key for pg_advisory_xact_lock
+MIGRATION_LOCK_ID = 7_236_284_993
+
+SCHEMA_VERSION_EXISTS_SQL = "SELECT to_regclass('public.schema_version') IS NOT NULL"
+CURRENT_VERSION_SQL = "SELECT COALESCE(max(version), 0) FROM schema_version"
+LOCK_SQL = "SELECT pg_advisory_xact_lock(%s)"
+CREATE_SCHEMA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version integer PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+RECORD_MIGRATION_SQL = "INSERT INTO schema_version (version, name) VALUES (%s, %s)"
+
+_MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+
+@lru_cache(maxsize=1)
+def load_migrations() -> Tuple[Migration, ...]:
+    """Read the migration files, ordered by version"""
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        match = _MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), path.read_text(encoding="utf-8")))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return tuple(migrations)
+
+
+def latest_version() -> int:
+    """Version the code expects the schema to be at"""
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+def _log_current(current: int) -> None:
+    if current > latest_version():
+        logger.warning(f"Database schema version {current} is newer than this release ({latest_version()})")
+    else:
+        logger.info(f"Database schema is up to date at version {current}")
+
+
+def migrate(connection) -> int:
+    """
+    Bring the schema up to date over a psycopg2 connection.
+
+    Returns:
+        The schema version afterwards
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA_VERSION_EXISTS_SQL)
+        current = 0
+        if cursor.fetchone()[0]:
+            cursor.execute(CURRENT_VERSION_SQL)
+            current = cursor.fetchone()[0]
+        connection.rollback()
+        if current >= latest_version():
+            _log_current(current)
+            return current
+
+        try:
+            cursor.execute(LOCK_SQL, (MIGRATION_LOCK_ID,))
+            cursor.execute(CREATE_SCHEMA_VERSION_SQL)
+            # Another replica may have migrated while we waited for the lock
+            cursor.execute(CURRENT_VERSION_SQL)
+            current = cursor.fetchone()[0]
+            for migration in load_migrations():
+                if migration.version <= current:
+                    continue
+                logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+                cursor.execute(migration.sql)
+                cursor.execute(RECORD_MIGRATION_SQL, (migration.version, migration.name))
+                current = migration.version
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+    logger.info(f"Database schema migrated to version {current}")
+    return current
+
+
+async def amigrate(connection) -> int:
+    """
+    Bring the schema up to date over a psycopg 3 async connection in autocommit mode.
+
+    Returns:
+        The schema version afterwards
+    """
+    cursor = await connection.execute(SCHEMA_VERSION_EXISTS_SQL)
+    current = 0
+    if (await cursor.fetchone())[0]:
+        cursor = await connection.execute(CURRENT_VERSION_SQL)
+        current = (await cursor.fetchone())[0]
+    if current >= latest_version():
+        _log_current(current)
+        return current
+
+    async with connection.transaction():
+        await connection.execute(LOCK_SQL, (MIGRATION_LOCK_ID,))
+        await connection.execute(CREATE_SCHEMA_VERSION_SQL)
+        # Another replica may have migrated while we waited for the lock
+        cursor = await connection.execute(CURRENT_VERSION_SQL)
+        current = (await cursor.fetchone())[0]
+        for migration in load_migrations():
+            if migration.version <= current:
+                continue
+            logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+            await connection.execute(migration.sql)
+            await connection.execute(RECORD_MIGRATION_SQL, (migration.version, migration.name))
+            current = migration.version
+    logger.info(f"Database schema migrated to version {current}")
+    return current
@@ -0,0 +1,121 @@
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import select
+import threading
+import logging
+from typing import Callable, Dict, List
+
+from src.managers.postgres_manager import PostgresSettings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationListener:
+    """
+    Receives Postgres NOTIFY messages on a dedicated connection in a background thread.
+
+    Callbacks run on the listener thread and must be quick. After the connection
+    was lost, notifications sent meanwhile are gone, so on_reconnect callbacks
+    run once the listener is back to let subscribers resynchronize.
+    """
+
+
+    def __init__(self, settings: PostgresSettings, max_backoff: float = 30.0):
+        """
+        Initialize the listener. Call start() after subscribing.
+
+        Args:
+            settings: Object carrying the connection settings, usually the database manager
+            max_backoff: Upper bound in seconds between reconnect attempts
+        """
+        self.settings = settings
+        self.max_backoff = max_backoff
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_callbacks: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="notification-listener", daemon=True)
+
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Call callback with the payload of every notification on channel"""
+        self._callbacks.setdefault(channel, []).append(callback)
+
+
+    def on_reconnect(self, callback: Callable[[], None]) -> None:
+        """Call callback whenever the listener reconnected after losing its connection"""
+        self._reconnect_callbacks.append(callback)
+
+
+    def start(self) -> None:
+        """Start the listener thread"""
+        self._thread.start()
+        logger.info(f"NotificationListener started for channels {sorted(self._callbacks)}")
+
+
+    def _connect(self):
+        """Open the listening connection and subscribe to all channels"""
+        connection = self.settings.create_connection()
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            for channel in self._callbacks:
+                cursor.execute(f'LISTEN "{channel}"')
+        return connection
+
+
+    def _run(self) -> None:
+        """Listen until closed, reconnecting with exponential backoff"""
+        backoff = 0.5
+        connected_before = False
+        while not self._stop.is_set():
+            try:
+                connection = self._connect()
+            except Exception as err:
+                logger.warning(f"NotificationListener could not connect, retrying in {backoff}s: {err}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            backoff = 0.5
+            if connected_before:
+                logger.info("NotificationListener reconnected")
+                self._dispatch_reconnect()
+            connected_before = True
+            try:
+                self._listen(connection)
+            except Exception as err:
+                logger.warning(f"NotificationListener lost its connection: {err}")
+            finally:
+                connection.close()
+
+
+    def _listen(self, connection) -> None:
+        """Wait for notifications on an open connection and dispatch them"""
+        while not self._stop.is_set():
+            # Wake up regularly to notice close()
+            if select.select([connection], [], [], 1.0) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                for callback in self._callbacks.get(notify.channel, []):
+                    try:
+                        callback(notify.payload)
+                    except Exception as e:
+                        logger.error(f"Notification callback for '{notify.channel}' failed: {e}")
+
+
+    def _dispatch_reconnect(self) -> None:
+        """Run the reconnect callbacks"""
+        for callback in self._reconnect_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Reconnect callback failed: {e}")
+
+
+    def close(self) -> None:
+        """Stop the listener thread"""
+        self._stop.set()
+        if self._thread.is_alive():
+            # The listener wakes up every second, so this only waits long on a hanging connect
+            self._thread.join(timeout=10)
+        logger.info("NotificationListener stopped")
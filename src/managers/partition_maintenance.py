@@ -0,0 +1,256 @@
+import psycopg2
+from psycopg2 import sql as pg_sql
+from datetime import date
+import re
+import threading
+import logging
+from typing import Dict
+
+from src.config import get_env_float, get_env_int
+from src.managers.postgres_manager import PostgresSettings
+from src.idempotency import idempotency_key_ttl
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("cancellation", "feedback")
+# Arbitrary application-wide key for pg_try_advisory_lock, next to the migration lock
+MAINTENANCE_LOCK_ID = 7_236_284_994
+
+TRY_LOCK_SQL = "SELECT pg_try_advisory_lock(%s)"
+UNLOCK_SQL = "SELECT pg_advisory_unlock(%s)"
+# Months and cutoffs are taken from the database clock, which also fills in created_at, not from the app host's
+CREATE_PARTITIONS_SQL = "SELECT create_form_partitions(%s, current_date, (date_trunc('month', current_date) + make_interval(months => %s))::date)"
+COLD_CUTOFF_DATE_SQL = "SELECT (CURRENT_TIMESTAMP - make_interval(days => %s))::date"
+LIST_PARTITIONS_SQL = """
+    SELECT c.relname FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+"""
+# Stored columns copied to the archive tables; generated columns such as the search vectors are recomputed there
+ARCHIVED_COLUMNS = {
+    "cancellation": "id, email, name, last_name, address, town, town_number, is_unordinary, reason, last_invoice_number, termination_date, created_at, is_archived",
+    "feedback": "id, email, text, created_at, is_archived",
+}
+# Moves one batch of old archived forms from the hot partitions to the archive table.
+# Built once per entry of PARTITIONED_TABLES, so only those constant names reach the SQL text.
+MOVE_TO_ARCHIVE_SQL = {table: f"""
+    WITH moved AS (
+        DELETE FROM {table} AS f
+        USING (
+            SELECT id, created_at FROM {table}
+            WHERE is_archived AND created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) AS batch
+        WHERE f.id = batch.id AND f.created_at = batch.created_at
+        RETURNING f.*
+    )
+    INSERT INTO {table}_archive ({ARCHIVED_COLUMNS[table]}) SELECT {ARCHIVED_COLUMNS[table]} FROM moved
+""" for table in PARTITIONED_TABLES}  # nosec B608
+# Partition names are read from the catalog, so they are quoted as identifiers
+LOCK_PARTITION_SQL = pg_sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE")
+PARTITION_HAS_ROWS_SQL = pg_sql.SQL("SELECT EXISTS (SELECT 1 FROM {})")
+DROP_PARTITION_SQL = pg_sql.SQL("DROP TABLE {}")
+
+# Deletes one batch of idempotency keys older than their time to live
+PURGE_IDEMPOTENCY_KEYS_SQL = """
+    DELETE FROM idempotency_keys AS k
+    USING (
+        SELECT form_type, key FROM idempotency_keys
+        WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ) AS batch
+    WHERE k.form_type = batch.form_type AND k.key = batch.key
+"""
+
+# Folds the change counter shards of backends that have ended into form_change_counter (migration 0008);
+# shards of running backends, and any a transaction still holds, are left alone
+FOLD_CHANGE_SHARDS_SQL = """
+    WITH ended AS (
+        SELECT table_name, backend FROM form_change_shards
+        WHERE backend NOT IN (SELECT pid FROM pg_stat_activity)
+        FOR UPDATE SKIP LOCKED
+    ), folded AS (
+        DELETE FROM form_change_shards AS s
+        USING ended
+        WHERE s.table_name = ended.table_name AND s.backend = ended.backend
+        RETURNING s.table_name, s.version
+    )
+    UPDATE form_change_counter AS c SET version = c.version + f.version
+    FROM (SELECT table_name, sum(version) AS version FROM folded GROUP BY table_name) AS f
+    WHERE c.table_name = f.table_name
+"""
+
+
+class PartitionMaintenance:
+    """
+    Keeps the monthly partitions of the form tables in shape from a background thread.
+
+    Each run creates the partitions for the coming months, moves archived forms older
+    than the cold age into the <table>_archive tables in batches, and drops partitions
+    of past months once they are empty, so inserts and unarchived listings only touch
+    a few small partitions. It also deletes expired idempotency keys. An advisory lock
+    lets only one process work at a time. Finally, it folds the change counter shards of
+    ended database backends, so reading a table's change counter stays cheap.
+    """
+
+
+    def __init__(self, settings: PostgresSettings):
+        """
+        Initialize the maintenance task with environment variables. Call start() to run it.
+
+        Args:
+            settings: Object carrying the connection settings, usually the database manager
+        """
+        self.settings = settings
+        self.interval = get_env_float("PARTITION_MAINTENANCE_INTERVAL", 3600.0)
+        self.months_ahead = get_env_int("PARTITION_MONTHS_AHEAD", 3)
+        self.cold_after_days = get_env_int("ARCHIVE_COLD_AFTER_DAYS", 90)
+        self.batch_size = get_env_int("ARCHIVE_MOVE_BATCH_SIZE", 5000)
+        self.idempotency_key_ttl = idempotency_key_ttl()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+
+
+    def start(self) -> None:
+        """Start the maintenance thread, which runs once right away and then every interval"""
+        if self.interval <= 0:
+            logger.info("Partition maintenance disabled since 'PARTITION_MAINTENANCE_INTERVAL' is 0")
+            return
+        self._thread.start()
+        logger.info(f"PartitionMaintenance started, running every {self.interval}s")
+
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as err:
+                logger.error(f"Partition maintenance failed: {err}")
+            self._stop.wait(self.interval)
+
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Run one maintenance pass over all partitioned tables.
+
+        Returns:
+            Rows moved to the archive tables by table, empty if another process holds the lock
+        """
+        moved = {}
+        connection = self.settings.create_connection()
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(TRY_LOCK_SQL, (MAINTENANCE_LOCK_ID,))
+                if not cursor.fetchone()[0]:
+                    logger.info("Partition maintenance is running elsewhere, skipping this pass")
+                    return moved
+                try:
+                    for table in PARTITIONED_TABLES:
+                        self.create_partitions(cursor, table)
+                        if self.cold_after_days > 0:
+                            moved[table] = self.move_to_archive(cursor, table)
+                            self.drop_empty_partitions(connection, table)
+                    self.purge_idempotency_keys(cursor)
+                    self.fold_change_shards(cursor)
+                finally:
+                    cursor.execute(UNLOCK_SQL, (MAINTENANCE_LOCK_ID,))
+        finally:
+            connection.close()
+        return moved
+
+
+    def create_partitions(self, cursor, table: str) -> None:
+        """Create the partitions from the current month through months_ahead months from now"""
+        cursor.execute(CREATE_PARTITIONS_SQL, (table, self.months_ahead))
+        created = cursor.fetchone()[0]
+        if created:
+            logger.info(f"Created {created} partitions of {table} up to {self.months_ahead} months ahead")
+
+
+    def move_to_archive(self, cursor, table: str) -> int:
+        """Move archived forms older than the cold age to the archive table, one committed batch at a time"""
+        total = 0
+        while not self._stop.is_set():
+            cursor.execute(MOVE_TO_ARCHIVE_SQL[table], (self.cold_after_days, self.batch_size))
+            total += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                break
+        if total:
+            logger.info(f"Moved {total} archived forms from {table} to {table}_archive")
+        return total
+
+
+    def purge_idempotency_keys(self, cursor) -> int:
+        """Delete idempotency keys past their time to live, one committed batch at a time"""
+        total = 0
+        while not self._stop.is_set():
+            cursor.execute(PURGE_IDEMPOTENCY_KEYS_SQL, (self.idempotency_key_ttl, self.batch_size))
+            total += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                break
+        if total:
+            logger.info(f"Deleted {total} expired idempotency keys")
+        return total
+
+
+    def fold_change_shards(self, cursor) -> None:
+        """Fold the change counter shards of ended backends into the base counters"""
+        cursor.execute(FOLD_CHANGE_SHARDS_SQL)
+        if cursor.rowcount:
+            logger.info(f"Folded change counter shards of ended backends for {cursor.rowcount} tables")
+
+
+    def drop_empty_partitions(self, connection, table: str) -> None:
+        """Drop the partitions of months that ended before the cold age and hold no forms anymore"""
+        pattern = re.compile(rf"^{table}_p(\d{{4}})_(\d{{2}})$")
+        with connection.cursor() as cursor:
+            cursor.execute(COLD_CUTOFF_DATE_SQL, (self.cold_after_days,))
+            cutoff = cursor.fetchone()[0]
+            cursor.execute(LIST_PARTITIONS_SQL, (table,))
+            partitions = [row[0] for row in cursor.fetchall()]
+        for partition in partitions:
+            match = pattern.match(partition)
+            if match is None:
+                continue
+            year, month = int(match.group(1)), int(match.group(2))
+            month_end = date(year + month // 12, month % 12 + 1, 1)
+            if month_end <= cutoff and self._drop_if_empty(connection, partition):
+                logger.info(f"Dropped empty partition {partition}")
+
+
+    @staticmethod
+    def _drop_if_empty(connection, partition: str) -> bool:
+        """Drop a partition in its own transaction unless it still holds rows"""
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                # Don't queue behind long-running queries; the next pass tries again
+                cursor.execute("SET LOCAL lock_timeout = '2s'")
+                identifier = pg_sql.Identifier(partition)
+                cursor.execute(LOCK_PARTITION_SQL.format(identifier))
+                cursor.execute(PARTITION_HAS_ROWS_SQL.format(identifier))
+                if cursor.fetchone()[0]:
+                    connection.rollback()
+                    return False
+                cursor.execute(DROP_PARTITION_SQL.format(identifier))
+            connection.commit()
+            return True
+        except psycopg2.Error as err:
+            connection.rollback()
+            logger.warning(f"Could not drop partition {partition}: {err}")
+            return False
+        finally:
+            connection.autocommit = True
+
+
+    def close(self) -> None:
+        """Stop the maintenance thread"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=10)
+            if self._thread.is_alive():
+                logger.warning("PartitionMaintenance is still finishing a statement, not waiting for it")
+        logger.info("PartitionMaintenance stopped")
@@ -1,18 +1,225 @@
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import psycopg2.errors
+from psycopg2 import sql as pg_sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values, register_uuid
+from contextlib import contextmanager
+from collections import deque
+from uuid import uuid4
 import os
+import time
 import logging
-from typing import Optional, Dict, Any, List, Tuple
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator, Sequence
+
+from src.config import get_env_bool, get_env_int, get_env_float, get_env_str
+from src import admission, consistency, metrics, tracing
+from src.circuit_breaker import DatabaseUnavailableError, create_circuit_breaker
+from src.managers import migration_manager
+from src.managers.replica_monitor import ReplicaMonitor
 
 logger = logging.getLogger(__name__)
 
+# Read uuid columns as uuid.UUID and accept UUID parameters, like psycopg 3 does
+register_uuid()
 
-class PostgresManager:
-    """Database manager for PostgreSQL operations"""
 
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the configured wait time"""
 
-    def __init__(self):
-        """Initialize the database manager with environment variables"""
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of PostgreSQL connections"""
+
+
+    def __init__(self, connect: Callable, min_size: int, max_size: int, timeout: float, max_lifetime: float, health_check_interval: float):
+        """
+        Initialize the pool and open the minimum number of connections.
+
+        Args:
+            connect: Callable returning a new database connection
+            min_size: Number of connections opened up front and kept around
+            max_size: Upper bound on open connections (idle and in use)
+            timeout: Seconds to wait for a free connection before giving up
+            max_lifetime: Seconds after which a connection is closed and replaced
+            health_check_interval: Idle seconds after which a connection is pinged on checkout
+        """
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._idle: deque = deque()  # (connection, created_at, last_used_at)
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        for _ in range(self.min_size):
+            with self._condition:
+                self._size += 1
+            connection, created_at = self._open_connection()
+            self._idle.append((connection, created_at, created_at))
+
+
+    def _open_connection(self) -> Tuple[Any, float]:
+        """Open a new connection for a slot already reserved in the pool size"""
+        try:
+            connection = self._connect()
+            connection.autocommit = True
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        created_at = time.monotonic()
+        self._created_at[id(connection)] = created_at
+        return connection, created_at
+
+
+    def _discard(self, connection) -> None:
+        """Close a connection and free its slot in the pool"""
+        self._created_at.pop(id(connection), None)
+        try:
+            if not connection.closed:
+                connection.close()
+        except psycopg2.Error as err:
+            logger.warning(f"Error closing pooled connection: {err}")
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+    def _is_usable(self, connection, created_at: float, last_used_at: float) -> bool:
+        """Check a connection before handing it out"""
+        now = time.monotonic()
+        if connection.closed:
+            return False
+        if self.max_lifetime > 0 and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at > self.health_check_interval:
+            try:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except psycopg2.Error as err:
+                logger.warning(f"Pooled connection failed health check: {err}")
+                return False
+        return True
+
+
+    def getconn(self):
+        """Check out a connection, waiting up to the configured timeout for a free slot"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        connection, created_at, last_used_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        connection = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"No database connection available within {self.timeout}s "
+                            f"(pool max size {self.max_size} reached)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if connection is None:
+                connection, _ = self._open_connection()
+                return connection
+            if self._is_usable(connection, created_at, last_used_at):
+                return connection
+            self._discard(connection)
+
+
+    def putconn(self, connection, discard: bool = False) -> None:
+        """Return a checked-out connection to the pool"""
+        created_at = self._created_at.get(id(connection))
+        if discard or self._closed or created_at is None or connection.closed:
+            self._discard(connection)
+            return
+        if self.max_lifetime > 0 and time.monotonic() - created_at > self.max_lifetime:
+            self._discard(connection)
+            return
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if not connection.autocommit:
+                connection.autocommit = True
+        except psycopg2.Error as err:
+            logger.warning(f"Discarding pooled connection that could not be reset: {err}")
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._condition.notify()
+
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Context manager that checks out a connection and returns it afterwards"""
+        connection = self.getconn()
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(connection, discard=True)
+            raise
+        except BaseException:
+            self.putconn(connection)
+            raise
+        else:
+            self.putconn(connection)
+
+
+    def stats(self) -> Dict[str, int]:
+        """Return the current number of open, idle and in-use connections and of threads waiting for one"""
+        with self._condition:
+            idle = len(self._idle)
+            return {"size": self._size, "idle": idle, "in_use": self._size - idle, "waiting": self._waiting}
+
+
+    def close(self) -> None:
+        """Close all idle connections; checked-out connections are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+
+def parse_replica_hosts(value: str, default_port: int) -> List[Tuple[str, int]]:
+    """Parse a comma-separated list of host[:port] entries"""
+    hosts = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.rpartition(":") if ":" in entry else (entry, "", "")
+        hosts.append((host, int(port) if port else default_port))
+    return hosts
+
+
+class PostgresSettings:
+    """Connection, pool and batching settings shared by the sync and async database managers"""
+
+
+    def load_settings(self):
+        """Read the connection, pool and batching settings from environment variables"""
         if "POSTGRES_HOST" in os.environ:
             self.host = os.environ["POSTGRES_HOST"]
             logger.info(f"Using database host '{self.host}' from environment variable 'POSTGRES_HOST'")
@@ -48,112 +255,369 @@ class PostgresManager:
             self.db_name = "forms"
             logger.warning(f"Using database name '{self.db_name}' since 'POSTGRES_DB_NAME' not set")
 
+        self.pool_min_size = get_env_int("POSTGRES_POOL_MIN_SIZE", 1)
+        self.pool_max_size = get_env_int("POSTGRES_POOL_MAX_SIZE", 10)
+        self.pool_timeout = get_env_float("POSTGRES_POOL_TIMEOUT", 5.0)
+        self.pool_max_lifetime = get_env_float("POSTGRES_POOL_MAX_LIFETIME", 1800.0)
+        self.pool_health_check_interval = get_env_float("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", 30.0)
+        self.connect_timeout = get_env_int("POSTGRES_CONNECT_TIMEOUT", 5)
+        self.stream_batch_size = get_env_int("POSTGRES_STREAM_BATCH_SIZE", 1000)
+        self.bulk_chunk_size = get_env_int("POSTGRES_BULK_CHUNK_SIZE", 1000)
+        self.replica_hosts = parse_replica_hosts(get_env_str("POSTGRES_REPLICA_HOSTS", ""), self.port)
+        self.read_your_writes = get_env_bool("POSTGRES_READ_YOUR_WRITES", False)
+        self.migrate_on_startup = get_env_bool("MIGRATE_ON_STARTUP", True)
+        self.slow_query_log = tracing.SlowQueryLog()
+        self.circuit_breaker = create_circuit_breaker()
+
+
+    def create_connection(self, without_db: bool = False, host: Optional[str] = None, port: Optional[int] = None):
+        """Creates and returns a connection to the database, on a replica if host and port are given"""
+        if without_db:
+            return psycopg2.connect(
+                user=self.user, 
+                password=self.password,
+                host=self.host,
+                port=self.port,
+                dbname="postgres",
+                connect_timeout=self.connect_timeout
+            )
+        return psycopg2.connect(
+                user=self.user, 
+                password=self.password,
+                host=host or self.host,
+                port=port or self.port,
+                database=self.db_name,
+                connect_timeout=self.connect_timeout
+        )
+
+
+    def connect_or_create_database(self):
+        """Connect to the configured database, creating it first if it does not exist"""
+        try:
+            return self.create_connection()
+        except psycopg2.OperationalError as err:
+            logger.warning(f"Error connecting to database: {err}")
+
+        connection = self.create_connection(without_db=True)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (self.db_name,))
+                if not cursor.fetchone():
+                    logger.info(f"Creating database {self.db_name}")
+                    cursor.execute(f'CREATE DATABASE "{self.db_name}"')
+        except psycopg2.errors.DuplicateDatabase:
+            logger.info(f"Database {self.db_name} was created concurrently")
+        finally:
+            connection.close()
+        return self.create_connection()
+
+
+    def prepare_database(self) -> int:
+        """
+        Create the database if needed and apply pending migrations over a short-lived connection.
+
+        Returns:
+            The schema version afterwards
+        """
+        connection = self.connect_or_create_database()
+        try:
+            return migration_manager.migrate(connection)
+        finally:
+            connection.close()
+
+
+    def observe_acquire(self, started: float, pool: str = "primary") -> None:
+        """Record how long checking out a pooled connection took"""
+        duration = time.perf_counter() - started
+        metrics.CONNECTION_ACQUIRE_LATENCY.observe(duration, pool)
+        if pool == "primary":
+            admission.DB_LOAD.observe_acquire(duration)
+        tracing.record_span("db.acquire", duration)
+
+
+    def choose_replica(self, read_only: bool, loads: Callable[[], List[int]]) -> int:
+        """
+        Decide where a statement runs: the index of a replica, or consistency.PRIMARY.
+
+        Reads stick to the replica the running request read from first, as long as it
+        stays healthy and has replayed the request's writes and X-Read-After position.
+        """
+        if not read_only or self.replica_monitor is None:
+            return consistency.PRIMARY
+        request = consistency.current()
+        min_lsn = consistency.required_lsn()
+        if request is not None and request.read_pool is not None:
+            index = request.read_pool
+            if index == consistency.PRIMARY:
+                return index
+            if self.replica_monitor.healthy[index] and self.replica_monitor.replay_lsn[index] >= min_lsn:
+                return index
+        index = self.replica_monitor.pick(loads(), min_lsn)
+        if index is None:
+            index = consistency.PRIMARY
+        if request is not None:
+            request.read_pool = index
+        return index
+
+
+    def replica_failed(self, index: int, err: Exception) -> None:
+        """Eject a replica whose connection failed and move the running request's reads to the primary"""
+        self.replica_monitor.mark_failed(index, str(err).strip())
+        request = consistency.current()
+        if request is not None and request.read_pool == index:
+            request.read_pool = consistency.PRIMARY
+
+
+    def connection_failed(self, index: int, err: Exception) -> None:
+        """Count a connection that broke against the replica it came from or the primary's circuit breaker"""
+        if index == consistency.PRIMARY:
+            self.circuit_breaker.record_failure(err)
+        else:
+            self.replica_failed(index, err)
+
+
+    def connection_succeeded(self, index: int) -> None:
+        """Note that the database answered on a connection, which closes a half-open circuit breaker"""
+        if index == consistency.PRIMARY:
+            self.circuit_breaker.record_success()
+
+
+    def record_write_position(self, lsn: str) -> None:
+        """Remember the primary's WAL position after a committed write"""
+        position = consistency.parse_lsn(lsn)
+        self.last_write_lsn = max(self.last_write_lsn, position)
+        consistency.record_write(position)
+
+
+class StandalonePostgresSettings(PostgresSettings):
+    """Connection settings for command line tools, read from the same environment variables as the service"""
+
+
+    def __init__(self):
+        self.load_settings()
+
+
+class PostgresManager(PostgresSettings):
+    """Database manager for PostgreSQL operations"""
+
+
+    def __init__(self):
+        """Initialize the database manager with environment variables"""
+        self.load_settings()
+
         logger.info("PostgresManager initialized. Trying to connect to database...")
-        if not self.db_connection_works():
-            logger.info(f"Database '{self.db_name}' does not exist. Creating and initializing...")
-            self.execute_init_db_sql()
-            logger.info(f"Database '{self.db_name}' created and schema initialized successfully.")
-
-        if not self.db_tables_exist():
-            logger.info("Database tables do not exist. Initializing schema...")
-            self.execute_init_db_sql()
-            logger.info("Database schema initialized successfully.")
+        if self.migrate_on_startup:
+            self.prepare_database()
         
-        _test_connection = self.create_connection()
+        self.pool = ConnectionPool(
+            self.create_connection,
+            min_size=self.pool_min_size,
+            max_size=self.pool_max_size,
+            timeout=self.pool_timeout,
+            max_lifetime=self.pool_max_lifetime,
+            health_check_interval=self.pool_health_check_interval,
+        )
+        self.last_write_lsn = 0
+        self.replica_monitor = None
+        self.replica_pools: List[ConnectionPool] = []
+        if self.replica_hosts:
+            self.replica_monitor = ReplicaMonitor(self, self.replica_hosts)
+            # Replica connections are opened on demand, so a replica being down does not keep the service from starting
+            self.replica_pools = [
+                ConnectionPool(
+                    lambda host=host, port=port: self.create_connection(host=host, port=port),
+                    min_size=0,
+                    max_size=self.pool_max_size,
+                    timeout=self.pool_timeout,
+                    max_lifetime=self.pool_max_lifetime,
+                    health_check_interval=self.pool_health_check_interval,
+                )
+                for host, port in self.replica_hosts
+            ]
+            self.replica_monitor.start()
+        metrics.POOL_CONNECTIONS.set_function("primary", self.pool_metrics)
+        metrics.CIRCUIT_BREAKER_OPEN.set_function("primary", lambda: {(): 0 if self.circuit_breaker.is_closed() else 1})
         logger.info("Database connection successful")
-        _test_connection.close()
 
 
-    def db_connection_works(self) -> bool:
-        """Check if the database exists"""
+    def replica_loads(self) -> List[int]:
+        """Connections in use or waited for per replica pool"""
+        loads = []
+        for pool in self.replica_pools:
+            stats = pool.stats()
+            loads.append(stats["in_use"] + stats["waiting"])
+        return loads
+
+
+    def checkout(self, read_only: bool) -> Tuple[int, Any]:
+        """Check out a connection from the primary pool or, for reads, a replica pool; returns the pool index too"""
+        index = self.choose_replica(read_only, self.replica_loads)
+        started = time.perf_counter()
+        if index != consistency.PRIMARY:
+            try:
+                connection = self.replica_pools[index].getconn()
+                self.observe_acquire(started, self.replica_monitor.name(index))
+                return index, connection
+            except psycopg2.OperationalError as err:
+                self.replica_failed(index, err)
+                index = consistency.PRIMARY
+                started = time.perf_counter()
+        self.circuit_breaker.before_call()
         try:
-            connection = self.create_connection()
-            cursor = connection.cursor()
-            cursor.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (self.db_name,))
-            exists = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            if exists:
-                return True
-            return False
+            connection = self.pool.getconn()
+        except PoolTimeoutError as err:
+            self.circuit_breaker.record_failure(err)
+            raise
         except psycopg2.OperationalError as err:
-            logger.warning(f"Error checking if database exists: {err}")
-            return False
-            
+            self.circuit_breaker.record_failure(err)
+            raise DatabaseUnavailableError(f"Connecting to the database failed: {str(err).strip()}") from err
+        self.observe_acquire(started)
+        return index, connection
+
+
+    def pool_for(self, index: int) -> ConnectionPool:
+        """The pool a connection checked out by checkout() belongs to"""
+        return self.pool if index == consistency.PRIMARY else self.replica_pools[index]
+
+
+    @contextmanager
+    def get_connection(self, read_only: bool = False) -> Iterator[Any]:
+        """
+        Check out a pooled connection for the duration of the with-block.
+
+        Pass read_only=True to allow the connection to come from a read replica.
+        A connection breaking in the with-block ejects its replica or counts towards
+        opening the circuit breaker; any answer from the primary closes the breaker.
+        """
+        index, connection = self.checkout(read_only)
+        with self.use_connection(index, connection):
+            yield connection
 
 
-    def db_tables_exist(self) -> bool:
-        """Check if the required tables exist in the database"""
-        _test_connection = self.create_connection()
+    @contextmanager
+    def use_connection(self, index: int, connection) -> Iterator[Any]:
+        """Account for a connection checked out by checkout() and return it to its pool after the with-block"""
+        discard = False
         try:
-            one_feedback = self.execute_query('SELECT * FROM feedback LIMIT 1;', connection=_test_connection)
-            one_cancellation = self.execute_query("SELECT * FROM cancellation LIMIT 1;", connection=_test_connection)
-            if one_feedback is not None and one_cancellation is not None:
-                return True
-            return False
-        except psycopg2.Error as err:
-            logger.warning(f"Error checking if database tables exist: {err}")
-            return False
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as err:
+            discard = True
+            # Statement timeouts and the like are OperationalErrors too, but leave the connection open
+            if connection.closed:
+                self.connection_failed(index, err)
+            else:
+                self.connection_succeeded(index)
+            raise
+        except psycopg2.Error:
+            self.connection_succeeded(index)
+            raise
+        else:
+            self.connection_succeeded(index)
         finally:
-            _test_connection.close()
-       
+            self.pool_for(index).putconn(connection, discard=discard)
 
-    def execute_init_db_sql(self):
-        """Execute the init.sql file to set up the database schema"""
-        # Step 1: Create Database if it doesn't exist
-        connection = self.create_connection(without_db=True)
-        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+
+    def run_read(self, read: Callable[[Any], Any]) -> Any:
+        """
+        Run read(connection) on a pooled connection that may come from a read replica.
+
+        If the replica's connection breaks, the replica is ejected and the read runs once
+        more, on another healthy replica or the primary.
+        """
+        index, connection = self.checkout(read_only=True)
+        try:
+            with self.use_connection(index, connection):
+                return read(connection)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as err:
+            if index == consistency.PRIMARY or self.replica_monitor.healthy[index]:
+                raise
+            logger.warning(f"Read on replica {self.replica_monitor.name(index)} failed, retrying elsewhere: {str(err).strip()}")
+        with self.get_connection(read_only=True) as connection:
+            return read(connection)
+
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """Check out a pooled connection and run the with-block in one transaction, committed on success"""
+        with self.get_connection() as connection:
+            connection.autocommit = False
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            self.note_write(connection)
+
+
+    def note_write(self, connection) -> None:
+        """With read-your-writes enabled, remember the WAL position after a write committed on this connection"""
+        if not self.read_your_writes:
+            return
         cursor = connection.cursor()
         try:
-            # Check if database exists
-            cursor.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (self.db_name,))
-            exists = cursor.fetchone()
-            if not exists:
-                logger.info(f"Creating database {self.db_name}")
-                cursor.execute(f'CREATE DATABASE "{self.db_name}"')
-            else:
-                 logger.info(f"Database {self.db_name} already exists")
+            cursor.execute("SELECT pg_current_wal_lsn()::text")
+            self.record_write_position(cursor.fetchone()[0])
         except psycopg2.Error as err:
-             logger.error(f"Error creating database: {err}")
-             raise
+            # The write is committed either way; only reads routed to a lagging replica may miss it
+            logger.warning(f"Reading the WAL position after a write failed: {err}")
         finally:
             cursor.close()
-            connection.close()
 
-        # Step 2: Create Tables
-        connection = self.create_connection() # Connect to the new DB
+
+    def pool_metrics(self) -> Dict[Tuple[str, str], int]:
+        """Connection counts by state for the pool gauge"""
+        stats = self.pool.stats()
+        counts = {("primary", state): stats[state] for state in ("idle", "in_use", "waiting")}
+        for index, pool in enumerate(self.replica_pools):
+            stats = pool.stats()
+            counts.update({(self.replica_monitor.name(index), state): stats[state] for state in ("idle", "in_use", "waiting")})
+        return counts
+
+
+    def close(self) -> None:
+        """Close the connection pools and stop watching the replicas"""
+        metrics.POOL_CONNECTIONS.remove_function("primary")
+        metrics.CIRCUIT_BREAKER_OPEN.remove_function("primary")
+        if self.replica_monitor is not None:
+            self.replica_monitor.close()
+        for pool in self.replica_pools:
+            pool.close()
+        self.pool.close()
+
+
+    def observe_query(self, sql: str, params: Optional[Tuple], started: float, rows: Optional[int] = None, connection=None) -> None:
+        """
+        Record metrics for a finished statement and log it if it was slow.
+
+        Pass the connection to allow capturing the plan of a slow SELECT; it is only
+        re-run in autocommit mode so a failing EXPLAIN cannot abort a caller's transaction.
+        """
+        duration = time.perf_counter() - started
+        metrics.observe_query(sql, duration, rows)
+        admission.DB_LOAD.observe_query(duration)
+        if not self.slow_query_log.is_slow(duration):
+            return
+        plan = None
+        if connection is not None and connection.autocommit and self.slow_query_log.should_explain(sql):
+            plan = self.explain(sql, params, connection)
+        self.slow_query_log.record(sql, params, duration, rows, plan)
+
+
+    def explain(self, sql: str, params: Optional[Tuple], connection) -> Optional[str]:
+        """Run a SELECT again under EXPLAIN (ANALYZE, BUFFERS) and return the plan text"""
+        cursor = connection.cursor()
         try:
-            cursor = connection.cursor()
-            for statement in init_sql.split(';'):
-                if statement.strip():
-                    cursor.execute(statement)
-            connection.commit()
-            logger.info("Database schema updated successfully")
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params or ())
+            return "\n".join(row[0] for row in cursor.fetchall())
         except psycopg2.Error as err:
-            logger.error(f"Error executing init.sql: {err}")
-            raise
+            logger.warning(f"Explaining slow query failed: {err}")
+            return None
         finally:
             cursor.close()
-            connection.close()
 
 
-    def create_connection(self, without_db: bool = False):
-        """Creates and returns a connection to the database"""
-        if without_db:
-            return psycopg2.connect(
-                user=self.user, 
-                password=self.password,
-                host=self.host,
-                port=self.port,
-                dbname="postgres"
-            )
-        return psycopg2.connect(
-                user=self.user, 
-                password=self.password,
-                host=self.host,
-                port=self.port,
-                database=self.db_name
-        )
     def execute_query(self, sql: str, params: Optional[Tuple] = None, dictionary: bool = True, connection=None) -> Optional[List[Dict[str, Any]]]:
         """
         Execute a SELECT query with parameterized inputs to prevent SQL injection.
@@ -162,37 +626,141 @@ class PostgresManager:
             sql: SQL query with %s placeholders
             params: Tuple of parameters to bind to the query
             dictionary: Whether to return results as dictionaries
-            connection: Optional existing connection to use
+            connection: Optional existing connection to use instead of a pooled one
             
         Returns:
-            List of dictionaries (if dictionary=True) or tuples, or None on error
+            List of dictionaries (if dictionary=True) or tuples, or None on error.
+            Connection failures are raised, so the connection is discarded and counted as failed.
         """
-        standalone_connection = False
         if connection is None:
-            connection = self.create_connection()
-            standalone_connection = True
+            return self.run_read(lambda connection: self.execute_query(sql, params, dictionary, connection))
         
         cursor = connection.cursor()
         try:
-            cursor.execute(sql, params or ())
+            started = time.perf_counter()
+            with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                cursor.execute(sql, params or ())
+            with tracing.span("db.fetch"):
+                data = cursor.fetchall()
             
             if dictionary and cursor.description:
                 columns = [desc[0] for desc in cursor.description]
-                data = [dict(zip(columns, row)) for row in cursor.fetchall()]
-                return data
+                with tracing.span("db.build_rows", rows=len(data)):
+                    data = [dict(zip(columns, row)) for row in data]
             
-            data = cursor.fetchall()
+            self.observe_query(sql, params, started, len(data), connection)
             return data
         except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
             logger.error("Executing query failed!")
             logger.error(f"SQL:   {sql}")
-            logger.error(f"Params: {params}")
+            logger.error(f"Params: {tracing.param_shapes(params)}")
             logger.error(f"Error: {err}")
+            if isinstance(err, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                raise
             return None
         finally:
             cursor.close()
-            if standalone_connection: 
-                connection.close()
+
+
+    def execute_raw_query(self, sql: str, params: Optional[Tuple] = None, connection=None) -> Tuple[List[str], List[Tuple]]:
+        """
+        Execute a SELECT query and return the column names and plain row tuples, without building dictionaries.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use instead of a pooled one
+
+        Returns:
+            Tuple of the column names and the list of row tuples
+        """
+        if connection is None:
+            return self.run_read(lambda connection: self.execute_raw_query(sql, params, connection))
+
+        cursor = connection.cursor()
+        try:
+            started = time.perf_counter()
+            with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                cursor.execute(sql, params or ())
+            columns = [desc[0] for desc in cursor.description]
+            with tracing.span("db.fetch"):
+                rows = cursor.fetchall()
+            self.observe_query(sql, params, started, len(rows), connection)
+            return columns, rows
+        except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
+            logger.error("Executing query failed!")
+            logger.error(f"SQL:   {sql}")
+            logger.error(f"Params: {tracing.param_shapes(params)}")
+            logger.error(f"Error: {err}")
+            raise
+        finally:
+            cursor.close()
+
+
+    def stream_query(self, sql: str, params: Optional[Tuple] = None, batch_size: Optional[int] = None) -> Iterator[List[Tuple]]:
+        """
+        Execute a SELECT query through a named server-side cursor and iterate over the result in batches.
+
+        The connection is checked out and the query is declared before this returns,
+        so pool and SQL errors surface to the caller instead of in the middle of the stream.
+        The connection stays checked out until the iterator is exhausted or closed.
+
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            batch_size: Rows fetched per round trip, defaults to POSTGRES_STREAM_BATCH_SIZE
+
+        Returns:
+            Iterator over lists of row tuples
+        """
+        batch_size = batch_size or self.stream_batch_size
+        index, connection = self.checkout(read_only=True)
+        pool = self.pool_for(index)
+        try:
+            # Named cursors only live inside a transaction
+            connection.autocommit = False
+            cursor = connection.cursor(name=f"stream_{uuid4().hex}")
+            cursor.itersize = batch_size
+            started = time.perf_counter()
+            with tracing.span("db.declare_cursor", statement=metrics.statement_label(sql)):
+                cursor.execute(sql, params or ())
+            self.observe_query(sql, params, started)
+        except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
+            logger.error("Executing streaming query failed!")
+            logger.error(f"SQL:   {sql}")
+            logger.error(f"Error: {err}")
+            if connection.closed:
+                self.connection_failed(index, err)
+            else:
+                self.connection_succeeded(index)
+            pool.putconn(connection, discard=isinstance(err, (psycopg2.OperationalError, psycopg2.InterfaceError)))
+            raise
+        # The cursor is declared, so the database answered; this also closes a half-open circuit breaker
+        self.connection_succeeded(index)
+        return self._iter_batches(pool, connection, cursor, batch_size)
+
+
+    def _iter_batches(self, pool: ConnectionPool, connection, cursor, batch_size: int) -> Iterator[List[Tuple]]:
+        """Fetch batches from a named cursor and return the connection to the pool afterwards"""
+        discard = False
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                discard = True
+            pool.putconn(connection, discard=discard)
 
 
     def execute_single_query(self, sql: str, params: Optional[Tuple] = None, connection=None) -> Optional[Dict[str, Any]]:
@@ -202,7 +770,7 @@ class PostgresManager:
         Args:
             sql: SQL query with %s placeholders
             params: Tuple of parameters to bind to the query
-            connection: Optional existing connection to use
+            connection: Optional existing connection to use instead of a pooled one
             
         Returns:
             Dictionary with the first result, or None if no results
@@ -213,65 +781,127 @@ class PostgresManager:
         return None
 
 
-    def execute_modification_query(self, sql: str, params: Optional[Tuple] = None, connection=None) -> Optional[int]:
+    def execute_modification_query(self, sql: str, params: Optional[Tuple] = None, connection=None, commit: bool = True) -> Optional[int]:
         """
         Execute an INSERT, UPDATE, or DELETE query with parameterized inputs.
         
         Args:
             sql: SQL query with %s placeholders
             params: Tuple of parameters to bind to the query
-            connection: Optional existing connection to use
+            connection: Optional existing connection to use instead of a pooled one
+            commit: Whether to commit afterwards; pass False inside transaction()
             
         Returns:
             Number of affected rows
         """
-        standalone_connection = False
         if connection is None:
-            connection = self.create_connection()
-            standalone_connection = True
+            with self.get_connection() as connection:
+                return self.execute_modification_query(sql, params, connection, commit)
         
         cursor = connection.cursor()
         try:
-            cursor.execute(sql, params or ())
-            connection.commit()
+            started = time.perf_counter()
+            with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                cursor.execute(sql, params or ())
+                if commit:
+                    connection.commit()
+            self.observe_query(sql, params, started, cursor.rowcount)
+            if commit:
+                self.note_write(connection)
             return cursor.rowcount
         except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
             logger.error("Executing modification query failed!")
             logger.error(f"SQL:   {sql}")
-            logger.error(f"Params: {params}")
+            logger.error(f"Params: {tracing.param_shapes(params)}")
             logger.error(f"Error: {err}")
             raise
         finally:
             cursor.close()
-            if standalone_connection:
-                connection.close()
 
 
-init_sql = """
-DROP TABLE IF EXISTS cancellation;
-DROP TABLE IF EXISTS feedback;
-
-CREATE TABLE IF NOT EXISTS cancellation (
-    id varchar(36) NOT NULL DEFAULT gen_random_uuid()::text,
-    email varchar(255) NOT NULL,
-    name varchar(100) NOT NULL,
-    last_name varchar(100) NOT NULL,
-    address varchar(255) NOT NULL,
-    town varchar(100) NOT NULL,
-    town_number varchar(10) NOT NULL,
-    is_unordinary boolean DEFAULT false,
-    reason varchar(255) DEFAULT NULL,
-    last_invoice_number varchar(50) NOT NULL,
-    termination_date date NOT NULL,
-    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    is_archived boolean DEFAULT false
-);
-
-CREATE TABLE IF NOT EXISTS feedback (
-    id varchar(36) NOT NULL DEFAULT gen_random_uuid()::text,
-    email varchar(255) DEFAULT NULL,
-    text varchar(500) DEFAULT NULL,
-    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    is_archived boolean DEFAULT false
-);
-"""
\ No newline at end of file
+    def execute_returning_query(self, sql: str, params: Optional[Tuple] = None, connection=None, commit: bool = True) -> List[Dict[str, Any]]:
+        """
+        Execute a modifying query with a RETURNING clause (or a data-modifying CTE) and return its rows.
+        
+        Args:
+            sql: SQL query with %s placeholders
+            params: Tuple of parameters to bind to the query
+            connection: Optional existing connection to use instead of a pooled one
+            commit: Whether to commit afterwards; pass False inside transaction()
+            
+        Returns:
+            List of dictionaries, one per returned row
+        """
+        if connection is None:
+            with self.get_connection() as connection:
+                return self.execute_returning_query(sql, params, connection, commit)
+        
+        cursor = connection.cursor()
+        try:
+            started = time.perf_counter()
+            with tracing.span("db.execute", statement=metrics.statement_label(sql)):
+                cursor.execute(sql, params or ())
+                columns = [desc[0] for desc in cursor.description]
+                data = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                if commit:
+                    connection.commit()
+            self.observe_query(sql, params, started, len(data))
+            if commit:
+                self.note_write(connection)
+            return data
+        except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
+            logger.error("Executing returning query failed!")
+            logger.error(f"SQL:   {sql}")
+            logger.error(f"Params: {tracing.param_shapes(params)}")
+            logger.error(f"Error: {err}")
+            raise
+        finally:
+            cursor.close()
+
+
+
+    def execute_batch_insert(self, table: str, columns: Sequence[str], rows: List[Tuple], connection=None, commit: bool = True) -> int:
+        """
+        Insert many rows with multi-row INSERT statements inside one transaction.
+        
+        Args:
+            table: Target table name (trusted, never user input)
+            columns: Target column names (trusted, never user input)
+            rows: Tuples of values in column order
+            connection: Optional existing connection to use instead of a pooled one
+            commit: Whether to commit afterwards; pass False inside transaction()
+            
+        Returns:
+            Number of inserted rows
+        """
+        if not rows:
+            return 0
+        if connection is None:
+            with self.transaction() as connection:
+                return self.execute_batch_insert(table, columns, rows, connection, commit=False)
+        
+        sql = pg_sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            pg_sql.Identifier(table), pg_sql.SQL(", ").join(map(pg_sql.Identifier, columns))
+        ).as_string(connection)
+        cursor = connection.cursor()
+        try:
+            started = time.perf_counter()
+            with tracing.span("db.execute", statement=metrics.statement_label(sql), rows=len(rows)):
+                execute_values(cursor, sql, rows, page_size=self.bulk_chunk_size)
+                if commit:
+                    connection.commit()
+            self.observe_query(sql, None, started, len(rows))
+            if commit:
+                self.note_write(connection)
+            return len(rows)
+        except psycopg2.Error as err:
+            metrics.record_query_error(sql, err)
+            logger.error("Executing batch insert failed!")
+            logger.error(f"SQL:   {sql}")
+            logger.error(f"Rows:  {len(rows)}")
+            logger.error(f"Error: {err}")
+            raise
+        finally:
+            cursor.close()
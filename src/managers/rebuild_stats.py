@@ -0,0 +1,45 @@
+"""
+Recompute the rollup tables behind GET /forms/stats from the stored forms.
+
+The triggers keep the rollups current, so this is only needed after changing how they are
+computed or after editing forms with the triggers disabled:
+
+    python -m src.managers.rebuild_stats
+"""
+from dotenv import load_dotenv
+import argparse
+import time
+import logging
+
+from src.managers.postgres_manager import StandalonePostgresSettings
+
+logger = logging.getLogger(__name__)
+
+REBUILD_STATS_SQL = "SELECT rebuild_form_stats()"
+
+
+def rebuild_stats(connection) -> None:
+    """Recompute both rollups in one transaction over a psycopg2 connection"""
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_STATS_SQL)
+    connection.commit()
+
+
+def main() -> None:
+    """Rebuild the rollups from the command line"""
+    parser = argparse.ArgumentParser(description="Recompute the /forms/stats rollup tables from scratch")
+    parser.parse_args()
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    settings = StandalonePostgresSettings()
+    connection = settings.create_connection()
+    try:
+        started = time.perf_counter()
+        rebuild_stats(connection)
+        logger.info(f"Rebuilt the form stats in {time.perf_counter() - started:.1f}s")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
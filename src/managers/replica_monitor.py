@@ -0,0 +1,150 @@
+import psycopg2
+from typing import List, Optional, Sequence, Tuple
+import threading
+import logging
+
+from src.config import get_env_float
+from src.consistency import parse_lsn
+
+logger = logging.getLogger(__name__)
+
+PROBE_SQL = "SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::text"
+
+
+class ReplicaMonitor:
+    """
+    Tracks which read replicas may serve reads, from a background thread.
+
+    Every interval it asks each replica whether it is still in recovery and how far it
+    has replayed the primary's WAL. Replicas that fail the check, were promoted, or are
+    reported as failed by the database managers are left out of read routing until a
+    later check succeeds.
+    """
+
+
+    def __init__(self, settings, hosts: Sequence[Tuple[str, int]]):
+        """
+        Initialize the monitor with all replicas considered down. Call start() to check them.
+
+        Args:
+            settings: Object carrying the credentials and database name, usually the database manager
+            hosts: Host and port of every replica
+        """
+        self.settings = settings
+        self.hosts = list(hosts)
+        self.interval = get_env_float("POSTGRES_REPLICA_CHECK_INTERVAL", 1.0)
+        self.healthy = [False] * len(self.hosts)
+        self.replay_lsn = [0] * len(self.hosts)
+        self._connections: List[Optional[object]] = [None] * len(self.hosts)
+        self._next = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+
+
+    def name(self, index: int) -> str:
+        """Label of a replica in logs and metrics"""
+        host, port = self.hosts[index]
+        return f"{host}:{port}"
+
+
+    def start(self) -> None:
+        """Check every replica once, then keep checking them in the background"""
+        self.check()
+        self._thread.start()
+        logger.info(f"ReplicaMonitor started for {len(self.hosts)} replicas, checking every {self.interval}s")
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as err:
+                logger.error(f"Checking the replicas failed: {err}")
+
+
+    def _connect(self, index: int):
+        host, port = self.hosts[index]
+        connection = psycopg2.connect(
+            user=self.settings.user,
+            password=self.settings.password,
+            host=host,
+            port=port,
+            database=self.settings.db_name,
+            connect_timeout=max(1, int(self.interval * 2)),
+        )
+        connection.autocommit = True
+        return connection
+
+
+    def check(self) -> None:
+        """Probe every replica and update which ones are usable"""
+        for index in range(len(self.hosts)):
+            try:
+                if self._connections[index] is None:
+                    self._connections[index] = self._connect(index)
+                with self._connections[index].cursor() as cursor:
+                    cursor.execute(PROBE_SQL)
+                    in_recovery, replay_lsn = cursor.fetchone()
+            except psycopg2.Error as err:
+                self._close(index)
+                self.mark_failed(index, str(err).strip())
+                continue
+            if not in_recovery or replay_lsn is None:
+                self.mark_failed(index, "not replicating from the primary")
+                continue
+            self.replay_lsn[index] = parse_lsn(replay_lsn)
+            if not self.healthy[index]:
+                logger.info(f"Routing reads to replica {self.name(index)}")
+                self.healthy[index] = True
+
+
+    def mark_failed(self, index: int, reason: str) -> None:
+        """Stop routing reads to a replica until it passes a check again"""
+        if self.healthy[index]:
+            logger.warning(f"Ejecting replica {self.name(index)} from read routing: {reason}")
+        self.healthy[index] = False
+
+
+    def pick(self, loads: Sequence[int], min_lsn: int = 0) -> Optional[int]:
+        """
+        Choose the replica for a read.
+
+        Args:
+            loads: Connections in use or waited for per replica
+            min_lsn: WAL position the replica must have replayed
+
+        Returns:
+            Index of the least loaded usable replica, ties going round-robin, or None to read from the primary
+        """
+        count = len(self.hosts)
+        start = self._next
+        self._next = (start + 1) % count
+        best = None
+        for offset in range(count):
+            index = (start + offset) % count
+            if not self.healthy[index] or self.replay_lsn[index] < min_lsn:
+                continue
+            if best is None or loads[index] < loads[best]:
+                best = index
+        return best
+
+
+    def _close(self, index: int) -> None:
+        connection = self._connections[index]
+        self._connections[index] = None
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+
+    def close(self) -> None:
+        """Stop the monitor thread and close its connections"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=10)
+        if not self._thread.is_alive():
+            for index in range(len(self.hosts)):
+                self._close(index)
+        logger.info("ReplicaMonitor stopped")
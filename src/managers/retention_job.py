@@ -0,0 +1,180 @@
+"""
+Retention job purging archived forms once they are older than their form type's retention period.
+
+Rows are deleted in small batches walked in (created_at, id) order, committed one at a
+time with a pause in between, so locks are short and WAL is written at a steady rate.
+The job runs on an interval from the service's lifespan, or once from the command line:
+
+    python -m src.managers.retention_job
+"""
+from dotenv import load_dotenv
+from datetime import datetime
+from uuid import UUID
+import argparse
+import threading
+import time
+import logging
+from typing import Dict
+
+from src.config import get_env_float, get_env_int
+from src.managers.postgres_manager import PostgresSettings, StandalonePostgresSettings
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+FORM_TYPES = ("cancellation", "feedback")
+# Arbitrary application-wide key for pg_try_advisory_lock, next to the migration and maintenance locks
+RETENTION_LOCK_ID = 7_236_284_995
+
+TRY_LOCK_SQL = "SELECT pg_try_advisory_lock(%s)"
+UNLOCK_SQL = "SELECT pg_advisory_unlock(%s)"
+# Deletes the next batch of expired archived forms after a (created_at, id) position. The cutoff
+# comes from the database clock, which also fills in created_at, like PURGE_IDEMPOTENCY_KEYS_SQL.
+# Built once per form table and archive table, so only those constant names reach the SQL text.
+PURGE_BATCH_SQL = {source: f"""
+    WITH batch AS (
+        SELECT id, created_at FROM {source}
+        WHERE is_archived AND created_at < CURRENT_TIMESTAMP - make_interval(days => %s) AND (created_at, id) > (%s, %s)
+        ORDER BY created_at, id
+        LIMIT %s
+    )
+    DELETE FROM {source} AS f
+    USING batch
+    WHERE f.id = batch.id AND f.created_at = batch.created_at
+    RETURNING f.created_at, f.id
+""" for form_type in FORM_TYPES for source in (f"{form_type}_archive", form_type)}  # nosec B608
+
+
+class RetentionJob:
+    """
+    Deletes archived forms past their retention period from the archive and hot tables.
+
+    Retention is set per form type with RETENTION_<FORM_TYPE>_DAYS; 0 keeps the forms
+    forever. An advisory lock makes sure only one process purges at a time.
+    """
+
+
+    def __init__(self, settings: PostgresSettings):
+        """
+        Initialize the job with environment variables. Call start() to run it on an interval.
+
+        Args:
+            settings: Object carrying the connection settings, usually the database manager
+        """
+        self.settings = settings
+        self.retention_days = {form_type: get_env_int(f"RETENTION_{form_type.upper()}_DAYS", 0) for form_type in FORM_TYPES}
+        self.interval = get_env_float("RETENTION_INTERVAL", 3600.0)
+        self.batch_size = get_env_int("RETENTION_BATCH_SIZE", 1000)
+        self.batch_pause = get_env_float("RETENTION_BATCH_PAUSE_MS", 100.0) / 1000
+        self.last_success = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention-job", daemon=True)
+
+
+    def enabled(self) -> bool:
+        """Whether any form type has a retention period"""
+        return any(days > 0 for days in self.retention_days.values())
+
+
+    def start(self) -> None:
+        """Start the job thread, which runs once right away and then every interval"""
+        if self.interval <= 0 or not self.enabled():
+            logger.info("Retention job disabled, no RETENTION_<FORM_TYPE>_DAYS set or 'RETENTION_INTERVAL' is 0")
+            return
+        metrics.RETENTION_LAST_SUCCESS.set_function("retention_job", lambda: {(): self.last_success})
+        self._thread.start()
+        logger.info(f"RetentionJob started, running every {self.interval}s with retention {self.retention_days}")
+
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as err:
+                logger.error(f"Retention job failed: {err}")
+            self._stop.wait(self.interval)
+
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Purge every form type with a retention period once.
+
+        Returns:
+            Deleted forms by form type, empty if another process holds the lock
+        """
+        purged = {}
+        connection = self.settings.create_connection()
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(TRY_LOCK_SQL, (RETENTION_LOCK_ID,))
+                if not cursor.fetchone()[0]:
+                    logger.info("Retention job is running elsewhere, skipping this pass")
+                    return purged
+                try:
+                    for form_type, days in self.retention_days.items():
+                        if days <= 0:
+                            continue
+                        # The archive table holds most expired forms; the hot table those not moved there yet
+                        purged[form_type] = sum(
+                            self.purge(cursor, form_type, source, days)
+                            for source in (f"{form_type}_archive", form_type)
+                        )
+                        logger.info(f"Purged {purged[form_type]} archived {form_type} forms older than {days} days")
+                    if not self._stop.is_set():
+                        self.last_success = time.time()
+                finally:
+                    cursor.execute(UNLOCK_SQL, (RETENTION_LOCK_ID,))
+        finally:
+            connection.close()
+        return purged
+
+
+    def purge(self, cursor, form_type: str, source: str, days: int) -> int:
+        """Delete the expired archived forms of one table batch by batch, pausing between batches"""
+        tier = "archive" if source.endswith("_archive") else "hot"
+        position = (datetime.min, UUID(int=0))
+        total = 0
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            cursor.execute(PURGE_BATCH_SQL[source], (days, *position, self.batch_size))
+            rows = cursor.fetchall()
+            metrics.RETENTION_BATCH_LATENCY.observe(time.perf_counter() - started, form_type)
+            if not rows:
+                break
+            metrics.RETENTION_PURGED.inc(form_type, tier, amount=len(rows))
+            total += len(rows)
+            position = max(rows)
+            if len(rows) < self.batch_size:
+                break
+            logger.debug(f"Purged {total} forms from {source} so far")
+            self._stop.wait(self.batch_pause)
+        return total
+
+
+    def close(self) -> None:
+        """Stop the job thread after the current batch"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=10)
+            if self._thread.is_alive():
+                logger.warning("RetentionJob is still finishing a statement, not waiting for it")
+        metrics.RETENTION_LAST_SUCCESS.remove_function("retention_job")
+        logger.info("RetentionJob stopped")
+
+
+def main() -> None:
+    """Run one retention pass from the command line"""
+    parser = argparse.ArgumentParser(description="Delete archived forms older than their retention period")
+    parser.parse_args()
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    job = RetentionJob(StandalonePostgresSettings())
+    if not job.enabled():
+        logger.warning("No RETENTION_<FORM_TYPE>_DAYS set, nothing to purge")
+        return
+    job.run_once()
+
+
+if __name__ == "__main__":
+    main()
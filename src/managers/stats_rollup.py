@@ -0,0 +1,88 @@
+import psycopg2
+import threading
+import logging
+
+from src.config import get_env_float
+from src.managers.postgres_manager import PostgresSettings
+
+logger = logging.getLogger(__name__)
+
+FOLD_STATS_SQL = "SELECT fold_form_stats()"
+
+
+class StatsRollup:
+    """
+    Folds the deltas appended by the stats triggers into the /forms/stats rollups from a background thread.
+
+    The triggers only append to the delta tables (migration 0009), so submissions never wait
+    on the rollup rows. Stats reads add the deltas not folded yet, so folding only keeps those
+    reads cheap; it is safe to run in every process at once.
+    """
+
+
+    def __init__(self, settings: PostgresSettings):
+        """
+        Initialize the job with environment variables. Call start() to run it.
+
+        Args:
+            settings: Object carrying the connection settings, usually the database manager
+        """
+        self.settings = settings
+        self.interval = get_env_float("FORM_STATS_FOLD_INTERVAL", 5.0)
+        self._connection = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-rollup", daemon=True)
+
+
+    def start(self) -> None:
+        """Start the rollup thread, which folds every interval"""
+        if self.interval <= 0:
+            logger.info("Stats rollup disabled since 'FORM_STATS_FOLD_INTERVAL' is 0")
+            return
+        self._thread.start()
+        logger.info(f"StatsRollup started, folding every {self.interval}s")
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as err:
+                logger.error(f"Folding form stats failed: {err}")
+                self._close_connection()
+
+
+    def run_once(self) -> int:
+        """
+        Fold the committed deltas into the rollups.
+
+        Returns:
+            Number of deltas folded
+        """
+        if self._connection is None or self._connection.closed:
+            self._connection = self.settings.create_connection()
+            self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(FOLD_STATS_SQL)
+            folded = cursor.fetchone()[0]
+        logger.debug(f"Folded {folded} form stats deltas")
+        return folded
+
+
+    def _close_connection(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+
+    def close(self) -> None:
+        """Stop the rollup thread; deltas left over are folded by the next process"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=10)
+        if not self._thread.is_alive():
+            self._close_connection()
+        logger.info("StatsRollup stopped")
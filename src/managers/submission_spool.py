@@ -0,0 +1,505 @@
+"""
+Durable local spool for form submissions made while the primary database is unavailable.
+
+While the circuit breaker is open, validated submissions are appended to a segment file in
+SUBMISSION_SPOOL_DIR and answered with 202 Accepted once they are on disk. Submissions
+arriving together share one write and one fsync. A replayer thread drains the segments,
+oldest first and in the order they were written, with multi-row inserts as soon as the
+database accepts connections again.
+
+Every spooled form carries the ID and creation time it was accepted with, and the replayer
+inserts with ON CONFLICT DO NOTHING, so a segment replayed again after a crash creates no
+duplicates. Submissions with an Idempotency-Key also carry the key, which the replayer claims
+in the statement inserting the form, so retries spooled meanwhile create the form only once. Each process appends to its own segment and holds an flock on it; segments left
+behind by a stopped process are replayed by whichever process locks them first.
+"""
+import psycopg2
+from psycopg2.extras import execute_values
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from uuid import uuid4
+import fcntl
+import os
+import queue
+import re
+import threading
+import time
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import orjson
+
+from src.config import get_env_float, get_env_int, get_env_str
+from src.idempotency import StoredResponse, idempotency_key_ttl
+from src.managers.postgres_manager import PostgresSettings
+from src.managers.write_coalescer import ROW_LEVEL_ERRORS
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+SEGMENT_SUFFIX = ".spool"
+# Spooled submissions the database refused, kept for an operator to look at
+REJECTED_FILE = "rejected.ndjson"
+FORM_TABLES = ("cancellation", "feedback")
+# Table and column names are read back from the segment files, so parse_record checks them against
+# FORM_TABLES and IDENTIFIER before the replay statements put them into SQL
+IDENTIFIER = re.compile(r"^[a-z_]+$")
+
+
+class SpoolFullError(Exception):
+    """Raised when the spool already holds SUBMISSION_SPOOL_MAX_BYTES of submissions not yet replayed"""
+
+
+def replay_insert_sql(table: str, columns: Sequence[str]) -> Tuple[str, str]:
+    """The INSERT replaying spooled rows and its VALUES template; creation times are spooled in UTC"""
+    template = "(" + ", ".join("%s::timestamptz" if column == "created_at" else "%s" for column in columns) + ")"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT (id, created_at) DO NOTHING", template  # nosec B608
+
+
+def replay_idempotent_insert_sql(table: str, columns: Sequence[str]) -> str:
+    """
+    The INSERT replaying a spooled row with an Idempotency-Key, claiming the key like IDEMPOTENT_INSERT_SQL.
+
+    The form is only inserted if the key was free or expired, so neither a second spooled
+    retry nor a retry that reached the database after the outage creates it again. The creation
+    time is passed on its own and cast like in replay_insert_sql; the other values are passed as
+    one JSON object, which json_populate_record converts to the column types.
+    """
+    column_list = ", ".join(columns)
+    values = ", ".join("%s::timestamptz" if column == "created_at" else f"r.{column}" for column in columns)
+    return f"""
+        WITH claimed AS (
+            INSERT INTO idempotency_keys AS k (form_type, key, request_hash, status_code, response)
+            VALUES ('{table}', %s, %s, %s, %s)
+            ON CONFLICT (form_type, key) DO UPDATE
+                SET request_hash = EXCLUDED.request_hash, status_code = EXCLUDED.status_code,
+                    response = EXCLUDED.response, created_at = EXCLUDED.created_at
+                WHERE k.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING key
+        )
+        INSERT INTO {table} ({column_list})
+        SELECT {values} FROM json_populate_record(NULL::{table}, %s) AS r
+        WHERE EXISTS (SELECT 1 FROM claimed)
+        ON CONFLICT (id, created_at) DO NOTHING
+    """  # nosec B608
+
+
+def parse_record(line: bytes) -> Tuple[str, Tuple[str, ...], list, Optional[Tuple[str, StoredResponse]]]:
+    """Decode and check one spooled submission, with its Idempotency-Key and stored response if it had one"""
+    record = orjson.loads(line)
+    table, columns, row = record["table"], tuple(record["columns"]), record["row"]
+    if table not in FORM_TABLES or not all(IDENTIFIER.match(column) for column in columns):
+        raise ValueError(f"unexpected target {table} {columns}")
+    if columns[:2] != ("id", "created_at") or len(row) != len(columns):
+        raise ValueError("row does not match its columns")
+    idempotency = None
+    if "idempotency" in record:
+        key, form_hash, status_code, body = record["idempotency"]
+        idempotency = (key, StoredResponse(bytes.fromhex(form_hash), int(status_code), body.encode()))
+    return table, columns, row, idempotency
+
+
+class SubmissionSpool:
+    """
+    Append-only, fsync-batched spool of submissions and the thread replaying it.
+
+    append() may be called from any thread and returns a future that completes once
+    the submission is durable, so the async routes can await it without blocking.
+    """
+
+
+    def __init__(self, settings: PostgresSettings, directory: str):
+        """
+        Initialize the spool with environment variables. Call start() to run the writer and replayer.
+
+        Args:
+            settings: Object carrying the connection settings, usually the database manager
+            directory: Directory holding the segment files, on a volume that survives restarts
+        """
+        self.settings = settings
+        self.directory = directory
+        self.max_bytes = get_env_int("SUBMISSION_SPOOL_MAX_BYTES", 1024 * 1024 * 1024)
+        self.replay_interval = get_env_float("SUBMISSION_SPOOL_REPLAY_INTERVAL", 1.0)
+        self.replay_batch_size = get_env_int("SUBMISSION_SPOOL_REPLAY_BATCH_SIZE", 500)
+        self.idempotency_key_ttl = idempotency_key_ttl()
+        os.makedirs(directory, exist_ok=True)
+        self.pending_bytes = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+        self._bytes_lock = threading.Lock()
+        # Guards the active segment, which the writer appends to while the replayer drains it
+        self._segment_lock = threading.Lock()
+        self._active_path: Optional[str] = None
+        self._active_fd: Optional[int] = None
+        self._synced = 0
+        self._replayed = 0
+        self._connection = None
+        self._queue: queue.Queue = queue.Queue()
+        # Taken to check _closed and enqueue together, so nothing is queued behind the writer's _STOP
+        self._queue_lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="spool-writer", daemon=True)
+        self._replayer = threading.Thread(target=self._replay_loop, name="spool-replayer", daemon=True)
+
+
+    def start(self) -> None:
+        """Start the writer and the replayer thread, which also picks up segments left by earlier processes"""
+        self._writer.start()
+        self._replayer.start()
+        metrics.SPOOL_PENDING_BYTES.set_function("submission_spool", lambda: {(): self.pending_bytes})
+        logger.info(f"SubmissionSpool started in '{self.directory}' with {self.pending_bytes} bytes pending")
+
+
+    def append(self, table: str, columns: Sequence[str], row: Tuple, idempotency: Optional[Tuple[str, StoredResponse]] = None) -> Future:
+        """
+        Queue a submission for the spool under a new ID and the current time.
+
+        Args:
+            table: Form table to insert into
+            columns: Columns of row
+            row: Values of the submission
+            idempotency: Idempotency-Key of the submission and the response to store for it
+
+        Returns:
+            Future completing once the submission is fsynced, or failing if it could not be written
+        """
+        if self._closed:
+            raise RuntimeError("Submission spool is closed")
+        record = {
+            "table": table,
+            "columns": ("id", "created_at", *columns),
+            "row": (uuid4(), datetime.now(timezone.utc), *row),
+        }
+        if idempotency is not None:
+            key, stored = idempotency
+            record["idempotency"] = (key, stored.request_hash.hex(), stored.status_code, stored.body.decode())
+        record = orjson.dumps(record) + b"\n"
+        with self._bytes_lock:
+            if self.pending_bytes + len(record) > self.max_bytes:
+                raise SpoolFullError(f"Submission spool is full ({self.pending_bytes} bytes pending)")
+            self.pending_bytes += len(record)
+        future: Future = Future()
+        with self._queue_lock:
+            if self._closed:
+                self._release(len(record))
+                raise RuntimeError("Submission spool is closed")
+            self._queue.put((table, record, future))
+        return future
+
+
+    def _release(self, size: int) -> None:
+        with self._bytes_lock:
+            self.pending_bytes = max(0, self.pending_bytes - size)
+
+
+    def _write_loop(self) -> None:
+        """Write whatever queued up during the previous fsync in one go"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+
+
+    def _open_segment(self) -> None:
+        """Start a new segment, locked before it becomes visible to other processes' replayers"""
+        name = f"{time.time_ns():020d}-{os.getpid()}"
+        temporary = os.path.join(self.directory, f".{name}.tmp")
+        path = os.path.join(self.directory, name + SEGMENT_SUFFIX)
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.rename(temporary, path)
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+        self._active_path, self._active_fd, self._synced, self._replayed = path, fd, 0, 0
+
+
+    def _close_segment(self) -> None:
+        """Stop appending to the active segment; unless it was deleted, it is replayed like a leftover one"""
+        if self._active_fd is not None:
+            os.close(self._active_fd)
+        self._active_path, self._active_fd, self._synced, self._replayed = None, None, 0, 0
+
+
+    def _discard_unsynced(self) -> None:
+        """
+        Cut a failed write off the active segment, so only submissions reported as durable are replayed.
+
+        The segment stays active, as its replayed and synced offsets are still right. If it cannot be
+        cut, later writes go to a fresh segment and this one is replayed from the start like a leftover.
+        """
+        try:
+            os.ftruncate(self._active_fd, self._synced)
+            os.fsync(self._active_fd)
+            return
+        except OSError as err:
+            logger.error(f"Could not cut a failed write off spool segment {os.path.basename(self._active_path)}, "
+                         f"submissions reported as failed may still be replayed: {err}")
+        # Replaying it as a leftover releases its full size, of which the replayed part and the failed write were released already
+        try:
+            unsynced = os.fstat(self._active_fd).st_size - self._synced
+        except OSError:
+            unsynced = 0
+        with self._bytes_lock:
+            self.pending_bytes += self._replayed + max(0, unsynced)
+        self._close_segment()
+
+
+    def _write(self, batch: List[Tuple]) -> None:
+        data = b"".join(record for _, record, _ in batch)
+        try:
+            with self._segment_lock:
+                if self._active_fd is None:
+                    self._open_segment()
+                try:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(self._active_fd, view):]
+                    os.fsync(self._active_fd)
+                except OSError:
+                    self._discard_unsynced()
+                    raise
+                self._synced += len(data)
+        except OSError as err:
+            logger.error(f"Writing {len(batch)} submissions to the spool failed: {err}")
+            self._release(len(data))
+            for _, _, future in batch:
+                future.set_exception(err)
+            return
+        for table, _, future in batch:
+            metrics.SUBMISSIONS_SPOOLED.inc(table)
+            future.set_result(None)
+
+
+    def _replay_loop(self) -> None:
+        while not self._stop.wait(self.replay_interval):
+            try:
+                self.replay()
+            except psycopg2.Error as err:
+                logger.warning(f"Replaying spooled submissions failed, retrying in {self.replay_interval}s: {str(err).strip()}")
+                self._disconnect()
+            except OSError as err:
+                logger.error(f"Reading the submission spool failed: {err}")
+
+
+    def replay(self) -> int:
+        """
+        Replay the own segment and every leftover segment no other process holds, oldest first.
+
+        Returns:
+            Number of submissions replayed
+        """
+        replayed = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            if path == self._active_path:
+                replayed += self._replay_active(path)
+            else:
+                replayed += self._replay_leftover(path)
+        return replayed
+
+
+    def _replay_active(self, path: str) -> int:
+        """Replay what was synced to the own segment since the last pass, and delete the segment once drained"""
+        with self._segment_lock:
+            start, end = self._replayed, self._synced
+        count = 0
+        if end > start:
+            with open(path, "rb") as segment:
+                segment.seek(start)
+                count = self._replay_records(path, segment.read(end - start))
+        with self._segment_lock:
+            self._replayed = end
+            if self._active_path == path and self._synced == end:
+                os.unlink(path)
+                self._close_segment()
+        self._release(end - start)
+        return count
+
+
+    def _replay_leftover(self, path: str) -> int:
+        """Replay and delete a segment of a process that stopped, unless a running process still holds it"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            # Another replayer may have finished and deleted it while this one waited for the lock
+            try:
+                if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                    return 0
+            except FileNotFoundError:
+                return 0
+            with os.fdopen(os.dup(fd), "rb") as segment:
+                data = segment.read()
+            count = self._replay_records(path, data)
+            os.unlink(path)
+            self._release(len(data))
+            logger.info(f"Replayed {count} submissions from spool segment {os.path.basename(path)}")
+            return count
+        finally:
+            os.close(fd)
+
+
+    def _replay_records(self, path: str, data: bytes) -> int:
+        """Insert the submissions in a piece of a segment, batching consecutive ones for the same table"""
+        lines = data.split(b"\n")
+        if lines[-1]:
+            logger.warning(f"Ignoring an incomplete last submission in spool segment {os.path.basename(path)}")
+        count = 0
+        batch: List[Tuple[list, bytes]] = []
+        target = None
+        for line in lines[:-1]:
+            try:
+                table, columns, row, idempotency = parse_record(line)
+            except (ValueError, KeyError, TypeError) as err:
+                self._reject(line, "unknown", err)
+                continue
+            if batch and (idempotency is not None or (table, columns) != target or len(batch) >= self.replay_batch_size):
+                count += self._insert(*target, batch)
+                batch = []
+            if idempotency is not None:
+                count += self._insert_idempotently(table, columns, row, idempotency, line)
+                continue
+            target = (table, columns)
+            batch.append((row, line))
+        if batch:
+            count += self._insert(*target, batch)
+        return count
+
+
+    def _connect(self):
+        if self._connection is None or self._connection.closed:
+            self._connection = self.settings.create_connection()
+        return self._connection
+
+
+    def _disconnect(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+
+    def _insert(self, table: str, columns: Sequence[str], batch: List[Tuple[list, bytes]]) -> int:
+        """Insert a batch in one transaction, falling back to row by row inserts if a row is refused"""
+        sql, template = replay_insert_sql(table, columns)
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                execute_values(cursor, sql, [row for row, _ in batch], template=template, page_size=len(batch))
+                inserted = cursor.rowcount
+            connection.commit()
+        except ROW_LEVEL_ERRORS as err:
+            connection.rollback()
+            logger.warning(f"Replaying {len(batch)} spooled {table} forms failed, retrying one by one: {err}")
+            inserted = 0
+            for row, line in batch:
+                try:
+                    with connection.cursor() as cursor:
+                        execute_values(cursor, sql, [row], template=template)
+                        inserted += cursor.rowcount
+                    connection.commit()
+                except ROW_LEVEL_ERRORS as row_error:
+                    connection.rollback()
+                    self._reject(line, table, row_error)
+        metrics.SPOOL_REPLAYED.inc(table, "inserted", amount=inserted)
+        metrics.SPOOL_REPLAYED.inc(table, "duplicate", amount=len(batch) - inserted)
+        return inserted
+
+
+    def _insert_idempotently(self, table: str, columns: Sequence[str], row: list, idempotency: Tuple[str, StoredResponse], line: bytes) -> int:
+        """Insert one submission with an Idempotency-Key, unless the key was claimed meanwhile"""
+        key, stored = idempotency
+        values = dict(zip(columns, row))
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    replay_idempotent_insert_sql(table, columns),
+                    (
+                        key, stored.request_hash, stored.status_code, stored.body, self.idempotency_key_ttl,
+                        values["created_at"], orjson.dumps(values).decode()
+                    )
+                )
+                inserted = cursor.rowcount
+            connection.commit()
+        except ROW_LEVEL_ERRORS as err:
+            connection.rollback()
+            self._reject(line, table, err)
+            return 0
+        metrics.SPOOL_REPLAYED.inc(table, "inserted" if inserted else "duplicate")
+        return inserted
+
+
+    def _reject(self, line: bytes, table: str, error: Exception) -> None:
+        """Set a submission the database refused aside in the rejected file instead of retrying it forever"""
+        logger.error(f"Spooled {table} submission refused, keeping it in {REJECTED_FILE}: {str(error).strip()}")
+        metrics.SPOOL_REPLAYED.inc(table, "rejected")
+        with open(os.path.join(self.directory, REJECTED_FILE), "ab") as rejected:
+            rejected.write(line + b"\n")
+            rejected.flush()
+            os.fsync(rejected.fileno())
+
+
+    def close(self) -> None:
+        """Write out queued submissions and stop both threads; unreplayed ones stay on disk for the next process"""
+        with self._queue_lock:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._writer.join()
+        self._stop.set()
+        if self._replayer.is_alive():
+            self._replayer.join()
+        with self._segment_lock:
+            if self._active_path is not None and self._synced == self._replayed:
+                os.unlink(self._active_path)
+            self._close_segment()
+        self._disconnect()
+        metrics.SPOOL_PENDING_BYTES.remove_function("submission_spool")
+        logger.info(f"SubmissionSpool stopped with {self.pending_bytes} bytes pending")
+
+
+def create_submission_spool(settings: PostgresSettings) -> Optional[SubmissionSpool]:
+    """Create the submission spool from environment variables, or None if SUBMISSION_SPOOL_DIR is not set"""
+    directory = get_env_str("SUBMISSION_SPOOL_DIR", "")
+    if not directory:
+        logger.info("Submission spool disabled, 'SUBMISSION_SPOOL_DIR' not set")
+        return None
+    return SubmissionSpool(settings, directory)
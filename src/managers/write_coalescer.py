@@ -0,0 +1,307 @@
+import psycopg
+import psycopg2
+import asyncio
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Dict, List, Sequence, Tuple
+
+from src.config import get_env_bool, get_env_float, get_env_int
+from src import consistency, metrics
+from src.managers.postgres_manager import PostgresManager
+from src.managers.async_postgres_manager import AsyncPostgresManager
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Errors caused by individual rows; anything else (e.g. the database being down) fails the whole batch
+ROW_LEVEL_ERRORS = (psycopg2.IntegrityError, psycopg2.DataError, psycopg.IntegrityError, psycopg.DataError)
+
+
+class QueueFullError(Exception):
+    """Raised when the write queue stays full for longer than the enqueue timeout"""
+
+
+class CoalescerSettings:
+    """Settings shared by the sync and async write coalescers"""
+
+
+    def load_settings(self):
+        """Read the write coalescing settings from environment variables"""
+        self.flush_interval = get_env_float("WRITE_COALESCING_FLUSH_INTERVAL_MS", 5.0) / 1000
+        self.max_batch_size = get_env_int("WRITE_COALESCING_MAX_BATCH_SIZE", 500)
+        self.max_queue_size = get_env_int("WRITE_COALESCING_MAX_QUEUE_SIZE", 10000)
+        self.enqueue_timeout = get_env_float("WRITE_COALESCING_ENQUEUE_TIMEOUT", 1.0)
+
+
+def write_coalescing_enabled() -> bool:
+    """Whether single-form submissions should be group-committed"""
+    return get_env_bool("WRITE_COALESCING_ENABLED", False)
+
+
+def group_by_target(items: List[Tuple]) -> Dict[Tuple[str, Sequence[str]], List[Tuple]]:
+    """Group queued (table, columns, row, future) items by their target table and columns"""
+    groups: Dict[Tuple[str, Sequence[str]], List[Tuple]] = {}
+    for table, columns, row, future in items:
+        groups.setdefault((table, columns), []).append((row, future))
+    return groups
+
+
+class WriteCoalescer(CoalescerSettings):
+    """
+    Group-commits concurrent single-row inserts.
+
+    Request threads enqueue rows and block until a background flusher has written
+    them as part of one multi-row INSERT and one commit.
+    """
+
+
+    def __init__(self, pg_manager: PostgresManager):
+        """Initialize the coalescer with environment variables and start the flusher thread"""
+        self.load_settings()
+        self.pg_manager = pg_manager
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue_size)
+        self._closed = False
+        # Set once the flusher has exited; rows queued after that are failed instead of waited on
+        self._finished = False
+        self._leftover_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+        metrics.WRITE_QUEUE_DEPTH.set_function("write_coalescer", lambda: {(): self._queue.qsize()})
+        logger.info("WriteCoalescer started")
+
+
+    def submit(self, table: str, columns: Sequence[str], row: Tuple) -> None:
+        """Queue a row for insertion and wait until the batch containing it is committed"""
+        if self._closed:
+            raise RuntimeError("Write coalescer is closed")
+        future: Future = Future()
+        try:
+            self._queue.put((table, columns, row, future), timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise QueueFullError(f"Write queue is full ({self.max_queue_size} pending rows)")
+        # The coalescer may have been closed between the check above and the put
+        self._fail_leftovers()
+        future.result()
+        # The flusher has no request context; its commit is at or before the manager's last seen write
+        consistency.record_write(self.pg_manager.last_write_lsn)
+
+
+    def _run(self) -> None:
+        """Collect rows until the batch is full or the flush interval elapsed, then flush them"""
+        stopping = False
+        # close() may not get _STOP into a full queue, so the flag is checked between batches too
+        while not stopping and not self._closed:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        self._drain()
+
+
+    def _fail_leftovers(self) -> None:
+        """Fail the rows still queued once the flusher has exited, as nothing will write them anymore"""
+        with self._leftover_lock:
+            if not self._finished:
+                return
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    item[3].set_exception(RuntimeError("Write coalescer is closed"))
+
+
+    def _drain(self) -> None:
+        """Flush whatever is still queued after a stop was requested"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._flush(batch)
+
+
+    def _flush(self, batch: List[Tuple]) -> None:
+        """Write a batch in one transaction, falling back to row-by-row inserts if it fails"""
+        groups = group_by_target(batch)
+        try:
+            with self.pg_manager.transaction() as connection:
+                for (table, columns), entries in groups.items():
+                    self.pg_manager.execute_batch_insert(table, columns, [row for row, _ in entries], connection=connection, commit=False)
+        except ROW_LEVEL_ERRORS as e:
+            logger.warning(f"Group commit of {len(batch)} rows failed, retrying row by row: {e}")
+            for (table, columns), entries in groups.items():
+                for row, future in entries:
+                    try:
+                        self.pg_manager.execute_batch_insert(table, columns, [row])
+                        future.set_result(None)
+                    except Exception as row_error:
+                        future.set_exception(row_error)
+            return
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} rows failed: {e}")
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        for entries in groups.values():
+            for _, future in entries:
+                future.set_result(None)
+
+
+    def close(self) -> None:
+        """Stop accepting work, flush the queue and wait for the flusher to finish"""
+        self._closed = True
+        try:
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+        self._thread.join()
+        with self._leftover_lock:
+            self._finished = True
+        self._fail_leftovers()
+        metrics.WRITE_QUEUE_DEPTH.remove_function("write_coalescer")
+        logger.info("WriteCoalescer drained")
+
+
+class AsyncWriteCoalescer(CoalescerSettings):
+    """Asyncio counterpart of WriteCoalescer that writes batches with COPY through AsyncPostgresManager"""
+
+
+    def __init__(self, pg_manager: AsyncPostgresManager):
+        """Initialize the coalescer with environment variables. Call start() from the event loop."""
+        self.load_settings()
+        self.pg_manager = pg_manager
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._closed = False
+        self._finished = False
+        self._task = None
+
+
+    def start(self) -> None:
+        """Start the flusher task on the running event loop"""
+        self._task = asyncio.create_task(self._run())
+        metrics.WRITE_QUEUE_DEPTH.set_function("write_coalescer", lambda: {(): self._queue.qsize()})
+        logger.info("AsyncWriteCoalescer started")
+
+
+    async def submit(self, table: str, columns: Sequence[str], row: Tuple) -> None:
+        """Queue a row for insertion and wait until the batch containing it is committed"""
+        if self._closed:
+            raise RuntimeError("Write coalescer is closed")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((table, columns, row, future)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise QueueFullError(f"Write queue is full ({self.max_queue_size} pending rows)")
+        # The coalescer may have been closed while the put waited for room in the queue
+        self._fail_leftovers()
+        await future
+        consistency.record_write(self.pg_manager.last_write_lsn)
+
+
+    async def _run(self) -> None:
+        """Collect rows until the batch is full or the flush interval elapsed, then flush them"""
+        stopping = False
+        while not stopping and not self._closed:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining) if remaining > 0 else self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            await self._flush(batch)
+
+
+    def _fail_leftovers(self) -> None:
+        """Fail the rows still queued once the flusher has exited, as nothing will write them anymore"""
+        if not self._finished:
+            return
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP and not item[3].done():
+                item[3].set_exception(RuntimeError("Write coalescer is closed"))
+
+
+    async def _flush(self, batch: List[Tuple]) -> None:
+        """Write a batch in one transaction, falling back to row-by-row inserts if it fails"""
+        groups = group_by_target(batch)
+        try:
+            async with self.pg_manager.transaction() as connection:
+                for (table, columns), entries in groups.items():
+                    await self.pg_manager.execute_batch_insert(table, columns, [row for row, _ in entries], connection=connection, commit=False)
+        except ROW_LEVEL_ERRORS as e:
+            logger.warning(f"Group commit of {len(batch)} rows failed, retrying row by row: {e}")
+            for (table, columns), entries in groups.items():
+                for row, future in entries:
+                    try:
+                        await self.pg_manager.execute_batch_insert(table, columns, [row])
+                        if not future.done():
+                            future.set_result(None)
+                    except Exception as row_error:
+                        if not future.done():
+                            future.set_exception(row_error)
+            return
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} rows failed: {e}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for entries in groups.values():
+            for _, future in entries:
+                if not future.done():
+                    future.set_result(None)
+
+
+    async def close(self) -> None:
+        """Stop accepting work, flush the queue and wait for the flusher to finish"""
+        if self._task is None:
+            return
+        self._closed = True
+        try:
+            self._queue.put_nowait(_STOP)
+        except asyncio.QueueFull:
+            pass
+        await self._task
+        self._finished = True
+        self._fail_leftovers()
+        metrics.WRITE_QUEUE_DEPTH.remove_function("write_coalescer")
+        logger.info("AsyncWriteCoalescer drained")
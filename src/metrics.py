@@ -0,0 +1,301 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are sharded per thread: every thread only ever writes its
+own shard, so recording takes no lock, and a scrape sums the shards up. Gauges
+are read from callbacks at scrape time and cost nothing on the hot path.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import re
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a label set like {route="/x",method="GET"}"""
+    pairs = [(name, value) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, keeping integers free of a trailing .0"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Sharded:
+    """Base for metrics whose samples are written to per-thread shards"""
+
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+        self._shards_lock = threading.Lock()
+
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        """Return the calling thread's shard, registering it on first use"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[Tuple[str, ...], list] = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        """Sum all shards into one sample list per label set"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in shards:
+            for labels, samples in list(shard.items()):
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(samples)
+                else:
+                    for i, value in enumerate(samples):
+                        total[i] += value
+        return totals
+
+
+class Counter(_Sharded):
+    """Monotonically increasing count"""
+
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add amount to the counter with the given label values"""
+        shard = self._shard()
+        samples = shard.get(labels)
+        if samples is None:
+            shard[labels] = [amount]
+        else:
+            samples[0] += amount
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, samples in sorted(self._snapshot().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(samples[0])}")
+        return lines
+
+
+class Histogram(_Sharded):
+    """Distribution of observed values over fixed buckets"""
+
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one value for the given label values"""
+        shard = self._shard()
+        samples = shard.get(labels)
+        if samples is None:
+            # Per-bucket counts (the last one is +Inf), then sum and count
+            samples = shard[labels] = [0] * (len(self.buckets) + 3)
+        samples[bisect_left(self.buckets, value)] += 1
+        samples[-2] += value
+        samples[-1] += 1
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, samples in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), samples):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', le))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(samples[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(samples[-1])}")
+        return lines
+
+
+class Gauge:
+    """Current values read from registered callbacks at scrape time"""
+
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._sources: Dict[str, Callable[[], Dict[Tuple[str, ...], float]]] = {}
+
+
+    def set_function(self, source: str, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """Register (or replace) a callback returning values by label values, e.g. one per pool"""
+        self._sources[source] = function
+
+
+    def remove_function(self, source: str) -> None:
+        """Stop reporting the values of a callback"""
+        self._sources.pop(source, None)
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for function in list(self._sources.values()):
+            for labels, value in sorted(function().items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together by the /metrics endpoint"""
+
+
+    def __init__(self):
+        self._metrics: List = []
+
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "forms_http_request_duration_seconds", "HTTP request latency by route template, method and status code.",
+    ("route", "method", "status"),
+))
+QUERY_LATENCY = REGISTRY.register(Histogram(
+    "forms_db_query_duration_seconds", "Database statement latency by statement.", ("statement",),
+))
+QUERY_ROWS = REGISTRY.register(Histogram(
+    "forms_db_query_rows", "Rows returned or affected per database statement.", ("statement",), buckets=ROW_BUCKETS,
+))
+QUERY_ERRORS = REGISTRY.register(Counter(
+    "forms_db_errors_total", "Failed database statements by statement and SQLSTATE.", ("statement", "sqlstate"),
+))
+CONNECTION_ACQUIRE_LATENCY = REGISTRY.register(Histogram(
+    "forms_db_connection_acquire_seconds", "Time spent waiting for a pooled database connection.", ("pool",),
+))
+POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "forms_db_pool_connections", "Connections per pool by state.", ("pool", "state"),
+))
+WRITE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "forms_write_queue_depth", "Submissions waiting in the write coalescing queue.",
+))
+RETENTION_PURGED = REGISTRY.register(Counter(
+    "forms_retention_purged_total", "Archived forms deleted by the retention job by form type and tier.", ("form_type", "tier"),
+))
+RETENTION_BATCH_LATENCY = REGISTRY.register(Histogram(
+    "forms_retention_batch_duration_seconds", "Duration of one retention delete batch by form type.", ("form_type",),
+))
+RETENTION_LAST_SUCCESS = REGISTRY.register(Gauge(
+    "forms_retention_last_success_timestamp_seconds", "Unix time the retention job last finished a full pass.",
+))
+IDEMPOTENT_REPLAYS = REGISTRY.register(Counter(
+    "forms_idempotent_replays_total", "Submissions answered with the stored response of their Idempotency-Key, by form type and where it was found.",
+    ("form_type", "source"),
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "forms_admission_rejected_total", "Submissions turned away before reaching a route, by reason.", ("reason",),
+))
+EVENT_SUBSCRIBERS = REGISTRY.register(Gauge(
+    "forms_event_subscribers", "Clients following GET /forms/events.",
+))
+EVENT_CLIENTS_DROPPED = REGISTRY.register(Counter(
+    "forms_event_clients_dropped_total", "Event stream clients disconnected because they fell too far behind.",
+))
+CIRCUIT_BREAKER_OPEN = REGISTRY.register(Gauge(
+    "forms_db_circuit_breaker_open", "1 while the circuit breaker in front of the primary database is open or probing.",
+))
+CIRCUIT_BREAKER_REJECTED = REGISTRY.register(Counter(
+    "forms_db_circuit_breaker_rejected_total", "Database calls failed fast by the open circuit breaker.",
+))
+SUBMISSIONS_SPOOLED = REGISTRY.register(Counter(
+    "forms_submissions_spooled_total", "Submissions written to the local spool while the database was unavailable, by form type.", ("form_type",),
+))
+SPOOL_REPLAYED = REGISTRY.register(Counter(
+    "forms_spool_replayed_total", "Spooled submissions replayed into the database by form type and outcome.", ("form_type", "outcome"),
+))
+SPOOL_PENDING_BYTES = REGISTRY.register(Gauge(
+    "forms_spool_pending_bytes", "Size of the spool segments not yet replayed into the database.",
+))
+
+# Identifiers may be quoted, as in statements composed with psycopg's sql module
+_STATEMENT_TARGET = re.compile(r'\b(?:from|into|update|copy)\s+"?([a-z_][a-z0-9_]*)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Reduce a SQL string to a low-cardinality label like 'select feedback'"""
+    words = sql.split(None, 1)
+    verb = words[0].lower() if words else "unknown"
+    target = _STATEMENT_TARGET.search(sql)
+    return f"{verb} {target.group(1).lower()}" if target else verb
+
+
+def observe_query(sql: str, duration: float, rows: Optional[int] = None) -> None:
+    """Record the latency and, if known, the row count of a finished statement"""
+    statement = statement_label(sql)
+    QUERY_LATENCY.observe(duration, statement)
+    if rows is not None:
+        QUERY_ROWS.observe(rows, statement)
+
+
+def record_query_error(sql: str, error: Exception) -> None:
+    """Count a failed statement by the SQLSTATE of its error (psycopg2 pgcode or psycopg 3 sqlstate)"""
+    sqlstate = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None) or "none"
+    QUERY_ERRORS.inc(statement_label(sql), sqlstate)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request by its route template"""
+
+
+    def __init__(self, app):
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                getattr(route, "path", "unmatched"),
+                scope["method"],
+                str(status_code),
+            )
@@ -0,0 +1,59 @@
+-- Baseline schema. Written to be idempotent so databases created before
+-- migrations existed are adopted without losing data.
+CREATE TABLE IF NOT EXISTS cancellation (
+    id varchar(36) NOT NULL DEFAULT gen_random_uuid()::text,
+    email varchar(255) NOT NULL,
+    name varchar(100) NOT NULL,
+    last_name varchar(100) NOT NULL,
+    address varchar(255) NOT NULL,
+    town varchar(100) NOT NULL,
+    town_number varchar(10) NOT NULL,
+    is_unordinary boolean DEFAULT false,
+    reason varchar(255) DEFAULT NULL,
+    last_invoice_number varchar(50) NOT NULL,
+    termination_date date NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_archived boolean DEFAULT false
+);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    id varchar(36) NOT NULL DEFAULT gen_random_uuid()::text,
+    email varchar(255) DEFAULT NULL,
+    text varchar(500) DEFAULT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_archived boolean DEFAULT false
+);
+
+CREATE INDEX IF NOT EXISTS cancellation_created_at_id_idx ON cancellation (created_at, id);
+CREATE INDEX IF NOT EXISTS cancellation_is_archived_created_at_id_idx ON cancellation (is_archived, created_at, id);
+CREATE INDEX IF NOT EXISTS cancellation_is_unordinary_created_at_id_idx ON cancellation (is_unordinary, created_at, id);
+CREATE INDEX IF NOT EXISTS cancellation_termination_date_idx ON cancellation (termination_date);
+
+CREATE INDEX IF NOT EXISTS feedback_created_at_id_idx ON feedback (created_at, id);
+CREATE INDEX IF NOT EXISTS feedback_is_archived_created_at_id_idx ON feedback (is_archived, created_at, id);
+
+-- Per-table modification counter behind the ETags of the list endpoints
+CREATE TABLE IF NOT EXISTS form_change_counter (
+    table_name varchar(63) PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0
+);
+INSERT INTO form_change_counter (table_name) VALUES ('cancellation'), ('feedback') ON CONFLICT DO NOTHING;
+
+-- Bumps the table's change counter and tells every API process which table changed so it can drop cached list responses
+CREATE OR REPLACE FUNCTION notify_forms_change() RETURNS trigger AS $$
+BEGIN
+    UPDATE form_change_counter SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+    PERFORM pg_notify('forms_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cancellation_notify_change ON cancellation;
+CREATE TRIGGER cancellation_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON cancellation
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change();
+
+DROP TRIGGER IF EXISTS feedback_notify_change ON feedback;
+CREATE TRIGGER feedback_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON feedback
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change();
@@ -0,0 +1,29 @@
+-- Native uuid primary keys, NOT NULL flags and indexes for the common access paths.
+-- Rewrites both tables under an exclusive lock; ids that are not valid UUIDs abort the migration.
+UPDATE cancellation SET is_archived = false WHERE is_archived IS NULL;
+UPDATE cancellation SET is_unordinary = false WHERE is_unordinary IS NULL;
+UPDATE feedback SET is_archived = false WHERE is_archived IS NULL;
+
+ALTER TABLE cancellation
+    ALTER COLUMN id DROP DEFAULT,
+    ALTER COLUMN id TYPE uuid USING id::uuid,
+    ALTER COLUMN id SET DEFAULT gen_random_uuid(),
+    ALTER COLUMN is_archived SET NOT NULL,
+    ALTER COLUMN is_unordinary SET NOT NULL,
+    ADD CONSTRAINT cancellation_pkey PRIMARY KEY (id);
+
+ALTER TABLE feedback
+    ALTER COLUMN id DROP DEFAULT,
+    ALTER COLUMN id TYPE uuid USING id::uuid,
+    ALTER COLUMN id SET DEFAULT gen_random_uuid(),
+    ALTER COLUMN is_archived SET NOT NULL,
+    ADD CONSTRAINT feedback_pkey PRIMARY KEY (id);
+
+-- Dashboards list unarchived forms; a partial index keeps archived rows out of that path
+DROP INDEX IF EXISTS cancellation_is_archived_created_at_id_idx;
+DROP INDEX IF EXISTS feedback_is_archived_created_at_id_idx;
+CREATE INDEX cancellation_unarchived_created_at_id_idx ON cancellation (created_at, id) WHERE NOT is_archived;
+CREATE INDEX feedback_unarchived_created_at_id_idx ON feedback (created_at, id) WHERE NOT is_archived;
+
+CREATE INDEX cancellation_email_idx ON cancellation (lower(email));
+CREATE INDEX feedback_email_idx ON feedback (lower(email));
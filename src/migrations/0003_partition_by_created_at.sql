@@ -0,0 +1,102 @@
+-- Range-partition the form tables by month of created_at and add cold <table>_archive tables.
+-- Copies every row once under an exclusive lock. Archived forms are moved to the archive
+-- tables later by the partition maintenance task; <table>_all views read both tiers.
+
+-- Creates the missing monthly partitions <parent>_pYYYY_MM from from_month through to_month
+CREATE OR REPLACE FUNCTION create_form_partitions(parent regclass, from_month date, to_month date) RETURNS integer AS $$
+DECLARE
+    month date := date_trunc('month', from_month);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month <= to_month LOOP
+        partition_name := format('%s_p%s', parent::text, to_char(month, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month, (month + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month := month + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hot and archive tables report changes under the name of the form type, passed as the trigger argument
+CREATE OR REPLACE FUNCTION notify_forms_change() RETURNS trigger AS $$
+BEGIN
+    UPDATE form_change_counter SET version = version + 1 WHERE table_name = TG_ARGV[0];
+    PERFORM pg_notify('forms_changes', TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+ALTER TABLE cancellation RENAME TO cancellation_unpartitioned;
+CREATE TABLE cancellation (LIKE cancellation_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);
+CREATE TABLE cancellation_default PARTITION OF cancellation DEFAULT;
+SELECT create_form_partitions(
+    'cancellation',
+    COALESCE((SELECT min(created_at) FROM cancellation_unpartitioned)::date, current_date),
+    (current_date + interval '3 months')::date
+);
+INSERT INTO cancellation SELECT * FROM cancellation_unpartitioned;
+DROP TABLE cancellation_unpartitioned;
+
+-- The partition key has to be part of the primary key
+ALTER TABLE cancellation ADD CONSTRAINT cancellation_pkey PRIMARY KEY (id, created_at);
+CREATE INDEX cancellation_created_at_id_idx ON cancellation (created_at, id);
+CREATE INDEX cancellation_unarchived_created_at_id_idx ON cancellation (created_at, id) WHERE NOT is_archived;
+CREATE INDEX cancellation_is_unordinary_created_at_id_idx ON cancellation (is_unordinary, created_at, id);
+CREATE INDEX cancellation_termination_date_idx ON cancellation (termination_date);
+CREATE INDEX cancellation_email_idx ON cancellation (lower(email));
+CREATE TRIGGER cancellation_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON cancellation
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change('cancellation');
+
+CREATE TABLE cancellation_archive (LIKE cancellation INCLUDING DEFAULTS, PRIMARY KEY (id));
+CREATE INDEX cancellation_archive_created_at_id_idx ON cancellation_archive (created_at, id);
+CREATE INDEX cancellation_archive_termination_date_idx ON cancellation_archive (termination_date);
+CREATE INDEX cancellation_archive_email_idx ON cancellation_archive (lower(email));
+CREATE TRIGGER cancellation_archive_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON cancellation_archive
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change('cancellation');
+
+CREATE VIEW cancellation_all AS
+    SELECT * FROM cancellation
+    UNION ALL
+    SELECT * FROM cancellation_archive;
+
+
+ALTER TABLE feedback RENAME TO feedback_unpartitioned;
+CREATE TABLE feedback (LIKE feedback_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);
+CREATE TABLE feedback_default PARTITION OF feedback DEFAULT;
+SELECT create_form_partitions(
+    'feedback',
+    COALESCE((SELECT min(created_at) FROM feedback_unpartitioned)::date, current_date),
+    (current_date + interval '3 months')::date
+);
+INSERT INTO feedback SELECT * FROM feedback_unpartitioned;
+DROP TABLE feedback_unpartitioned;
+
+ALTER TABLE feedback ADD CONSTRAINT feedback_pkey PRIMARY KEY (id, created_at);
+CREATE INDEX feedback_created_at_id_idx ON feedback (created_at, id);
+CREATE INDEX feedback_unarchived_created_at_id_idx ON feedback (created_at, id) WHERE NOT is_archived;
+CREATE INDEX feedback_email_idx ON feedback (lower(email));
+CREATE TRIGGER feedback_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON feedback
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change('feedback');
+
+CREATE TABLE feedback_archive (LIKE feedback INCLUDING DEFAULTS, PRIMARY KEY (id));
+CREATE INDEX feedback_archive_created_at_id_idx ON feedback_archive (created_at, id);
+CREATE INDEX feedback_archive_email_idx ON feedback_archive (lower(email));
+CREATE TRIGGER feedback_archive_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON feedback_archive
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_forms_change('feedback');
+
+CREATE VIEW feedback_all AS
+    SELECT * FROM feedback
+    UNION ALL
+    SELECT * FROM feedback_archive;
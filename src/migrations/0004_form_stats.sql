@@ -0,0 +1,104 @@
+-- Daily rollups behind GET /forms/stats, kept up to date by statement-level triggers.
+-- They count the forms currently stored in the hot and archive tables: moving a form to
+-- the archive table leaves them unchanged, and forms deleted by retention drop out.
+CREATE TABLE cancellation_daily_stats (
+    day date NOT NULL,
+    is_unordinary boolean NOT NULL,
+    -- '' stands for no reason, since primary key columns cannot be NULL
+    reason varchar(255) NOT NULL,
+    termination_month date NOT NULL,
+    is_archived boolean NOT NULL,
+    count bigint NOT NULL,
+    PRIMARY KEY (day, is_unordinary, reason, termination_month, is_archived)
+);
+
+CREATE TABLE feedback_daily_stats (
+    day date NOT NULL,
+    is_archived boolean NOT NULL,
+    count bigint NOT NULL,
+    PRIMARY KEY (day, is_archived)
+);
+
+-- Applies the rows a statement removed (old_rows) and added (new_rows) to the rollups
+CREATE OR REPLACE FUNCTION cancellation_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO cancellation_daily_stats AS s (day, is_unordinary, reason, termination_month, is_archived, count)
+        SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, -count(*)
+        FROM old_rows
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, is_unordinary, reason, termination_month, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO cancellation_daily_stats AS s (day, is_unordinary, reason, termination_month, is_archived, count)
+        SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, count(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, is_unordinary, reason, termination_month, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION feedback_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO feedback_daily_stats AS s (day, is_archived, count)
+        SELECT created_at::date, is_archived, -count(*) FROM old_rows GROUP BY 1, 2
+        ON CONFLICT (day, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO feedback_daily_stats AS s (day, is_archived, count)
+        SELECT created_at::date, is_archived, count(*) FROM new_rows GROUP BY 1, 2
+        ON CONFLICT (day, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables are only available to triggers with a single event
+CREATE TRIGGER cancellation_stats_insert AFTER INSERT ON cancellation
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+CREATE TRIGGER cancellation_stats_update AFTER UPDATE ON cancellation
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+CREATE TRIGGER cancellation_stats_delete AFTER DELETE ON cancellation
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+CREATE TRIGGER cancellation_archive_stats_insert AFTER INSERT ON cancellation_archive
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+CREATE TRIGGER cancellation_archive_stats_update AFTER UPDATE ON cancellation_archive
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+CREATE TRIGGER cancellation_archive_stats_delete AFTER DELETE ON cancellation_archive
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION cancellation_stats_apply();
+
+CREATE TRIGGER feedback_stats_insert AFTER INSERT ON feedback
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_stats_update AFTER UPDATE ON feedback
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_stats_delete AFTER DELETE ON feedback
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_archive_stats_insert AFTER INSERT ON feedback_archive
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_archive_stats_update AFTER UPDATE ON feedback_archive
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_archive_stats_delete AFTER DELETE ON feedback_archive
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+
+-- Recomputes both rollups from the stored forms. The EXCLUSIVE lock makes concurrent writers
+-- wait in their triggers until the rebuild commits, so no change is counted twice or lost.
+CREATE OR REPLACE FUNCTION rebuild_form_stats() RETURNS void AS $$
+BEGIN
+    LOCK TABLE cancellation_daily_stats, feedback_daily_stats IN EXCLUSIVE MODE;
+    DELETE FROM cancellation_daily_stats;
+    INSERT INTO cancellation_daily_stats (day, is_unordinary, reason, termination_month, is_archived, count)
+    SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, count(*)
+    FROM cancellation_all
+    GROUP BY 1, 2, 3, 4, 5;
+    DELETE FROM feedback_daily_stats;
+    INSERT INTO feedback_daily_stats (day, is_archived, count)
+    SELECT created_at::date, is_archived, count(*)
+    FROM feedback_all
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_form_stats();
@@ -0,0 +1,23 @@
+-- Generated tsvector columns with GIN indexes behind the search endpoints. The 'simple'
+-- configuration lower-cases words without stemming or stop words, since forms arrive in
+-- several languages. Adding the columns rewrites both tiers of both tables.
+ALTER TABLE feedback ADD COLUMN text_search tsvector GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(text, ''))) STORED;
+ALTER TABLE feedback_archive ADD COLUMN text_search tsvector GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(text, ''))) STORED;
+CREATE INDEX feedback_text_search_idx ON feedback USING gin (text_search);
+CREATE INDEX feedback_archive_text_search_idx ON feedback_archive USING gin (text_search);
+
+ALTER TABLE cancellation ADD COLUMN reason_search tsvector GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(reason, ''))) STORED;
+ALTER TABLE cancellation_archive ADD COLUMN reason_search tsvector GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(reason, ''))) STORED;
+CREATE INDEX cancellation_reason_search_idx ON cancellation USING gin (reason_search);
+CREATE INDEX cancellation_archive_reason_search_idx ON cancellation_archive USING gin (reason_search);
+
+-- Views expand * when created, so they are recreated to include the new columns
+CREATE OR REPLACE VIEW feedback_all AS
+    SELECT * FROM feedback
+    UNION ALL
+    SELECT * FROM feedback_archive;
+
+CREATE OR REPLACE VIEW cancellation_all AS
+    SELECT * FROM cancellation
+    UNION ALL
+    SELECT * FROM cancellation_archive;
@@ -0,0 +1,14 @@
+-- Idempotency-Key values of form submissions with the response to replay for retries.
+-- The primary key is the source of truth across replicas: a retry racing the original
+-- request waits on it and then finds the stored response.
+CREATE TABLE idempotency_keys (
+    form_type varchar(20) NOT NULL,
+    key varchar(255) NOT NULL,
+    request_hash bytea NOT NULL,
+    status_code smallint NOT NULL,
+    response bytea NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (form_type, key)
+);
+
+CREATE INDEX idempotency_keys_created_at_idx ON idempotency_keys (created_at);
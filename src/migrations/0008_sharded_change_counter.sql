@@ -0,0 +1,20 @@
+-- Splits the change counters behind the list ETags into one row per table and database backend.
+-- Updating the single form_change_counter row made every writing transaction wait for the
+-- previous one to commit. Now each backend only bumps its own row, and a connection runs one
+-- transaction at a time, so writers never wait on each other. Readers add the shards to
+-- form_change_counter, into which partition maintenance folds the shards of ended backends.
+CREATE TABLE form_change_shards (
+    table_name varchar(63) NOT NULL,
+    backend integer NOT NULL,
+    version bigint NOT NULL,
+    PRIMARY KEY (table_name, backend)
+);
+
+CREATE OR REPLACE FUNCTION notify_forms_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO form_change_shards AS s (table_name, backend, version) VALUES (TG_ARGV[0], pg_backend_pid(), 1)
+    ON CONFLICT (table_name, backend) DO UPDATE SET version = s.version + 1;
+    PERFORM pg_notify('forms_changes', TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,101 @@
+-- Takes the /forms/stats rollups out of the write path. The triggers used to upsert the rollup
+-- rows of the day, so every submission waited for the previous one to commit. They now append
+-- their changes to delta tables without a key, which never makes a writer wait, and the stats
+-- rollup job folds the deltas into the rollups every few seconds. Reads go through the
+-- <form type>_stats_current views, which add the deltas not folded yet, so stats stay exact.
+CREATE TABLE cancellation_stats_deltas (LIKE cancellation_daily_stats);
+CREATE TABLE feedback_stats_deltas (LIKE feedback_daily_stats);
+
+CREATE VIEW cancellation_stats_current AS
+    SELECT * FROM cancellation_daily_stats
+    UNION ALL
+    SELECT * FROM cancellation_stats_deltas;
+
+CREATE VIEW feedback_stats_current AS
+    SELECT * FROM feedback_daily_stats
+    UNION ALL
+    SELECT * FROM feedback_stats_deltas;
+
+-- Appends the rows a statement removed (old_rows) and added (new_rows) as deltas
+CREATE OR REPLACE FUNCTION cancellation_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO cancellation_stats_deltas (day, is_unordinary, reason, termination_month, is_archived, count)
+        SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, -count(*)
+        FROM old_rows
+        GROUP BY 1, 2, 3, 4, 5;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO cancellation_stats_deltas (day, is_unordinary, reason, termination_month, is_archived, count)
+        SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, count(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4, 5;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION feedback_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO feedback_stats_deltas (day, is_archived, count)
+        SELECT created_at::date, is_archived, -count(*) FROM old_rows GROUP BY 1, 2;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO feedback_stats_deltas (day, is_archived, count)
+        SELECT created_at::date, is_archived, count(*) FROM new_rows GROUP BY 1, 2;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moves the committed deltas into the rollups and returns how many were folded. Deltas of
+-- transactions still running are invisible to the DELETE and stay for the next fold.
+CREATE OR REPLACE FUNCTION fold_form_stats() RETURNS bigint AS $$
+DECLARE
+    cancellations bigint;
+    feedbacks bigint;
+BEGIN
+    WITH deltas AS (
+        DELETE FROM cancellation_stats_deltas RETURNING *
+    ), folded AS (
+        INSERT INTO cancellation_daily_stats AS s (day, is_unordinary, reason, termination_month, is_archived, count)
+        SELECT day, is_unordinary, reason, termination_month, is_archived, sum(count)
+        FROM deltas
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, is_unordinary, reason, termination_month, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count
+    )
+    SELECT count(*) INTO cancellations FROM deltas;
+
+    WITH deltas AS (
+        DELETE FROM feedback_stats_deltas RETURNING *
+    ), folded AS (
+        INSERT INTO feedback_daily_stats AS s (day, is_archived, count)
+        SELECT day, is_archived, sum(count) FROM deltas GROUP BY 1, 2
+        ON CONFLICT (day, is_archived) DO UPDATE SET count = s.count + EXCLUDED.count
+    )
+    SELECT count(*) INTO feedbacks FROM deltas;
+
+    RETURN cancellations + feedbacks;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recomputes both rollups from the stored forms. The EXCLUSIVE locks make concurrent writers
+-- wait in their triggers until the rebuild commits, so no change is counted twice or lost.
+CREATE OR REPLACE FUNCTION rebuild_form_stats() RETURNS void AS $$
+BEGIN
+    LOCK TABLE cancellation_daily_stats, feedback_daily_stats, cancellation_stats_deltas, feedback_stats_deltas IN EXCLUSIVE MODE;
+    DELETE FROM cancellation_stats_deltas;
+    DELETE FROM cancellation_daily_stats;
+    INSERT INTO cancellation_daily_stats (day, is_unordinary, reason, termination_month, is_archived, count)
+    SELECT created_at::date, is_unordinary, COALESCE(reason, ''), date_trunc('month', termination_date)::date, is_archived, count(*)
+    FROM cancellation_all
+    GROUP BY 1, 2, 3, 4, 5;
+    DELETE FROM feedback_stats_deltas;
+    DELETE FROM feedback_daily_stats;
+    INSERT INTO feedback_daily_stats (day, is_archived, count)
+    SELECT created_at::date, is_archived, count(*)
+    FROM feedback_all
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,64 @@
+-- Fixes two gaps in the partitioning of migration 0003.
+-- The hot tables can only be unique on (id, created_at), since the partition key has to be part
+-- of the primary key, but the archive tables were unique on id alone, so moving two forms
+-- sharing an ID failed the whole archive batch. The archive tables now use the same key.
+ALTER TABLE cancellation_archive
+    DROP CONSTRAINT cancellation_archive_pkey,
+    ADD CONSTRAINT cancellation_archive_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE feedback_archive
+    DROP CONSTRAINT feedback_archive_pkey,
+    ADD CONSTRAINT feedback_archive_pkey PRIMARY KEY (id, created_at);
+
+-- Creating a partition failed when the default partition held rows of its month, since Postgres
+-- checks the default partition has none. Those rows are now moved into the new partition while
+-- the default partition is detached. Triggers on the form tables only fire for statements on the
+-- parent tables, so the move leaves the stats, change counters and event feed alone.
+CREATE OR REPLACE FUNCTION create_form_partitions(parent regclass, from_month date, to_month date) RETURNS integer AS $$
+DECLARE
+    month date := date_trunc('month', from_month);
+    next_month date;
+    partition_name text;
+    default_partition regclass;
+    stored_columns text;
+    has_rows boolean;
+    created integer := 0;
+BEGIN
+    SELECT NULLIF(partdefid, 0)::regclass INTO default_partition FROM pg_partitioned_table WHERE partrelid = parent;
+    -- Generated columns such as the search vectors are recomputed by the new partition
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO stored_columns
+    FROM pg_attribute
+    WHERE attrelid = parent AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+    WHILE month <= to_month LOOP
+        partition_name := format('%s_p%s', parent::text, to_char(month, 'YYYY_MM'));
+        next_month := (month + interval '1 month')::date;
+        IF to_regclass(partition_name) IS NULL THEN
+            has_rows := false;
+            IF default_partition IS NOT NULL THEN
+                -- Creating the partition locks the parent anyway; locking it first keeps rows from arriving after the check
+                EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', parent);
+                EXECUTE format(
+                    'SELECT EXISTS (SELECT 1 FROM %s WHERE created_at >= %L AND created_at < %L)',
+                    default_partition, month, next_month
+                ) INTO has_rows;
+            END IF;
+            IF has_rows THEN
+                EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent, default_partition);
+            END IF;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month, next_month
+            );
+            IF has_rows THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %s WHERE created_at >= %L AND created_at < %L RETURNING %s) INSERT INTO %I (%s) SELECT %s FROM moved',
+                    default_partition, month, next_month, stored_columns, partition_name, stored_columns, stored_columns
+                );
+                EXECUTE format('ALTER TABLE %s ATTACH PARTITION %s DEFAULT', parent, default_partition);
+            END IF;
+            created := created + 1;
+        END IF;
+        month := next_month;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
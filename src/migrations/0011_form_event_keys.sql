@@ -0,0 +1,35 @@
+-- Fixes the archived events of migration 0007, which matched the old and new rows on id alone.
+-- Forms are unique on (id, created_at), so an UPDATE touching two forms sharing an ID paired each
+-- new row with both old rows and could report a form as newly archived that already was.
+CREATE OR REPLACE FUNCTION notify_form_events() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR payload IN
+            SELECT json_agg(json_build_object(
+                'event_id', nextval('form_event_id_seq'), 'event', 'created', 'form_type', TG_ARGV[0], 'id', id, 'created_at', created_at
+            ))::text
+            FROM (SELECT id, created_at, (row_number() OVER () - 1) / 25 AS chunk FROM new_rows) AS changed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('form_events', payload);
+        END LOOP;
+    ELSE
+        FOR payload IN
+            SELECT json_agg(json_build_object(
+                'event_id', nextval('form_event_id_seq'), 'event', 'archived', 'form_type', TG_ARGV[0], 'id', id, 'created_at', created_at
+            ))::text
+            FROM (
+                SELECT n.id, n.created_at, (row_number() OVER () - 1) / 25 AS chunk
+                FROM new_rows AS n JOIN old_rows AS o ON o.id = n.id AND o.created_at = n.created_at
+                WHERE n.is_archived AND NOT o.is_archived
+            ) AS changed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('form_events', payload);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
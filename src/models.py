@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, Literal, Any
+from datetime import datetime, date, timedelta
+from uuid import UUID
 
 class CreateCancellation(BaseModel):
     email: str
@@ -15,7 +16,7 @@ class CreateCancellation(BaseModel):
     termination_date: datetime
 
 class Cancellation(CreateCancellation):
-    id: str
+    id: UUID
     is_archived: bool = False
     created_at: datetime
 
@@ -25,6 +26,166 @@ class CreateFeedback(BaseModel):
     text: str
 
 class Feedback(CreateFeedback):
-    id: str
+    id: UUID
     is_archived: bool=False
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+
+class FeedbackFilterParams(BaseModel):
+    is_archived: Optional[bool] = None
+    email: Optional[str] = Field(None, description="Only forms submitted from this email address, ignoring case")
+    created_after: Optional[datetime] = Field(None, description="Only forms created at or after this time")
+    created_before: Optional[datetime] = Field(None, description="Only forms created before this time")
+
+class CancellationFilterParams(FeedbackFilterParams):
+    termination_date_from: Optional[date] = Field(None, description="Only cancellations terminating on or after this date")
+    termination_date_to: Optional[date] = Field(None, description="Only cancellations terminating on or before this date")
+    is_unordinary: Optional[bool] = None
+
+class PageParams(BaseModel):
+    limit: int = Field(100, ge=1, le=1000, description="Maximum number of items per page")
+    cursor: Optional[str] = Field(None, description="Opaque cursor returned as next_cursor by the previous page")
+
+class FeedbackListParams(FeedbackFilterParams, PageParams):
+    pass
+
+class CancellationListParams(CancellationFilterParams, PageParams):
+    pass
+
+
+class SearchParams(BaseModel):
+    q: str = Field(min_length=1, max_length=200, description="Words to search for; supports \"quoted phrases\", OR and -excluded words")
+    limit: int = Field(20, ge=1, le=100, description="Maximum number of hits per page")
+    cursor: Optional[str] = Field(None, description="Opaque cursor returned as next_cursor by the previous page")
+
+class FeedbackSearchParams(FeedbackFilterParams, SearchParams):
+    pass
+
+class CancellationSearchParams(CancellationFilterParams, SearchParams):
+    pass
+
+
+ExportFormat = Literal["ndjson", "csv"]
+
+class ExportParams(BaseModel):
+    format: ExportFormat = Field("ndjson", description="Export as newline-delimited JSON or CSV")
+
+class FeedbackExportParams(FeedbackFilterParams, ExportParams):
+    pass
+
+class CancellationExportParams(CancellationFilterParams, ExportParams):
+    pass
+
+
+class CancellationPage(BaseModel):
+    items: list[Cancellation]
+    next_cursor: Optional[str] = None
+
+class FeedbackPage(BaseModel):
+    items: list[Feedback]
+    next_cursor: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    rank: float = Field(description="Relevance of the hit, higher is better")
+    highlight: str = Field(description="HTML-escaped excerpt with the matching words wrapped in <mark> tags")
+
+class CancellationSearchHit(Cancellation, SearchHit):
+    pass
+
+class FeedbackSearchHit(Feedback, SearchHit):
+    pass
+
+class CancellationSearchPage(BaseModel):
+    items: list[CancellationSearchHit]
+    next_cursor: Optional[str] = None
+
+class FeedbackSearchPage(BaseModel):
+    items: list[FeedbackSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class BulkArchiveRequest(BaseModel):
+    ids: Optional[list[UUID]] = Field(None, max_length=10000, description="IDs of the forms to archive")
+    created_at: Optional[list[datetime]] = Field(
+        None, max_length=10000, description="Creation times of the forms in the order of 'ids', as listed; lets each form be found in its own partition"
+    )
+    created_before: Optional[datetime] = Field(None, description="Archive every form created before this time")
+
+    @model_validator(mode="after")
+    def check_exactly_one_selector(self):
+        if (self.ids is None) == (self.created_before is None):
+            raise ValueError("Provide either 'ids' or 'created_before'")
+        if self.created_at is not None and (self.ids is None or len(self.created_at) != len(self.ids)):
+            raise ValueError("'created_at' needs one creation time per entry of 'ids'")
+        return self
+
+class BulkArchiveItem(BaseModel):
+    id: UUID
+    status: Literal["archived", "already_archived", "not_found"]
+
+class BulkArchiveResult(BaseModel):
+    archived: int
+    already_archived: int
+    not_found: int
+    results: list[BulkArchiveItem]
+
+
+class BatchItemError(BaseModel):
+    index: int
+    errors: list[dict[str, Any]]
+
+class BatchSubmissionResult(BaseModel):
+    created: int
+    failed: int
+    errors: list[BatchItemError]
+
+
+class StatsParams(BaseModel):
+    date_from: Optional[date] = Field(None, description="First day to report, defaults to 29 days before date_to")
+    date_to: Optional[date] = Field(None, description="Last day to report, defaults to today")
+
+    @model_validator(mode="after")
+    def fill_and_check_range(self):
+        if self.date_to is None:
+            self.date_to = date.today()
+        if self.date_from is None:
+            self.date_from = self.date_to - timedelta(days=29)
+        if self.date_from > self.date_to:
+            raise ValueError("'date_from' must not be after 'date_to'")
+        if (self.date_to - self.date_from).days >= 366:
+            raise ValueError("At most 366 days can be reported at once")
+        return self
+
+class DailyCancellationCount(BaseModel):
+    day: date
+    ordinary: int
+    unordinary: int
+    archived: int
+
+class ReasonCount(BaseModel):
+    reason: Optional[str] = None
+    count: int
+
+class TerminationMonthCount(BaseModel):
+    month: date
+    count: int
+
+class CancellationStats(BaseModel):
+    daily: list[DailyCancellationCount]
+    by_reason: list[ReasonCount]
+    by_termination_month: list[TerminationMonthCount]
+
+class DailyFeedbackCount(BaseModel):
+    day: date
+    count: int
+    archived: int
+
+class FeedbackStats(BaseModel):
+    daily: list[DailyFeedbackCount]
+
+class FormStats(BaseModel):
+    date_from: date
+    date_to: date
+    cancellations: CancellationStats
+    feedback: FeedbackStats
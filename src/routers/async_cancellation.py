@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Body, Depends, Header, Path, Query, Request
+from typing import Annotated, Any, Optional
+from datetime import datetime
+from uuid import UUID
+
+from src.models import Cancellation, CreateCancellation, CancellationListParams, CancellationPage, CancellationExportParams, BulkArchiveRequest, BulkArchiveResult, BatchSubmissionResult, CancellationSearchParams, CancellationSearchPage
+from src.managers.async_postgres_manager import AsyncPostgresManager
+from src import async_forms
+from src.cache import ResponseCache
+from src.idempotency import IdempotencyCache
+from src.managers.submission_spool import SubmissionSpool
+from src.managers.write_coalescer import AsyncWriteCoalescer
+from src.dependencies import get_async_postgres_manager, get_write_coalescer, get_response_cache, get_idempotency_cache, get_submission_spool
+
+"""Create cancellation form management router for the async database mode"""
+router = APIRouter()
+
+@router.get("/forms/cancellation", response_model=CancellationPage, tags=["forms"])
+async def get_cancellation(
+    request: Request,
+    list_params: Annotated[CancellationListParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Get all cancellations"""
+    return await async_forms.get_all_cancellations(pg_manager, request, list_params, response_cache)
+
+
+@router.get("/forms/cancellation/export", tags=["forms"])
+async def export_cancellation(
+    request: Request,
+    export_params: Annotated[CancellationExportParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    ):
+    """Stream all matching cancellations as NDJSON or CSV"""
+    return await async_forms.export_cancellations(pg_manager, request, export_params)
+
+
+@router.get("/forms/cancellation/search", response_model=CancellationSearchPage, tags=["forms"])
+async def search_cancellation(
+    request: Request,
+    search_params: Annotated[CancellationSearchParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    ):
+    """Search cancellation reasons, best matches first"""
+    return await async_forms.search_cancellations(pg_manager, request, search_params)
+
+
+@router.post("/forms/cancellation", tags=["forms"], status_code=201)
+async def insert_cancellation(
+    cancellation_data: CreateCancellation,
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    write_coalescer: Optional[AsyncWriteCoalescer] = Depends(get_write_coalescer),
+    idempotency_cache: IdempotencyCache = Depends(get_idempotency_cache),
+    submission_spool: Optional[SubmissionSpool] = Depends(get_submission_spool),
+    idempotency_key: Annotated[Optional[str], Header(min_length=1, max_length=255, description="Client-chosen key; retries with the same key create the cancellation only once")] = None,
+    ):
+    """Insert a new cancellation"""
+    return await async_forms.create_cancellation(cancellation_data, pg_manager, write_coalescer, response_cache, idempotency_key, idempotency_cache, submission_spool)
+
+
+@router.post("/forms/cancellation/batch", response_model=BatchSubmissionResult, tags=["forms"], status_code=201)
+async def insert_cancellation_batch(
+    items: Annotated[list[Any], Body(max_length=1000, description="Up to 1000 cancellations, validated individually")],
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Insert many cancellations in one transaction, reporting invalid items by index"""
+    return await async_forms.create_cancellation_batch(items, pg_manager, response_cache)
+
+
+@router.put("/forms/cancellation/{cancellation_id}/archive", tags=["forms"], status_code=201)
+async def archive_cancellation(
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    cancellation_id: UUID = Path(description="The ID of the cancellation to archive"),
+    created_at: Optional[datetime] = Query(None, description="Creation time of the cancellation as listed; lets the database search only its monthly partition"),
+    ):
+    """Archive a cancellation by its ID"""
+    return await async_forms.archive_cancellation(cancellation_id, pg_manager, request, response_cache, created_at)
+
+
+@router.post("/forms/cancellation/archive", response_model=BulkArchiveResult, tags=["forms"])
+async def bulk_archive_cancellation(
+    archive_request: BulkArchiveRequest,
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Archive many cancellations by ID or by creation time"""
+    return await async_forms.bulk_archive_cancellations(archive_request, pg_manager, request, response_cache)
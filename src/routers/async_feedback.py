@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Body, Depends, Header, Path, Query, Request
+from typing import Annotated, Any, Optional
+from datetime import datetime
+from uuid import UUID
+
+from src.models import CreateFeedback, Feedback, FeedbackListParams, FeedbackPage, FeedbackExportParams, BulkArchiveRequest, BulkArchiveResult, BatchSubmissionResult, FeedbackSearchParams, FeedbackSearchPage
+from src.managers.async_postgres_manager import AsyncPostgresManager
+from src import async_forms
+from src.cache import ResponseCache
+from src.idempotency import IdempotencyCache
+from src.managers.submission_spool import SubmissionSpool
+from src.managers.write_coalescer import AsyncWriteCoalescer
+from src.dependencies import get_async_postgres_manager, get_write_coalescer, get_response_cache, get_idempotency_cache, get_submission_spool
+
+"""Create feedback form management router for the async database mode"""
+router = APIRouter()
+
+
+@router.get("/forms/feedback", response_model=FeedbackPage, tags=["forms"])
+async def get_feedback(
+    request: Request,
+    list_params: Annotated[FeedbackListParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Get all feedback"""
+    return await async_forms.get_all_feedbacks(pg_manager, request, list_params, response_cache)
+
+
+@router.get("/forms/feedback/export", tags=["forms"])
+async def export_feedback(
+    request: Request,
+    export_params: Annotated[FeedbackExportParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    ):
+    """Stream all matching feedback as NDJSON or CSV"""
+    return await async_forms.export_feedbacks(pg_manager, request, export_params)
+
+
+@router.get("/forms/feedback/search", response_model=FeedbackSearchPage, tags=["forms"])
+async def search_feedback(
+    request: Request,
+    search_params: Annotated[FeedbackSearchParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    ):
+    """Search feedback texts, best matches first"""
+    return await async_forms.search_feedbacks(pg_manager, request, search_params)
+
+
+@router.post("/forms/feedback", tags=["forms"], status_code=201)
+async def insert_feedback(
+    feedback_data: CreateFeedback,
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    write_coalescer: Optional[AsyncWriteCoalescer] = Depends(get_write_coalescer),
+    idempotency_cache: IdempotencyCache = Depends(get_idempotency_cache),
+    submission_spool: Optional[SubmissionSpool] = Depends(get_submission_spool),
+    idempotency_key: Annotated[Optional[str], Header(min_length=1, max_length=255, description="Client-chosen key; retries with the same key create the feedback only once")] = None,
+    ):
+    """Insert a new feedback"""
+    return await async_forms.create_feedback(feedback_data, pg_manager, write_coalescer, response_cache, idempotency_key, idempotency_cache, submission_spool)
+
+
+@router.post("/forms/feedback/batch", response_model=BatchSubmissionResult, tags=["forms"], status_code=201)
+async def insert_feedback_batch(
+    items: Annotated[list[Any], Body(max_length=1000, description="Up to 1000 feedback entries, validated individually")],
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Insert many feedback entries in one transaction, reporting invalid items by index"""
+    return await async_forms.create_feedback_batch(items, pg_manager, response_cache)
+
+
+@router.put("/forms/feedback/{feedback_id}/archive", tags=["forms"], status_code=201)
+async def archive_feedback(
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    feedback_id: UUID = Path(description="The ID of the feedback to archive"),
+    created_at: Optional[datetime] = Query(None, description="Creation time of the feedback as listed; lets the database search only its monthly partition"),
+    ):
+    """Archive a feedback by its ID"""
+    return await async_forms.archive_feedback(feedback_id, pg_manager, request, response_cache, created_at)
+
+
+@router.post("/forms/feedback/archive", response_model=BulkArchiveResult, tags=["forms"])
+async def bulk_archive_feedback(
+    archive_request: BulkArchiveRequest,
+    request: Request,
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Archive many feedback by ID or by creation time"""
+    return await async_forms.bulk_archive_feedbacks(archive_request, pg_manager, request, response_cache)
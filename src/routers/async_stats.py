@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Query, Request
+from typing import Annotated
+
+from src.models import StatsParams, FormStats
+from src.managers.async_postgres_manager import AsyncPostgresManager
+from src import async_forms
+from src.dependencies import get_async_postgres_manager
+
+"""Create form statistics router for the async database mode"""
+router = APIRouter()
+
+
+@router.get("/forms/stats", response_model=FormStats, tags=["forms"])
+async def get_stats(
+    request: Request,
+    stats_params: Annotated[StatsParams, Query()],
+    pg_manager: AsyncPostgresManager = Depends(get_async_postgres_manager),
+    ):
+    """Get daily cancellation and feedback counts"""
+    return await async_forms.get_form_stats(pg_manager, request, stats_params)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Header, Request
+from typing import Annotated, Optional
+
+from src import forms
+from src.events import EventHub
+from src.dependencies import get_event_hub
+
+"""Create live form events router, shared by both database modes"""
+router = APIRouter()
+
+
+@router.get("/forms/events", tags=["forms"])
+async def stream_events(
+    request: Request,
+    last_event_id: Annotated[Optional[str], Header(description="ID of the last event received, to resume after it")] = None,
+    event_hub: Optional[EventHub] = Depends(get_event_hub),
+    ):
+    """Stream created and archived cancellations and feedback as Server-Sent Events"""
+    return forms.stream_form_events(request, event_hub, last_event_id)
@@ -1,21 +1,50 @@
-from fastapi import APIRouter, Depends, Path, Request
+from fastapi import APIRouter, Body, Depends, Header, Path, Query, Request
+from typing import Annotated, Any, Optional
+from datetime import datetime
+from uuid import UUID
 
-from src.models import CreateFeedback, Feedback
+from src.models import CreateFeedback, Feedback, FeedbackListParams, FeedbackPage, FeedbackExportParams, BulkArchiveRequest, BulkArchiveResult, BatchSubmissionResult, FeedbackSearchParams, FeedbackSearchPage
 from src.managers.postgres_manager import PostgresManager
 from src import forms
-from src.dependencies import get_postgres_manager
+from src.cache import ResponseCache
+from src.idempotency import IdempotencyCache
+from src.managers.submission_spool import SubmissionSpool
+from src.managers.write_coalescer import WriteCoalescer
+from src.dependencies import get_postgres_manager, get_write_coalescer, get_response_cache, get_idempotency_cache, get_submission_spool
 
 """Create feedback form management router"""
 router = APIRouter()
 
 
-@router.get("/forms/feedback", response_model=list[Feedback], tags=["forms"])
+@router.get("/forms/feedback", response_model=FeedbackPage, tags=["forms"])
 def get_feedback(
     request: Request,
+    list_params: Annotated[FeedbackListParams, Query()],
     pg_manager: PostgresManager = Depends(get_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
     ):
     """Get all feedback"""
-    return forms.get_all_feedbacks(pg_manager, request)
+    return forms.get_all_feedbacks(pg_manager, request, list_params, response_cache)
+
+
+@router.get("/forms/feedback/export", tags=["forms"])
+def export_feedback(
+    request: Request,
+    export_params: Annotated[FeedbackExportParams, Query()],
+    pg_manager: PostgresManager = Depends(get_postgres_manager),
+    ):
+    """Stream all matching feedback as NDJSON or CSV"""
+    return forms.export_feedbacks(pg_manager, request, export_params)
+
+
+@router.get("/forms/feedback/search", response_model=FeedbackSearchPage, tags=["forms"])
+def search_feedback(
+    request: Request,
+    search_params: Annotated[FeedbackSearchParams, Query()],
+    pg_manager: PostgresManager = Depends(get_postgres_manager),
+    ):
+    """Search feedback texts, best matches first"""
+    return forms.search_feedbacks(pg_manager, request, search_params)
 
 
 @router.post("/forms/feedback", tags=["forms"], status_code=201)
@@ -23,16 +52,45 @@ def insert_feedback(
     feedback_data: CreateFeedback,
     request: Request,
     pg_manager: PostgresManager = Depends(get_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    write_coalescer: Optional[WriteCoalescer] = Depends(get_write_coalescer),
+    idempotency_cache: IdempotencyCache = Depends(get_idempotency_cache),
+    submission_spool: Optional[SubmissionSpool] = Depends(get_submission_spool),
+    idempotency_key: Annotated[Optional[str], Header(min_length=1, max_length=255, description="Client-chosen key; retries with the same key create the feedback only once")] = None,
     ):
     """Insert a new feedback"""
-    return forms.create_feedback(feedback_data, pg_manager)
+    return forms.create_feedback(feedback_data, pg_manager, write_coalescer, response_cache, idempotency_key, idempotency_cache, submission_spool)
+
+
+@router.post("/forms/feedback/batch", response_model=BatchSubmissionResult, tags=["forms"], status_code=201)
+def insert_feedback_batch(
+    items: Annotated[list[Any], Body(max_length=1000, description="Up to 1000 feedback entries, validated individually")],
+    request: Request,
+    pg_manager: PostgresManager = Depends(get_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Insert many feedback entries in one transaction, reporting invalid items by index"""
+    return forms.create_feedback_batch(items, pg_manager, response_cache)
 
 
 @router.put("/forms/feedback/{feedback_id}/archive", tags=["forms"], status_code=201)
 def archive_feedback(
     request: Request,
     pg_manager: PostgresManager = Depends(get_postgres_manager),
-    feedback_id: str = Path(description="The ID of the feedback to archive")
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    feedback_id: UUID = Path(description="The ID of the feedback to archive"),
+    created_at: Optional[datetime] = Query(None, description="Creation time of the feedback as listed; lets the database search only its monthly partition"),
     ):
     """Archive a feedback by its ID"""
-    return forms.archive_feedback(feedback_id, pg_manager, request)
\ No newline at end of file
+    return forms.archive_feedback(feedback_id, pg_manager, request, response_cache, created_at)
+
+
+@router.post("/forms/feedback/archive", response_model=BulkArchiveResult, tags=["forms"])
+def bulk_archive_feedback(
+    archive_request: BulkArchiveRequest,
+    request: Request,
+    pg_manager: PostgresManager = Depends(get_postgres_manager),
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache),
+    ):
+    """Archive many feedback by ID or by creation time"""
+    return forms.bulk_archive_feedbacks(archive_request, pg_manager, request, response_cache)
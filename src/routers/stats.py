@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query, Request
+from typing import Annotated
+
+from src.models import StatsParams, FormStats
+from src.managers.postgres_manager import PostgresManager
+from src import forms
+from src.dependencies import get_postgres_manager
+
+"""Create form statistics router"""
+router = APIRouter()
+
+@router.get("/forms/stats", response_model=FormStats, tags=["forms"])
+def get_stats(
+    request: Request,
+    stats_params: Annotated[StatsParams, Query()],
+    pg_manager: PostgresManager = Depends(get_postgres_manager),
+    ):
+    """Get daily cancellation and feedback counts"""
+    return forms.get_form_stats(pg_manager, request, stats_params)
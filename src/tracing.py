@@ -0,0 +1,348 @@
+"""
+Request tracing with per-phase spans and a slow-query log.
+
+Every request gets a request ID (taken from X-Request-ID or generated) that is
+echoed in the response. If an exporter is configured, sampled requests record
+spans (acquire connection, execute, fetch, build rows, serialize, ...) that are
+written to a JSON lines file or sent to an OpenTelemetry collector over OTLP/HTTP.
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import uuid4
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from src.config import get_env_float, get_env_str
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("forms.slow_query")
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.request_id = request_id
+        self.trace_id = uuid4().hex
+        self.sampled = sampled
+        self.spans: List[Dict[str, Any]] = []
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("forms_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("forms_span_id", default=None)
+
+
+class _Span:
+    """Context manager timing one phase of a sampled request"""
+
+
+    __slots__ = ("trace", "name", "attributes", "span_id", "parent_id", "start_ns", "_token")
+
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = _current_span_id.get()
+
+
+    def __enter__(self) -> "_Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span_id.set(self.span_id)
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end_ns = time.time_ns()
+        _current_span_id.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.trace.spans.append({
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+        })
+
+
+class _NoSpan:
+    """Stand-in used when the current request is not traced"""
+
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes: Any):
+    """Time a phase of the current request; does nothing unless the request is sampled"""
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return _NO_SPAN
+    return _Span(trace, name, attributes)
+
+
+def record_span(name: str, duration: float, **attributes: Any) -> None:
+    """Record a phase that just ended after duration seconds, for code that cannot wrap it in span()"""
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return
+    end_ns = time.time_ns()
+    trace.spans.append({
+        "name": name,
+        "span_id": uuid4().hex[:16],
+        "parent_span_id": _current_span_id.get(),
+        "start_ns": end_ns - int(duration * 1e9),
+        "end_ns": end_ns,
+        "duration_ms": round(duration * 1000, 3),
+        "attributes": attributes,
+    })
+
+
+def current_request_id() -> Optional[str]:
+    """Return the ID of the request being handled, if any"""
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def param_shapes(params: Optional[Sequence[Any]]) -> List[str]:
+    """Describe query parameters by type and size only, so no customer data ends up in logs"""
+    shapes = []
+    for value in params or ():
+        if value is None:
+            shapes.append("null")
+        elif isinstance(value, (str, bytes, list, tuple)):
+            shapes.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            shapes.append(type(value).__name__)
+    return shapes
+
+
+class SlowQueryLog:
+    """Logs statements slower than a threshold, with an optional sampled query plan"""
+
+
+    def __init__(self):
+        """Initialize the log with environment variables"""
+        self.threshold = get_env_float("SLOW_QUERY_THRESHOLD_MS", 500.0) / 1000
+        self.explain_sample_rate = get_env_float("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.0)
+
+
+    def is_slow(self, duration: float) -> bool:
+        """Whether a statement took long enough to be logged"""
+        return self.threshold > 0 and duration >= self.threshold
+
+
+    def should_explain(self, sql: str) -> bool:
+        """Whether to capture the plan of a slow statement; only read-only SELECTs are re-run"""
+        return (
+            self.explain_sample_rate > 0
+            and sql.lstrip()[:6].upper() == "SELECT"
+            # Sampling only, no security decision depends on it
+            and random.random() < self.explain_sample_rate  # nosec B311
+        )
+
+
+    def record(self, sql: str, params: Optional[Sequence[Any]], duration: float, rows: Optional[int], plan: Optional[str] = None) -> None:
+        """Write one slow statement to the slow query log"""
+        entry = {
+            "request_id": current_request_id(),
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "sql": " ".join(sql.split()),
+            "params": param_shapes(params),
+        }
+        if plan is not None:
+            entry["plan"] = plan
+        slow_query_logger.warning(json.dumps(entry))
+
+
+class _QueuedExporter:
+    """Base class for exporters that hand traces to a background thread, keeping I/O off the event loop"""
+
+
+    def __init__(self, name: str, max_queue_size: int = 1000):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+
+    def export(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning("Trace export queue is full, dropping trace")
+
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            try:
+                self._send(trace)
+            except Exception as err:
+                logger.warning(f"Exporting trace failed: {err}")
+
+
+    def _send(self, trace: Trace) -> None:
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class JsonFileExporter(_QueuedExporter):
+    """Appends one JSON object per trace to a file from a background thread"""
+
+
+    def __init__(self, path: str, max_queue_size: int = 1000):
+        self.path = path
+        self._file = None
+        super().__init__("trace-file-exporter", max_queue_size)
+
+
+    def _send(self, trace: Trace) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({"request_id": trace.request_id, "trace_id": trace.trace_id, "spans": trace.spans}, default=str) + "\n")
+        # Flush once the queue is drained, so bursts are written in one go
+        if self._queue.empty():
+            self._file.flush()
+
+
+    def close(self) -> None:
+        super().close()
+        if not self._thread.is_alive() and self._file is not None:
+            self._file.close()
+
+
+class OtlpHttpExporter(_QueuedExporter):
+    """Sends traces to an OpenTelemetry collector as OTLP/HTTP JSON from a background thread"""
+
+
+    def __init__(self, endpoint: str, max_queue_size: int = 1000):
+        self.endpoint = endpoint
+        super().__init__("trace-exporter", max_queue_size)
+
+
+    @staticmethod
+    def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
+
+
+    def _payload(self, trace: Trace) -> bytes:
+        spans = []
+        for span_data in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": span_data["span_id"],
+                "parentSpanId": span_data["parent_span_id"] or "",
+                "name": span_data["name"],
+                "kind": 2 if span_data["parent_span_id"] is None else 1,
+                "startTimeUnixNano": str(span_data["start_ns"]),
+                "endTimeUnixNano": str(span_data["end_ns"]),
+                "attributes": self._attributes({**span_data["attributes"], "request_id": trace.request_id}),
+            })
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": "forms-service"})},
+            "scopeSpans": [{"scope": {"name": "forms-service"}, "spans": spans}],
+        }]}).encode()
+
+
+    def _send(self, trace: Trace) -> None:
+        request = urllib.request.Request(self.endpoint, data=self._payload(trace), headers={"Content-Type": "application/json"})
+        try:
+            # create_exporter only accepts http and https endpoints
+            urllib.request.urlopen(request, timeout=5).close()  # nosec B310
+        except OSError as err:
+            logger.warning(f"Exporting trace to {self.endpoint} failed: {err}")
+
+
+def create_exporter():
+    """Create the span exporter configured by TRACING_EXPORTER, or None if tracing is off"""
+    exporter = get_env_str("TRACING_EXPORTER", "none").lower()
+    if exporter == "file":
+        return JsonFileExporter(get_env_str("TRACING_FILE", "traces.jsonl"))
+    if exporter == "otlp":
+        endpoint = get_env_str("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        if urllib.parse.urlsplit(endpoint).scheme not in ("http", "https"):
+            raise ValueError(f"Invalid TRACING_OTLP_ENDPOINT '{endpoint}', expected an http or https URL")
+        return OtlpHttpExporter(endpoint)
+    if exporter != "none":
+        raise ValueError(f"Invalid TRACING_EXPORTER '{exporter}', expected 'none', 'file' or 'otlp'")
+    return None
+
+
+class TracingMiddleware:
+    """ASGI middleware assigning request IDs and recording a root span for sampled requests"""
+
+
+    def __init__(self, app):
+        self.app = app
+        self.exporter = create_exporter()
+        self.sample_rate = get_env_float("TRACING_SAMPLE_RATE", 0.1) if self.exporter is not None else 0.0
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" and self.exporter is not None:
+            await self.app(scope, receive, self._close_on_shutdown(send))
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        # Sampling only, no security decision depends on it
+        trace = Trace(request_id or uuid4().hex, sampled=random.random() < self.sample_rate)  # nosec B311
+        trace_token = _current_trace.set(trace)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", trace.request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            with span("http.request", method=scope["method"], path=scope["path"]) as root:
+                await self.app(scope, receive, send_with_request_id)
+                if isinstance(root, _Span):
+                    root.attributes["route"] = getattr(scope.get("route"), "path", "unmatched")
+        finally:
+            _current_trace.reset(trace_token)
+            if trace.sampled and trace.spans:
+                try:
+                    self.exporter.export(trace)
+                except OSError as err:
+                    logger.warning(f"Exporting trace failed: {err}")
+
+
+    def _close_on_shutdown(self, send):
+        """Wrap the lifespan send, writing out the queued traces once the app has shut down"""
+        async def send_after_close(message):
+            if message["type"] in ("lifespan.shutdown.complete", "lifespan.shutdown.failed"):
+                self.exporter.close()
+            await send(message)
+        return send_after_close
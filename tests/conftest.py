@@ -0,0 +1,88 @@
+"""
+Shared fixtures. Tests that need Postgres use scratch databases on the server configured with the
+POSTGRES_* variables, like the service itself, and are skipped when that server is unreachable.
+"""
+from uuid import uuid4
+import importlib
+import os
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from src.managers.postgres_manager import StandalonePostgresSettings
+
+TEST_DATABASE_PREFIX = os.environ.get("TEST_POSTGRES_DB_PREFIX", "forms_test")
+ADMIN = {"x-admin": "true"}
+
+
+def execute_on_server(settings: StandalonePostgresSettings, sql: str) -> None:
+    """Run a statement like CREATE DATABASE outside of a transaction"""
+    connection = settings.create_connection(without_db=True)
+    connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+    finally:
+        connection.close()
+
+
+def database_settings(name: str) -> StandalonePostgresSettings:
+    """Settings pointing at one database of the configured server"""
+    settings = StandalonePostgresSettings()
+    settings.db_name = name
+    return settings
+
+
+@pytest.fixture(scope="session")
+def postgres_server() -> StandalonePostgresSettings:
+    """Settings of the configured server; skips the test if it cannot be reached"""
+    settings = StandalonePostgresSettings()
+    try:
+        settings.create_connection(without_db=True).close()
+    except psycopg2.OperationalError as err:
+        pytest.skip(f"Postgres is not reachable: {str(err).strip()}")
+    return settings
+
+
+@pytest.fixture
+def scratch_database(postgres_server):
+    """Name of an empty database, dropped after the test"""
+    name = f"{TEST_DATABASE_PREFIX}_{uuid4().hex[:8]}"
+    execute_on_server(postgres_server, f'CREATE DATABASE "{name}"')
+    yield name
+    execute_on_server(postgres_server, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+@pytest.fixture(scope="session")
+def migrated_database(postgres_server) -> StandalonePostgresSettings:
+    """Settings of a migrated database shared by the session's tests, dropped afterwards"""
+    name = f"{TEST_DATABASE_PREFIX}_{uuid4().hex[:8]}"
+    settings = database_settings(name)
+    settings.prepare_database()
+    yield settings
+    execute_on_server(postgres_server, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+@pytest.fixture
+def connection(migrated_database):
+    """Autocommit connection to the shared migrated database"""
+    connection = migrated_database.create_connection()
+    connection.autocommit = True
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(params=["sync", "async"])
+def client(request, migrated_database, monkeypatch):
+    """The service in either database mode against the shared migrated database, sending admin requests"""
+    monkeypatch.setenv("DB_MODE", request.param)
+    monkeypatch.setenv("POSTGRES_DB_NAME", migrated_database.db_name)
+    # Moving forms to the archive tier changes the lists, and with them the ETags, while a test runs
+    monkeypatch.setenv("PARTITION_MAINTENANCE_INTERVAL", "0")
+    # The routers of the database mode are picked when main is imported
+    import main
+    importlib.reload(main)
+    with TestClient(main.app, headers=ADMIN) as client:
+        yield client
@@ -0,0 +1,79 @@
+import pytest
+
+from src.admission import AdmissionMiddleware, TokenBuckets
+
+
+def test_new_client_starts_with_a_full_bucket():
+    buckets = TokenBuckets(rate=1.0, burst=3, max_clients=10)
+    assert [buckets.take("a", 0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a", 0.0) == pytest.approx(1.0)
+
+
+def test_tokens_refill_at_the_rate():
+    buckets = TokenBuckets(rate=2.0, burst=2, max_clients=10)
+    buckets.take("a", 0.0)
+    buckets.take("a", 0.0)
+    # Half a token came back after 0.25s, so the next one is 0.25s away
+    assert buckets.take("a", 0.25) == pytest.approx(0.25)
+    assert buckets.take("a", 0.5) == 0.0
+    assert buckets.take("a", 0.5) == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_the_burst():
+    buckets = TokenBuckets(rate=10.0, burst=2, max_clients=10)
+    buckets.take("a", 0.0)
+    assert [buckets.take("a", 100.0) for _ in range(2)] == [0.0, 0.0]
+    assert buckets.take("a", 100.0) > 0
+
+
+def test_clients_have_separate_buckets():
+    buckets = TokenBuckets(rate=1.0, burst=1, max_clients=10)
+    assert buckets.take("a", 0.0) == 0.0
+    assert buckets.take("a", 0.0) > 0
+    assert buckets.take("b", 0.0) == 0.0
+
+
+def test_least_recently_seen_client_is_dropped():
+    buckets = TokenBuckets(rate=1.0, burst=1, max_clients=2)
+    buckets.take("a", 0.0)
+    buckets.take("b", 0.0)
+    buckets.take("a", 0.0)
+    buckets.take("c", 0.0)
+    # "b" was forgotten and starts over with a full bucket, "a" was not
+    assert buckets.take("b", 0.0) == 0.0
+    assert buckets.take("c", 0.0) > 0
+
+
+def scope(*forwarded: str, client: str = "10.0.0.1") -> dict:
+    return {
+        "headers": [(b"x-forwarded-for", value.encode()) for value in forwarded],
+        "client": (client, 1234),
+    }
+
+
+@pytest.fixture
+def middleware(monkeypatch):
+    def create(trusted_proxies: int, rate: float = 1.0):
+        monkeypatch.setenv("RATE_LIMIT_PER_SECOND", str(rate))
+        monkeypatch.setenv("RATE_LIMIT_BURST", "1")
+        monkeypatch.setenv("RATE_LIMIT_KEY_HEADER", "X-Forwarded-For")
+        monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", str(trusted_proxies))
+        return AdmissionMiddleware(app=None)
+    return create
+
+
+def test_client_key_takes_the_entry_of_the_outermost_trusted_proxy(middleware):
+    assert middleware(1).client_key(scope("1.1.1.1, 2.2.2.2, 3.3.3.3")) == "3.3.3.3"
+    assert middleware(2).client_key(scope("1.1.1.1, 2.2.2.2", "3.3.3.3")) == "2.2.2.2"
+
+
+def test_client_key_falls_back_to_the_peer_without_enough_entries(middleware):
+    assert middleware(2).client_key(scope("3.3.3.3")) == "10.0.0.1"
+    assert middleware(1).client_key(scope()) == "10.0.0.1"
+
+
+def test_spoofed_entries_share_the_proxys_bucket(middleware):
+    admission = middleware(1)
+    assert admission.rejection(scope("6.6.6.6, 3.3.3.3")) is None
+    status_code, reason, retry_after = admission.rejection(scope("7.7.7.7, 3.3.3.3"))
+    assert (status_code, reason, retry_after) == (429, "rate_limited", 1)
@@ -0,0 +1,23 @@
+from uuid import uuid4
+
+
+def test_batch_inserts_every_valid_item(client, connection):
+    tag = f"batch test {uuid4()}"
+    items = [{"email": "a@b.de", "text": tag} for _ in range(3)] + [{"email": "a@b.de"}]
+    response = client.post("/forms/feedback/batch", json=items)
+    assert response.status_code == 201, response.text
+    assert [error["index"] for error in response.json()["errors"]] == [3]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM feedback WHERE text = %s", (tag,))
+        assert cursor.fetchone()[0] == 3
+
+
+def test_batch_of_cancellations(client, connection):
+    tag = f"batch test {uuid4()}"
+    item = {"email": "a@b.de", "name": "A", "last_name": "B", "address": "S 1", "town": "T", "town_number": "12345",
+            "is_unordinary": False, "reason": tag, "last_invoice_number": "1", "termination_date": "2026-12-31"}
+    response = client.post("/forms/cancellation/batch", json=[item, item])
+    assert response.status_code == 201, response.text
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM cancellation WHERE reason = %s", (tag,))
+        assert cursor.fetchone()[0] == 2
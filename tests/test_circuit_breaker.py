@@ -0,0 +1,97 @@
+import pytest
+
+from src import circuit_breaker
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+FAILURE = OSError("connection refused")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock of the circuit breaker"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.threshold):
+        breaker.before_call()
+        breaker.record_failure(FAILURE)
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, reset_timeout=5.0)
+    for _ in range(2):
+        breaker.record_failure(FAILURE)
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    breaker.record_failure(FAILURE)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=3, reset_timeout=5.0)
+    breaker.record_failure(FAILURE)
+    breaker.record_failure(FAILURE)
+    breaker.record_success()
+    breaker.record_failure(FAILURE)
+    breaker.record_failure(FAILURE)
+    assert breaker.is_closed()
+
+
+def test_lets_one_probe_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=5.0)
+    open_breaker(breaker)
+    clock[0] += 4.9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock[0] += 0.2
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Calls arriving while the probe runs are still turned away
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=5.0)
+    open_breaker(breaker)
+    clock[0] += 5.0
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_for_another_period(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=5.0)
+    open_breaker(breaker)
+    clock[0] += 5.0
+    breaker.before_call()
+    breaker.record_failure(FAILURE)
+    assert breaker.state == OPEN
+    clock[0] += 4.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock[0] += 1.0
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_threshold_zero_disables_the_breaker(clock):
+    breaker = CircuitBreaker(threshold=0, reset_timeout=5.0)
+    for _ in range(100):
+        breaker.record_failure(FAILURE)
+        breaker.before_call()
+    assert breaker.is_closed()
+
+
+def test_create_circuit_breaker_reads_the_environment(monkeypatch):
+    monkeypatch.setenv("POSTGRES_CIRCUIT_BREAKER_THRESHOLD", "7")
+    monkeypatch.setenv("POSTGRES_CIRCUIT_BREAKER_RESET_TIMEOUT", "2.5")
+    breaker = circuit_breaker.create_circuit_breaker()
+    assert (breaker.threshold, breaker.reset_timeout) == (7, 2.5)
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from src import forms
+
+
+def test_cursor_round_trip():
+    created_at, form_id = datetime(2026, 3, 1, 12, 30, 15, 123456), uuid4()
+    cursor = forms.encode_cursor(created_at, form_id)
+    assert "=" not in cursor
+    assert forms.decode_cursor(cursor) == (created_at, form_id)
+
+
+def test_search_cursor_round_trip():
+    created_at, form_id = datetime(2026, 3, 1, tzinfo=timezone.utc), uuid4()
+    cursor = forms.encode_search_cursor(0.25, created_at, form_id)
+    assert forms.decode_search_cursor(cursor) == (0.25, created_at, form_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "W10", forms.encode_search_cursor(0.5, datetime(2026, 1, 1), uuid4())])
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as raised:
+        forms.decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+def test_next_page_cursor_trims_the_look_ahead_row():
+    ids = [uuid4() for _ in range(3)]
+    rows = [(form_id, datetime(2026, 1, day)) for day, form_id in enumerate(ids, start=1)]
+    cursor = forms.next_page_cursor(["id", "created_at"], rows, limit=2)
+    assert rows == [(ids[0], datetime(2026, 1, 1)), (ids[1], datetime(2026, 1, 2))]
+    assert forms.decode_cursor(cursor) == (datetime(2026, 1, 2), ids[1])
+
+
+def test_last_page_has_no_cursor():
+    rows = [(uuid4(), datetime(2026, 1, 1))]
+    assert forms.next_page_cursor(["id", "created_at"], rows, limit=1) is None
+    assert len(rows) == 1
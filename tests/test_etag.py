@@ -0,0 +1,59 @@
+from uuid import uuid4
+
+import pytest
+from starlette.requests import Request
+
+from src import forms
+from src.models import FeedbackListParams
+
+
+def request_with(if_none_match: str) -> Request:
+    return Request({"type": "http", "headers": [(b"if-none-match", if_none_match.encode())]})
+
+
+def test_etag_depends_on_version_and_parameters():
+    first = forms.list_etag(1, FeedbackListParams())
+    assert first.startswith('W/"1-')
+    assert forms.list_etag(2, FeedbackListParams()) != first
+    assert forms.list_etag(1, FeedbackListParams(limit=5)) != first
+    assert forms.list_etag(None, FeedbackListParams()) is None
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('W/"1-abc"', True),
+    ('"1-abc"', True),
+    ('W/"0-abc", W/"1-abc"', True),
+    ("*", True),
+    ('W/"2-abc"', False),
+    ("", False),
+])
+def test_if_none_match_uses_weak_comparison(header, matches):
+    assert forms.etag_matches(request_with(header), 'W/"1-abc"') is matches
+
+
+def test_no_etag_never_matches():
+    assert not forms.etag_matches(request_with("*"), None)
+
+
+def test_unchanged_list_is_answered_with_304(client):
+    response = client.get("/forms/feedback", params={"limit": 5})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    repeated = client.get("/forms/feedback", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert repeated.status_code == 304
+    assert repeated.headers["etag"] == etag
+    assert repeated.content == b""
+
+    other_page = client.get("/forms/feedback", params={"limit": 6}, headers={"If-None-Match": etag})
+    assert other_page.status_code == 200
+
+
+def test_write_changes_the_etag(client):
+    etag = client.get("/forms/feedback").headers["etag"]
+    created = client.post("/forms/feedback", json={"email": "a@b.de", "text": f"etag test {uuid4()}"})
+    assert created.status_code == 201
+    response = client.get("/forms/feedback", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
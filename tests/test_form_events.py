@@ -0,0 +1,28 @@
+from uuid import uuid4
+
+import orjson
+
+
+def received_events(connection) -> list:
+    connection.poll()
+    events = [event for notify in connection.notifies for event in orjson.loads(notify.payload)]
+    connection.notifies.clear()
+    return events
+
+
+def test_archiving_reports_only_forms_that_were_not_archived_yet(connection):
+    # Forms are unique on (id, created_at), so two of them can share an ID
+    form_id = str(uuid4())
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT create_form_partitions('feedback', '2020-03-01', '2020-03-01')")
+        cursor.execute(
+            "INSERT INTO feedback (id, email, text, created_at, is_archived) VALUES (%s, 'a@b.de', 'events test', '2020-03-15', false), (%s, 'a@b.de', 'events test', '2020-03-16', true)",
+            (form_id, form_id)
+        )
+        cursor.execute("LISTEN form_events")
+        try:
+            cursor.execute("UPDATE feedback SET is_archived = true WHERE id = %s", (form_id,))
+            events = received_events(connection)
+        finally:
+            cursor.execute("UNLISTEN form_events")
+    assert [(event["event"], event["created_at"][:10]) for event in events if event["id"] == form_id] == [("archived", "2020-03-15")]
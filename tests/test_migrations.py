@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import psycopg
+import pytest
+
+from src.managers import migration_manager
+from tests.conftest import database_settings
+
+
+@pytest.fixture
+def migration_files(tmp_path, monkeypatch):
+    """Point the migration manager at an empty directory for the test"""
+    monkeypatch.setattr(migration_manager, "MIGRATIONS_DIR", tmp_path)
+    migration_manager.load_migrations.cache_clear()
+    yield tmp_path
+    migration_manager.load_migrations.cache_clear()
+
+
+def applied_versions(settings) -> list:
+    connection = settings.create_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT version FROM schema_version ORDER BY applied_at, version")
+            return [version for version, in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def test_shipped_migrations_are_numbered_without_gaps():
+    versions = [migration.version for migration in migration_manager.load_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
+    assert migration_manager.latest_version() == versions[-1]
+
+
+def test_migrations_are_ordered_by_number_not_name(migration_files):
+    for name in ("0010_last.sql", "0002_second.sql", "0001_first.sql", "README.md"):
+        (migration_files / name).write_text("SELECT 1;")
+    assert [migration.name for migration in migration_manager.load_migrations()] == ["first", "second", "last"]
+
+
+def test_duplicate_versions_are_refused(migration_files):
+    (migration_files / "0001_one.sql").write_text("SELECT 1;")
+    (migration_files / "0001_other.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError):
+        migration_manager.load_migrations()
+
+
+def test_migrate_applies_every_migration_once_in_order(scratch_database):
+    settings = database_settings(scratch_database)
+    latest = migration_manager.latest_version()
+    assert settings.prepare_database() == latest
+    assert settings.prepare_database() == latest
+    assert applied_versions(settings) == list(range(1, latest + 1))
+
+
+def test_concurrent_migrations_apply_each_migration_once(scratch_database):
+    settings = database_settings(scratch_database)
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(settings.prepare_database())
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+    assert errors == []
+    assert results == [migration_manager.latest_version()] * 4
+    assert applied_versions(settings) == list(range(1, migration_manager.latest_version() + 1))
+
+
+def test_migrate_waits_for_the_migration_lock(scratch_database):
+    settings = database_settings(scratch_database)
+    holder = settings.create_connection()
+    holder.autocommit = True
+    with holder.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (migration_manager.MIGRATION_LOCK_ID,))
+    results = []
+    thread = threading.Thread(target=lambda: results.append(settings.prepare_database()))
+    thread.start()
+    try:
+        thread.join(timeout=1)
+        assert thread.is_alive()
+        with holder.cursor() as cursor:
+            cursor.execute(migration_manager.SCHEMA_VERSION_EXISTS_SQL)
+            assert cursor.fetchone() == (False,)
+    finally:
+        with holder.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (migration_manager.MIGRATION_LOCK_ID,))
+        holder.close()
+    thread.join(timeout=120)
+    assert results == [migration_manager.latest_version()]
+
+
+def test_current_schema_does_not_wait_for_the_lock(migrated_database):
+    holder = migrated_database.create_connection()
+    holder.autocommit = True
+    try:
+        with holder.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (migration_manager.MIGRATION_LOCK_ID,))
+        connection = migrated_database.create_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET lock_timeout = '2s'")
+            assert migration_manager.migrate(connection) == migration_manager.latest_version()
+        finally:
+            connection.close()
+    finally:
+        holder.close()
+
+
+def test_async_migrate_matches_the_sync_one(scratch_database):
+    settings = database_settings(scratch_database)
+
+    async def run():
+        connection = await psycopg.AsyncConnection.connect(
+            host=settings.host, port=settings.port, user=settings.user, password=settings.password,
+            dbname=settings.db_name, autocommit=True
+        )
+        async with connection:
+            return await migration_manager.amigrate(connection), await migration_manager.amigrate(connection)
+
+    latest = migration_manager.latest_version()
+    assert asyncio.run(run()) == (latest, latest)
+    assert applied_versions(settings) == list(range(1, latest + 1))
@@ -0,0 +1,73 @@
+from uuid import uuid4
+
+import pytest
+
+from src.managers.partition_maintenance import PartitionMaintenance
+
+
+@pytest.fixture
+def maintenance(migrated_database, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_COLD_AFTER_DAYS", "90")
+    monkeypatch.setenv("PARTITION_MONTHS_AHEAD", "2")
+    return PartitionMaintenance(migrated_database)
+
+
+def exists(connection, relation: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (relation,))
+        return cursor.fetchone()[0]
+
+
+def test_partitions_are_created_for_the_coming_months(maintenance, connection):
+    maintenance.run_once()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_char(date_trunc('month', localtimestamp) + interval '2 months', 'YYYY_MM')")
+        last_month = cursor.fetchone()[0]
+    assert exists(connection, f"feedback_p{last_month}")
+    assert exists(connection, f"cancellation_p{last_month}")
+
+
+def test_old_archived_forms_move_to_the_archive_table(maintenance, connection):
+    tag = f"maintenance test {uuid4()}"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT create_form_partitions('feedback', '2020-03-01', '2020-03-01')")
+        cursor.execute(
+            "INSERT INTO feedback (email, text, created_at, is_archived) VALUES ('a@b.de', %s, '2020-03-15', true), ('a@b.de', %s, '2020-03-16', false)",
+            (tag, tag)
+        )
+    assert maintenance.run_once()["feedback"] >= 1
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT is_archived FROM feedback WHERE text = %s", (tag,))
+        assert cursor.fetchall() == [(False,)]
+        cursor.execute("SELECT created_at::date::text FROM feedback_archive WHERE text = %s", (tag,))
+        assert cursor.fetchall() == [("2020-03-15",)]
+    # The partition still holds the unarchived form
+    assert exists(connection, "feedback_p2020_03")
+
+
+def test_empty_partitions_of_old_months_are_dropped(maintenance, connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT create_form_partitions('cancellation', '2020-01-01', '2020-02-01')")
+    assert exists(connection, "cancellation_p2020_01")
+    maintenance.run_once()
+    assert not exists(connection, "cancellation_p2020_01")
+    assert not exists(connection, "cancellation_p2020_02")
+
+
+def test_archive_cutoff_follows_the_database_clock(maintenance, connection, monkeypatch):
+    # A zone far from the host's, so a cutoff taken from the host clock would be half a day off
+    monkeypatch.setenv("PGTZ", "Pacific/Kiritimati")
+    tag = f"maintenance test {uuid4()}"
+    with connection.cursor() as cursor:
+        cursor.execute("SET TIME ZONE 'Pacific/Kiritimati'")
+        cursor.execute("SELECT (localtimestamp - interval '90 days 2 hours')::date")
+        created = cursor.fetchone()[0]
+        cursor.execute("SELECT create_form_partitions('feedback', %s, %s)", (created, created))
+        cursor.execute(
+            "INSERT INTO feedback (email, text, created_at, is_archived) VALUES ('a@b.de', %s, localtimestamp - interval '90 days 2 hours', true)",
+            (tag,)
+        )
+        maintenance.run_once()
+        cursor.execute("SELECT count(*) FROM feedback_archive WHERE text = %s", (tag,))
+        assert cursor.fetchone()[0] == 1
+        cursor.execute("RESET TIME ZONE")
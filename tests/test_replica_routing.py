@@ -0,0 +1,197 @@
+import asyncio
+from typing import Callable, List, Optional
+
+import psycopg2
+import pytest
+
+from src import consistency
+from src.consistency import PRIMARY, ReadConsistencyMiddleware
+from src.managers.postgres_manager import PostgresSettings
+from src.managers.replica_monitor import ReplicaMonitor
+
+
+class Router(PostgresSettings):
+    """The read routing of the database managers, without their pools"""
+
+
+    def __init__(self, monitor: ReplicaMonitor):
+        self.replica_monitor = monitor
+        self.last_write_lsn = 0
+
+
+def monitor(count: int, lsn: int = 100) -> ReplicaMonitor:
+    """A monitor whose replicas all passed their last check at the given WAL position"""
+    replicas = ReplicaMonitor(settings=None, hosts=[(f"replica{index}", 5432) for index in range(count)])
+    replicas.healthy = [True] * count
+    replicas.replay_lsn = [lsn] * count
+    return replicas
+
+
+def in_request(handler: Callable[[], None], read_after: Optional[str] = None) -> List[tuple]:
+    """Run handler inside a request passing through ReadConsistencyMiddleware; returns the response headers"""
+    sent = []
+
+    async def app(scope, receive, send):
+        handler()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent.extend(message["headers"])
+
+    headers = [(b"x-read-after", read_after.encode())] if read_after else []
+    asyncio.run(ReadConsistencyMiddleware(app)({"type": "http", "headers": headers}, None, send))
+    return sent
+
+
+def test_pick_prefers_the_least_loaded_replica():
+    replicas = monitor(3)
+    assert replicas.pick([2, 0, 1]) == 1
+    assert replicas.pick([0, 3, 3]) == 0
+
+
+def test_pick_rotates_between_equally_loaded_replicas():
+    replicas = monitor(3)
+    assert [replicas.pick([0, 0, 0]) for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_pick_skips_unhealthy_and_lagging_replicas():
+    replicas = monitor(3)
+    replicas.healthy[0] = False
+    replicas.replay_lsn[1] = 50
+    assert replicas.pick([0, 0, 0], min_lsn=80) == 2
+    replicas.healthy[2] = False
+    assert replicas.pick([0, 0, 0], min_lsn=80) is None
+
+
+def test_writes_always_go_to_the_primary():
+    router = Router(monitor(2))
+    assert router.choose_replica(False, lambda: [0, 0]) == PRIMARY
+
+
+def test_reads_of_a_request_stick_to_one_replica():
+    router = Router(monitor(2))
+    chosen = []
+    in_request(lambda: chosen.extend(router.choose_replica(True, lambda: loads) for loads in ([0, 5], [5, 0], [9, 0])))
+    assert chosen == [0, 0, 0]
+
+
+def test_reads_after_a_write_wait_for_a_replica_that_replayed_it():
+    replicas = monitor(2, lsn=100)
+    router = Router(replicas)
+    chosen = []
+
+    def handler():
+        chosen.append(router.choose_replica(True, lambda: [0, 0]))
+        router.record_write_position("0/C8")
+        chosen.append(router.choose_replica(True, lambda: [0, 0]))
+
+    headers = in_request(handler)
+    assert chosen == [0, PRIMARY]
+    # The response tells the client how far replicas must be for its next request
+    assert headers == [(b"x-read-after", b"0/C8")]
+    replicas.replay_lsn[1] = 200
+    in_request(lambda: chosen.append(router.choose_replica(True, lambda: [0, 0])), read_after="0/C8")
+    assert chosen[-1] == 1
+
+
+def test_read_after_header_routes_around_lagging_replicas():
+    replicas = monitor(2, lsn=100)
+    replicas.replay_lsn[1] = 300
+    router = Router(replicas)
+    chosen = []
+    in_request(lambda: chosen.append(router.choose_replica(True, lambda: [0, 5])), read_after="0/12C")
+    assert chosen == [1]
+    in_request(lambda: chosen.append(router.choose_replica(True, lambda: [0, 5])), read_after="1/0")
+    assert chosen == [1, PRIMARY]
+
+
+def test_invalid_read_after_header_is_ignored():
+    router = Router(monitor(1))
+    chosen = []
+    in_request(lambda: chosen.append(router.choose_replica(True, lambda: [0])), read_after="garbage")
+    assert chosen == [0]
+
+
+def test_failed_replica_is_ejected_and_the_request_moves_to_the_primary():
+    replicas = monitor(2)
+    router = Router(replicas)
+    chosen = []
+
+    def handler():
+        chosen.append(router.choose_replica(True, lambda: [0, 0]))
+        router.connection_failed(0, psycopg2.OperationalError("connection refused"))
+        chosen.append(router.choose_replica(True, lambda: [0, 0]))
+
+    in_request(handler)
+    assert chosen == [0, PRIMARY]
+    assert replicas.healthy == [False, True]
+    # Other requests keep using the replica left
+    in_request(lambda: chosen.append(router.choose_replica(True, lambda: [0, 0])))
+    assert chosen[-1] == 1
+
+
+class ProbeConnection:
+    """Connection answering the replica monitor's probe with fixed values"""
+
+
+    def __init__(self, in_recovery: bool, replay_lsn: Optional[str]):
+        self.row = (in_recovery, replay_lsn)
+        self.closed = False
+
+
+    def cursor(self):
+        return self
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        return False
+
+
+    def execute(self, sql):
+        pass
+
+
+    def fetchone(self):
+        return self.row
+
+
+    def close(self):
+        self.closed = True
+
+
+def test_check_marks_replicas_by_their_probe(monkeypatch):
+    replicas = ReplicaMonitor(settings=None, hosts=[("a", 5432), ("b", 5432), ("c", 5432)])
+    probes = {0: ProbeConnection(True, "0/10"), 1: ProbeConnection(False, None)}
+
+    def connect(index):
+        if index not in probes:
+            raise psycopg2.OperationalError("connection refused")
+        return probes[index]
+
+    monkeypatch.setattr(replicas, "_connect", connect)
+    replicas.healthy = [False, True, True]
+    replicas.check()
+    # Replicas that were promoted or are unreachable are left out
+    assert replicas.healthy == [True, False, False]
+    assert replicas.replay_lsn[0] == 16
+
+
+def test_ejected_replica_comes_back_after_a_good_check(monkeypatch):
+    replicas = ReplicaMonitor(settings=None, hosts=[("a", 5432)])
+    monkeypatch.setattr(replicas, "_connect", lambda index: ProbeConnection(True, "0/20"))
+    replicas.check()
+    replicas.mark_failed(0, "connection reset")
+    assert replicas.pick([0]) is None
+    replicas.check()
+    assert replicas.pick([0]) == 0
+
+
+@pytest.mark.parametrize("text, value", [("0/0", 0), ("16/B374D848", (0x16 << 32) + 0xB374D848)])
+def test_lsn_round_trip(text, value):
+    assert consistency.parse_lsn(text) == value
+    assert consistency.format_lsn(value) == text
@@ -0,0 +1,49 @@
+from uuid import uuid4
+
+import pytest
+
+from src.managers.retention_job import RetentionJob
+
+
+@pytest.fixture
+def job(migrated_database, monkeypatch):
+    monkeypatch.setenv("RETENTION_FEEDBACK_DAYS", "30")
+    monkeypatch.setenv("RETENTION_CANCELLATION_DAYS", "0")
+    return RetentionJob(migrated_database)
+
+
+def insert_feedback(cursor, tag: str, age: str, is_archived: bool = True) -> None:
+    cursor.execute(
+        "INSERT INTO feedback (email, text, created_at, is_archived) VALUES ('a@b.de', %s, localtimestamp - %s::interval, %s)",
+        (tag, age, is_archived)
+    )
+
+
+def remaining(cursor, tag: str) -> int:
+    cursor.execute("SELECT count(*) FROM feedback WHERE text = %s", (tag,))
+    return cursor.fetchone()[0]
+
+
+def test_only_expired_archived_forms_are_purged(job, connection):
+    expired, recent, unarchived = (f"retention test {uuid4()}" for _ in range(3))
+    with connection.cursor() as cursor:
+        insert_feedback(cursor, expired, "31 days")
+        insert_feedback(cursor, recent, "29 days")
+        insert_feedback(cursor, unarchived, "31 days", is_archived=False)
+        assert job.run_once()["feedback"] >= 1
+        assert "cancellation" not in job.run_once()
+        assert remaining(cursor, expired) == 0
+        assert remaining(cursor, recent) == 1
+        assert remaining(cursor, unarchived) == 1
+
+
+def test_cutoff_follows_the_database_clock(job, connection, monkeypatch):
+    # A zone far from the host's, so a cutoff taken from the host clock would be half a day off
+    monkeypatch.setenv("PGTZ", "Pacific/Kiritimati")
+    tag = f"retention test {uuid4()}"
+    with connection.cursor() as cursor:
+        cursor.execute("SET TIME ZONE 'Pacific/Kiritimati'")
+        insert_feedback(cursor, tag, "30 days 2 hours")
+        job.run_once()
+        assert remaining(cursor, tag) == 0
+        cursor.execute("RESET TIME ZONE")
@@ -0,0 +1,19 @@
+import gc
+
+from benchmarks.bench_serialization import COLUMNS, make_rows, pydantic_path
+from src import serialization
+
+
+def test_encode_page_matches_the_pydantic_encoding():
+    rows = make_rows(50)
+    assert serialization.encode_page(COLUMNS, rows, None) == pydantic_path(rows)
+
+
+def test_encode_page_carries_the_cursor():
+    assert serialization.encode_page(COLUMNS, [], "abc") == b'{"items":[],"next_cursor":"abc"}'
+
+
+def test_encode_page_leaves_the_garbage_collector_alone():
+    assert gc.isenabled()
+    serialization.encode_page(COLUMNS, make_rows(10), None)
+    assert gc.isenabled()
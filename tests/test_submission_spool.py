@@ -0,0 +1,158 @@
+from uuid import uuid4
+import fcntl
+import os
+import threading
+
+import orjson
+import pytest
+
+from src import forms
+from src.idempotency import StoredResponse
+from src.managers.submission_spool import REJECTED_FILE, SEGMENT_SUFFIX, SpoolFullError, SubmissionSpool
+
+FEEDBACK_COLUMNS = forms.INSERT_COLUMNS["feedback"]
+
+
+@pytest.fixture
+def spool(migrated_database, tmp_path, monkeypatch):
+    """A started spool whose replayer thread stays idle, so tests replay explicitly"""
+    monkeypatch.setenv("SUBMISSION_SPOOL_REPLAY_INTERVAL", "3600")
+    spool = SubmissionSpool(migrated_database, str(tmp_path))
+    spool.start()
+    yield spool
+    spool.close()
+
+
+@pytest.fixture
+def tag() -> str:
+    """Text marking the feedback of one test"""
+    return f"spool test {uuid4()}"
+
+
+def feedback_count(connection, text: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM feedback WHERE text = %s", (text,))
+        return cursor.fetchone()[0]
+
+
+def segments(spool: SubmissionSpool) -> list:
+    return sorted(name for name in os.listdir(spool.directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_spooled_submissions_are_replayed_once(spool, connection, tag):
+    for _ in range(3):
+        spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag)).result(timeout=10)
+    assert len(segments(spool)) == 1
+    assert spool.replay() == 3
+    assert spool.replay() == 0
+    assert feedback_count(connection, tag) == 3
+    assert segments(spool) == []
+    assert spool.pending_bytes == 0
+
+
+def test_replaying_a_segment_again_creates_no_duplicates(spool, connection, tag):
+    spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag)).result(timeout=10)
+    with open(os.path.join(spool.directory, segments(spool)[0]), "rb") as segment:
+        data = segment.read()
+    assert spool.replay() == 1
+    # As if the process crashed after inserting but before deleting the segment
+    with open(os.path.join(spool.directory, "00000000000000000001-1" + SEGMENT_SUFFIX), "wb") as leftover:
+        leftover.write(data)
+    assert spool.replay() == 0
+    assert feedback_count(connection, tag) == 1
+    assert segments(spool) == []
+
+
+def test_segment_held_by_a_running_process_is_left_alone(spool, tag):
+    path = os.path.join(spool.directory, "00000000000000000001-1" + SEGMENT_SUFFIX)
+    record = {"table": "feedback", "columns": ["id", "created_at", *FEEDBACK_COLUMNS], "row": [str(uuid4()), "2026-01-01T00:00:00+00:00", "a@b.de", tag]}
+    with open(path, "wb") as segment:
+        segment.write(orjson.dumps(record) + b"\n")
+        fcntl.flock(segment.fileno(), fcntl.LOCK_EX)
+        assert spool.replay() == 0
+        assert os.path.exists(path)
+    assert spool.replay() == 1
+    assert not os.path.exists(path)
+
+
+def test_refused_submissions_are_set_aside(spool, connection, tag):
+    spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag)).result(timeout=10)
+    spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag + "x" * 500)).result(timeout=10)
+    spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag)).result(timeout=10)
+    assert spool.replay() == 2
+    assert feedback_count(connection, tag) == 2
+    with open(os.path.join(spool.directory, REJECTED_FILE), "rb") as rejected:
+        lines = rejected.read().splitlines()
+    assert [orjson.loads(line)["row"][3] for line in lines] == [tag + "x" * 500]
+    assert segments(spool) == []
+
+
+def test_submissions_with_a_key_are_created_once(spool, connection, tag):
+    key = str(uuid4())
+    stored = StoredResponse(b"\x01" * 32, 201, b'{"detail":"Feedback created successfully"}')
+    for _ in range(2):
+        spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag), (key, stored)).result(timeout=10)
+    spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", tag)).result(timeout=10)
+    assert spool.replay() == 2
+    assert feedback_count(connection, tag) == 2
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT request_hash, status_code, response FROM idempotency_keys WHERE form_type = 'feedback' AND key = %s", (key,))
+        request_hash, status_code, response = cursor.fetchone()
+    assert StoredResponse(bytes(request_hash), status_code, bytes(response)) == stored
+
+
+def test_full_spool_refuses_submissions(migrated_database, tmp_path, monkeypatch):
+    monkeypatch.setenv("SUBMISSION_SPOOL_MAX_BYTES", "200")
+    spool = SubmissionSpool(migrated_database, str(tmp_path))
+    spool.start()
+    try:
+        spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", "short")).result(timeout=10)
+        with pytest.raises(SpoolFullError):
+            spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", "x" * 200))
+    finally:
+        spool.close()
+
+
+def test_submissions_racing_close_are_written_or_refused(migrated_database, tmp_path, monkeypatch):
+    monkeypatch.setenv("SUBMISSION_SPOOL_REPLAY_INTERVAL", "3600")
+    spool = SubmissionSpool(migrated_database, str(tmp_path))
+    spool.start()
+    futures = []
+
+    def submit():
+        while True:
+            try:
+                futures.append(spool.append("feedback", FEEDBACK_COLUMNS, ("a@b.de", "racing close")))
+            except RuntimeError:
+                return
+
+    submitters = [threading.Thread(target=submit, daemon=True) for _ in range(4)]
+    for submitter in submitters:
+        submitter.start()
+    spool.close()
+    for submitter in submitters:
+        submitter.join(timeout=10)
+    # Every queued submission was fsynced before the writer stopped, none is left waiting
+    for future in futures:
+        future.result(timeout=10)
+
+
+def test_keyed_and_plain_replays_store_the_same_creation_time(migrated_database, tmp_path, monkeypatch, connection, tag):
+    # Both replay paths convert the spooled UTC time to the session time zone, like CURRENT_TIMESTAMP does
+    monkeypatch.setenv("PGTZ", "Europe/Berlin")
+    monkeypatch.setenv("SUBMISSION_SPOOL_REPLAY_INTERVAL", "3600")
+    spool = SubmissionSpool(migrated_database, str(tmp_path))
+    spool.start()
+    try:
+        stored = StoredResponse(b"\x02" * 32, 201, b'{"detail":"Feedback created successfully"}')
+        spool.append("feedback", FEEDBACK_COLUMNS, ("plain@b.de", tag)).result(timeout=10)
+        spool.append("feedback", FEEDBACK_COLUMNS, ("keyed@b.de", tag), (str(uuid4()), stored)).result(timeout=10)
+        assert spool.replay() == 2
+    finally:
+        spool.close()
+    with connection.cursor() as cursor:
+        cursor.execute("SET TIME ZONE 'Europe/Berlin'")
+        cursor.execute("SELECT max(created_at) - min(created_at), bool_and(abs(extract(epoch FROM localtimestamp - created_at)) < 60) FROM feedback WHERE text = %s", (tag,))
+        spread, recent = cursor.fetchone()
+    assert spread.total_seconds() < 1
+    assert recent
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src import tracing
+
+
+@pytest.fixture
+def traced_app(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACING_EXPORTER", "file")
+    monkeypatch.setenv("TRACING_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setenv("TRACING_SAMPLE_RATE", "1")
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        with tracing.span("work"):
+            return {"ok": True}
+
+    app.add_middleware(tracing.TracingMiddleware)
+    return app
+
+
+def test_queued_traces_are_written_on_shutdown(traced_app, tmp_path):
+    with TestClient(traced_app) as client:
+        request_ids = [client.get("/ping").headers["x-request-id"] for _ in range(20)]
+        exporter = traced_app.middleware_stack.app.exporter
+    assert not exporter._thread.is_alive()
+    assert exporter._file.closed
+    with open(tmp_path / "traces.jsonl", encoding="utf-8") as traces:
+        written = [json.loads(line) for line in traces]
+    assert [trace["request_id"] for trace in written] == request_ids
+    assert {span["name"] for span in written[0]["spans"]} >= {"http.request", "work"}
+
+
+@pytest.mark.parametrize("endpoint", ["file:///etc/passwd", "ftp://collector/v1/traces", "collector:4318"])
+def test_otlp_endpoint_must_be_http(endpoint, monkeypatch):
+    monkeypatch.setenv("TRACING_EXPORTER", "otlp")
+    monkeypatch.setenv("TRACING_OTLP_ENDPOINT", endpoint)
+    with pytest.raises(ValueError):
+        tracing.create_exporter()
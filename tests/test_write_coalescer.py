@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import pytest
+
+from src.managers.write_coalescer import AsyncWriteCoalescer, WriteCoalescer
+
+COLUMNS = ("email", "text")
+
+
+class RecordingManager:
+    """Stands in for PostgresManager, recording the batches it is asked to insert"""
+
+    def __init__(self):
+        self.batches = []
+        self.last_write_lsn = 0
+
+    @contextmanager
+    def transaction(self):
+        yield None
+
+    def execute_batch_insert(self, table, columns, rows, connection=None, commit=True):
+        self.batches.append((table, rows))
+
+
+class AsyncRecordingManager(RecordingManager):
+    """Stands in for AsyncPostgresManager"""
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield None
+
+    async def execute_batch_insert(self, table, columns, rows, connection=None, commit=True):
+        self.batches.append((table, rows))
+
+
+def test_submitted_rows_are_written():
+    manager = RecordingManager()
+    coalescer = WriteCoalescer(manager)
+    coalescer.submit("feedback", COLUMNS, ("a@b.de", "hello"))
+    coalescer.close()
+    assert manager.batches == [("feedback", [("a@b.de", "hello")])]
+
+
+def test_submit_racing_close_fails_instead_of_hanging():
+    coalescer = WriteCoalescer(RecordingManager())
+    coalescer.close()
+    # A submit that passed the closed check just before close() and queues its row after the flusher exited
+    coalescer._closed = False
+    errors = []
+
+    def submit():
+        try:
+            coalescer.submit("feedback", COLUMNS, ("a@b.de", "late"))
+        except RuntimeError as e:
+            errors.append(e)
+
+    submitter = threading.Thread(target=submit, daemon=True)
+    submitter.start()
+    submitter.join(timeout=5)
+    assert not submitter.is_alive()
+    assert len(errors) == 1
+
+
+def test_close_does_not_block_on_a_full_queue(monkeypatch):
+    monkeypatch.setenv("WRITE_COALESCING_MAX_QUEUE_SIZE", "1")
+
+    async def run():
+        manager = AsyncRecordingManager()
+        coalescer = AsyncWriteCoalescer(manager)
+        coalescer.start()
+        first = asyncio.create_task(coalescer.submit("feedback", COLUMNS, ("a@b.de", "first")))
+        second = asyncio.create_task(coalescer.submit("feedback", COLUMNS, ("a@b.de", "second")))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(coalescer.close(), 5)
+        await asyncio.wait_for(asyncio.gather(first, second), 5)
+        return manager.batches
+
+    rows = [row for _, batch in asyncio.run(run()) for row in batch]
+    assert sorted(rows) == [("a@b.de", "first"), ("a@b.de", "second")]
+
+
+def test_async_submit_racing_close_fails_instead_of_hanging():
+    async def run():
+        coalescer = AsyncWriteCoalescer(AsyncRecordingManager())
+        coalescer.start()
+        await coalescer.close()
+        coalescer._closed = False
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(coalescer.submit("feedback", COLUMNS, ("a@b.de", "late")), 5)
+
+    asyncio.run(run())